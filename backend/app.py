@@ -1,40 +1,198 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import numpy as np
-import cv2
+import hmac
+import multiprocessing
 import os
+import signal
+import time
+import threading
 import traceback
-from werkzeug.utils import secure_filename
-from tensorflow.keras.models import load_model
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.backends import backend_for_path, import_runtime, read_model_bytes
+from utils.cache import PredictionCache, content_key, DEFAULT_DISK_MAX_ENTRIES
+from utils.embeddings import EmbeddingIndex, DEFAULT_K, DEFAULT_NOVELTY_THRESHOLD
+from utils.engine import InferenceEngine, DISEASE_CLASSES
+from utils.metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, REQUEST_SECONDS, IN_FLIGHT, PREDICTIONS, ERRORS,
+    StageTimer, observe_stages, server_timing
+)
+from utils.pipeline import StageStats
+from utils.quality import (
+    QualityGate, PoorQuality, record_rejection, rejection_stats,
+    DEFAULT_MIN_SHARPNESS, DEFAULT_MIN_BRIGHTNESS, DEFAULT_MAX_BRIGHTNESS, DEFAULT_MAX_CLIPPED,
+    DEFAULT_MIN_LEAF_RATIO
+)
+from utils.registry import ModelRegistry
+from utils.cascade import Cascade
+from utils.shadow import ShadowEvaluator, ComparisonStore
+from utils.history import PredictionHistory, HistoryStore
+from utils.responses import ResponseTemplate, ScoreList, Slot, dumps, encode_floats, extend, JSON_MIMETYPE
+from utils.preprocessing import DECODE_MIN_SIDE
+from utils.startup import StartupTracker, parse_batch_sizes
+from utils.tiling import DEFAULT_STRIDE, DEFAULT_MAX_SIDE, DEFAULT_MIN_LEAF, DEFAULT_MIN_VOTES, DEFAULT_MIN_SHARE
+from utils.tta import parse_views
+from utils.frames import FRAME_TYPES, FrameError, read_frames
+from utils.image_io import (
+    upload_stream_factory, read_upload, release_buffer, is_archive, iter_archive_images,
+    DEFAULT_ARCHIVE_MAX_IMAGE_BYTES, DEFAULT_ARCHIVE_MAX_IMAGES
+)
 
 # --------------------------------------------------
 # App setup
 # --------------------------------------------------
+UPLOAD_FOLDER = "uploads"
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
+MODEL_PATH = os.environ.get("MODEL_PATH", "model/best_model.keras")
+
+# Versioned models: MODEL_DIR/<version>/<model file>, with MODEL_DIR/CURRENT naming
+# the one to serve. Used when MODEL_PATH is not set and MODEL_DIR has versions.
+MODEL_DIR = os.environ.get("MODEL_DIR", "model")
+MODEL_PATH_PINNED = "MODEL_PATH" in os.environ
+
+# Seconds between checks of MODEL_DIR/CURRENT for a new version (0 disables)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", 10))
+
+# Required in X-Reload-Token by POST /models/reload; without it only localhost may reload
+RELOAD_TOKEN = os.environ.get("RELOAD_TOKEN") or None
+
+# keras | tflite | onnx (default: inferred from the MODEL_PATH extension)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND") or backend_for_path(MODEL_PATH)
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 0)) or None
+INFERENCE_INTER_OP_THREADS = int(os.environ.get("INFERENCE_INTER_OP_THREADS", 0)) or None
+
+# Uploads are decoded in memory; set UPLOAD_SPOOL_TO_DISK=1 to spool bodies
+# larger than UPLOAD_SPOOL_THRESHOLD bytes to UPLOAD_FOLDER instead
+UPLOAD_SPOOL_TO_DISK = os.environ.get("UPLOAD_SPOOL_TO_DISK", "0") == "1"
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get("UPLOAD_SPOOL_THRESHOLD", 8 * 1024 * 1024))
+
+# Archives sent to /predict/batch: members larger than ARCHIVE_MAX_IMAGE_BYTES once
+# extracted, and images past ARCHIVE_MAX_IMAGES, get an error line instead of being read
+ARCHIVE_MAX_IMAGE_BYTES = int(os.environ.get("ARCHIVE_MAX_IMAGE_BYTES", DEFAULT_ARCHIVE_MAX_IMAGE_BYTES))
+ARCHIVE_MAX_IMAGES = int(os.environ.get("ARCHIVE_MAX_IMAGES", DEFAULT_ARCHIVE_MAX_IMAGES))
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return upload_stream_factory(
+            total_content_length,
+            spool_to_disk=UPLOAD_SPOOL_TO_DISK,
+            spool_threshold=UPLOAD_SPOOL_THRESHOLD,
+            spool_dir=UPLOAD_FOLDER
+        )
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
 
-UPLOAD_FOLDER = "uploads"
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg"}
-MODEL_PATH = "model/best_model.keras"
-
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Micro-batching: flush at BATCH_MAX_SIZE items or after BATCH_MAX_WAIT_MS
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+
+# /predict/batch: images per forward pass and parallel decode workers
+PREDICT_BATCH_SIZE = int(os.environ.get("PREDICT_BATCH_SIZE", 16))
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", 4))
+
+# Preprocessing pool: decode + preprocess off the request thread ("thread" or "process")
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", 2))
+PREPROCESS_MODE = os.environ.get("PREPROCESS_MODE", "thread")
+
+# Decode large JPEGs at 1/2, 1/4 or 1/8 scale (still >= 224 px short side)
+DECODE_REDUCED = os.environ.get("DECODE_REDUCED", "1") == "1"
+DECODE_MIN_SIDE = DECODE_MIN_SIDE if DECODE_REDUCED else None
+
+# Test-time augmentation: averaged over TTA_VIEWS (see utils/tta.py) in one forward
+# pass. Opt in per request with ?tta=1 (or a "tta" form field), or for all with TTA_DEFAULT=1
+TTA_DEFAULT = os.environ.get("TTA_DEFAULT", "0") == "1"
+TTA_VIEWS = parse_views(os.environ.get("TTA_VIEWS"))
+
+# Tiled mode for photos with several leaves (?tiles=1): overlapping 224 px tiles over an
+# image of at most TILE_MAX_SIDE px (0 = full resolution); tiles with less than
+# TILE_MIN_LEAF leaf pixels are skipped (see utils/tiling.py)
+TILE_STRIDE = int(os.environ.get("TILE_STRIDE", DEFAULT_STRIDE))
+TILE_MAX_SIDE = int(os.environ.get("TILE_MAX_SIDE", DEFAULT_MAX_SIDE))
+TILE_MIN_LEAF = float(os.environ.get("TILE_MIN_LEAF", DEFAULT_MIN_LEAF))
+# A disease needs TILE_MIN_VOTES tiles and TILE_MIN_SHARE of the (confidence x leaf
+# share) vote weight to diagnose a tiled photo
+TILE_MIN_VOTES = int(os.environ.get("TILE_MIN_VOTES", DEFAULT_MIN_VOTES))
+TILE_MIN_SHARE = float(os.environ.get("TILE_MIN_SHARE", DEFAULT_MIN_SHARE))
+
+# Quality gate: blurry, badly exposed or leafless uploads get a 422 "retake photo"
+# answer before inference (see utils/quality.py); 0 disables a single threshold.
+# Off by default: the thresholds are not yet validated on the disease classes
+# (dark sooty-mould leaves can read as underexposed)
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "0") == "1"
+QUALITY_MIN_SHARPNESS = float(os.environ.get("QUALITY_MIN_SHARPNESS", DEFAULT_MIN_SHARPNESS))
+QUALITY_MIN_BRIGHTNESS = float(os.environ.get("QUALITY_MIN_BRIGHTNESS", DEFAULT_MIN_BRIGHTNESS))
+QUALITY_MAX_BRIGHTNESS = float(os.environ.get("QUALITY_MAX_BRIGHTNESS", DEFAULT_MAX_BRIGHTNESS))
+QUALITY_MAX_CLIPPED = float(os.environ.get("QUALITY_MAX_CLIPPED", DEFAULT_MAX_CLIPPED))
+QUALITY_MIN_LEAF_RATIO = float(os.environ.get("QUALITY_MIN_LEAF_RATIO", DEFAULT_MIN_LEAF_RATIO))
+
+# Similar past cases (?similar=1) and POST /cases: penultimate-layer embeddings in a
+# nearest-neighbour index under CASE_INDEX_DIR (unset disables; see utils/embeddings.py)
+CASE_INDEX_DIR = os.environ.get("CASE_INDEX_DIR") or None
+SIMILAR_K = int(os.environ.get("SIMILAR_K", DEFAULT_K))
+NOVELTY_THRESHOLD = float(os.environ.get("NOVELTY_THRESHOLD", DEFAULT_NOVELTY_THRESHOLD))
+# Adding cases needs this token in X-Cases-Token (default: RELOAD_TOKEN; localhost only when unset)
+CASES_TOKEN = os.environ.get("CASES_TOKEN") or RELOAD_TOKEN
+# Metadata fields POST /cases stores next to the label
+CASE_FIELDS = ("orchard", "plot", "notes", "reported_by")
+
+# Pre-resized 224x224 frames from edge clients, posted as the raw request body
+# (see utils/frames.py): at most FRAMES_MAX_BATCH frames per /predict/batch body
+FRAMES_MAX_BATCH = int(os.environ.get("FRAMES_MAX_BATCH", 100))
+
+# Warm-up inferences run at these batch sizes before the API reports ready
+WARMUP_BATCH_SIZES = parse_batch_sizes(
+    os.environ.get("WARMUP_BATCH_SIZES"),
+    default=(1, BATCH_MAX_SIZE, PREDICT_BATCH_SIZE, len(TTA_VIEWS))
+)
+
+# Load the model in the background when imported by a WSGI server
+MODEL_AUTOLOAD = os.environ.get("MODEL_AUTOLOAD", "1") == "1"
+
+# Prediction cache keyed by image bytes + model version (0 entries disables it);
+# set CACHE_DISK_PATH to keep a sqlite tier that survives restarts (at most
+# CACHE_DISK_MAX_ENTRIES rows)
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 24 * 3600))
+CACHE_DISK_PATH = os.environ.get("CACHE_DISK_PATH") or None
+CACHE_DISK_MAX_ENTRIES = int(os.environ.get("CACHE_DISK_MAX_ENTRIES", DEFAULT_DISK_MAX_ENTRIES))
+
+# Echo per-stage timings to clients in a Server-Timing response header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+# Shadow / A/B evaluation of a candidate model (registry version or model file) on
+# SHADOW_SAMPLE_RATE of /predict requests; SHADOW_MODE=ab lets it answer them too
+SHADOW_MODEL = os.environ.get("SHADOW_MODEL") or None
+SHADOW_MODE = os.environ.get("SHADOW_MODE", "shadow")
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", 0.05))
+SHADOW_DB_PATH = os.environ.get("SHADOW_DB_PATH", "shadow.db")
+
+# Prediction history for outbreak trends: every /predict and /predict/batch result is
+# appended to this sqlite file off the request path (opt-in: unset or "" disables; see
+# utils/history.py). Requests may tag it with "orchard" and "plot" (query string or form fields).
+# /history and /history/counts are unauthenticated: only enable on a trusted network.
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH", "")
+HISTORY_TAGS = ("orchard", "plot")
+HISTORY_TAG_MAX_LENGTH = 64
+
+# Two-tier cascade: a small, fast model (registry version or model file) answers
+# /predict first; images below CASCADE_THRESHOLD top-1 confidence go to the full model
+CASCADE_MODEL = os.environ.get("CASCADE_MODEL") or None
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", 0.85))
+
+if UPLOAD_SPOOL_TO_DISK:
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # --------------------------------------------------
 # Classes (MUST match training order)
 # --------------------------------------------------
-CLASS_NAMES = [
-    "Anthracnose",
-    "Bacterial Canker",
-    "Cutting Weevil",
-    "Die Back",
-    "Gall Midge",
-    "Healthy",
-    "Powdery Mildew",
-    "Sooty Mould"
-]
+CLASS_NAMES = DISEASE_CLASSES
 
 # --------------------------------------------------
 # Recommendations
@@ -62,24 +220,293 @@ DISEASE_TO_REMEDIES = {
 }
 
 # --------------------------------------------------
-# Load Keras model
+# Load model
 # --------------------------------------------------
-model = None
+MODEL_BYTES = None  # model file read before fork() (see preload_model)
+MODEL_BYTES_PATH = None
+
+registry = ModelRegistry(MODEL_DIR, backend=os.environ.get("INFERENCE_BACKEND") or None)
+
+cache = PredictionCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS,
+    disk_path=CACHE_DISK_PATH,
+    disk_max_entries=CACHE_DISK_MAX_ENTRIES
+) if CACHE_MAX_ENTRIES > 0 else None
+
+# Model, micro-batcher and preprocessing pool (see utils/engine.py)
+engine = InferenceEngine(
+    class_names=CLASS_NAMES,
+    batch_max_size=BATCH_MAX_SIZE,
+    batch_max_wait_ms=BATCH_MAX_WAIT_MS,
+    preprocess_workers=PREPROCESS_WORKERS,
+    preprocess_mode=PREPROCESS_MODE,
+    min_side=DECODE_MIN_SIDE,
+    quality_gate=QualityGate(
+        min_sharpness=QUALITY_MIN_SHARPNESS,
+        min_brightness=QUALITY_MIN_BRIGHTNESS,
+        max_brightness=QUALITY_MAX_BRIGHTNESS,
+        max_clipped=QUALITY_MAX_CLIPPED,
+        min_leaf_ratio=QUALITY_MIN_LEAF_RATIO
+    ) if QUALITY_GATE else None,
+    embeddings=CASE_INDEX_DIR is not None
+)
+stage_stats = StageStats()
+startup = StartupTracker()
+_load_lock = threading.Lock()
+shadow = None  # ShadowEvaluator once SHADOW_MODEL is loaded
+cascade = None  # Cascade once CASCADE_MODEL is loaded
+case_index = None  # EmbeddingIndex once the primary model is loaded with CASE_INDEX_DIR
+history = PredictionHistory(HistoryStore(HISTORY_DB_PATH), CLASS_NAMES) if HISTORY_DB_PATH else None
+
+def _mark_loaded():
+    startup.mark_ready()
+    print(f"✅ Model loaded successfully (version {engine.version})")
+    print(f"📦 Micro-batching: max {BATCH_MAX_SIZE} items / {BATCH_MAX_WAIT_MS} ms")
+
+
+def install_model(backend, version):
+    """Serve predictions from an already loaded (and warmed) backend"""
+    engine.install(backend, version)
+    _mark_loaded()
 
-def load_keras_model():
-    global model
-    try:
-        if not os.path.exists(MODEL_PATH):
-            print(f"❌ Model not found: {MODEL_PATH}")
-            return False
 
-        print(f"📂 Loading model from {MODEL_PATH}")
-        model = load_model(MODEL_PATH)
-        print("✅ Model loaded successfully")
+def resolve_model(version=None):
+    """(version or None, path, backend) to load: a registry version unless MODEL_PATH pins a file"""
+    if version is not None or (not MODEL_PATH_PINNED and registry.versions()):
+        version, path = registry.resolve(version)
+        return version, path, registry.backend or backend_for_path(path)
+    return None, MODEL_PATH, INFERENCE_BACKEND
+
+
+def _load(version=None, tracker=None):
+    version, path, backend = resolve_model(version)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found: {path}")
+
+    print(f"📂 Loading model {version or ''} from {path} ({backend} backend)")
+    # Published only once warm, so /predict never sees a cold model
+    engine.load(
+        path, backend,
+        num_threads=INFERENCE_THREADS,
+        inter_op_threads=INFERENCE_INTER_OP_THREADS,
+        model_bytes=MODEL_BYTES if path == MODEL_BYTES_PATH else None,
+        warmup_batch_sizes=WARMUP_BATCH_SIZES,
+        tracker=tracker,
+        version=version
+    )
+
+
+def load_inference_model():
+    """Import the runtime, load and warm up the model; safe to call more than once"""
+    with _load_lock:
+        if engine.ready:
+            return True
+        try:
+            _load(tracker=startup)
+            _mark_loaded()
+        except Exception as e:
+            traceback.print_exc()
+            startup.mark_failed(e)
+            return False
+        # After ready: a broken extra model must not keep the primary from serving
+        load_extra_models()
         return True
 
+
+def load_extra_models():
+    load_shadow_model()
+    load_cascade_model()
+    load_case_index()
+
+
+def prepare_model(spec, warmup_batch_sizes):
+    """Load and warm a model that is not the primary: a registry version or a model file"""
+    if os.path.isfile(spec):
+        version, path, backend = None, spec, backend_for_path(spec)
+    else:
+        version, path = registry.resolve(spec)
+        backend = registry.backend or backend_for_path(path)
+    print(f"📂 Loading model {version or ''} from {path} ({backend} backend)")
+    return engine.prepare(
+        path, backend,
+        num_threads=INFERENCE_THREADS,
+        inter_op_threads=INFERENCE_INTER_OP_THREADS,
+        warmup_batch_sizes=warmup_batch_sizes,
+        version=version,
+        embeddings=False
+    )
+
+
+def load_case_index():
+    """Open the case index for the primary model's embeddings"""
+    global case_index
+    if CASE_INDEX_DIR is None or case_index is not None:
+        return
+    try:
+        case_index = EmbeddingIndex(
+            CASE_INDEX_DIR, engine.model.embedding_dim,
+            model=engine.active.digest,
+            novelty_threshold=NOVELTY_THRESHOLD
+        )
+        print(f"🗂️ Case index: {len(case_index)} cases ({case_index.dim}-d) in {CASE_INDEX_DIR}")
+    except Exception:
+        traceback.print_exc()
+        print("❌ Failed to open the case index; serving without similar cases")
+
+
+def load_cascade_model():
+    """Load CASCADE_MODEL as the fast tier in front of the primary"""
+    global cascade
+    if CASCADE_MODEL is None or cascade is not None:
+        return
+    try:
+        # Serves single /predict calls through its own micro-batcher
+        fast = prepare_model(CASCADE_MODEL, [s for s in WARMUP_BATCH_SIZES if s <= BATCH_MAX_SIZE])
+        cascade = Cascade(fast, threshold=CASCADE_THRESHOLD)
+        print(f"🪜 Cascade: {fast.version} answers at >= {CASCADE_THRESHOLD:.0%} confidence, "
+              f"the rest go to the full model")
+    except Exception:
+        traceback.print_exc()
+        print("❌ Failed to load the cascade model; serving without it")
+
+
+def load_shadow_model():
+    """Load SHADOW_MODEL and start sampling /predict traffic for it"""
+    global shadow
+    if SHADOW_MODEL is None or shadow is not None:
+        return
+    try:
+        print(f"🕶️ Shadow evaluation ({SHADOW_MODE} mode)")
+        # Shadow passes are single images; in A/B mode it serves through its own batcher
+        candidate = prepare_model(SHADOW_MODEL, WARMUP_BATCH_SIZES if SHADOW_MODE == "ab" else (1,))
+        shadow = ShadowEvaluator(
+            candidate, ComparisonStore(SHADOW_DB_PATH), CLASS_NAMES,
+            sample_rate=SHADOW_SAMPLE_RATE,
+            mode=SHADOW_MODE
+        )
+        print(f"🕶️ Comparing {candidate.version} on {SHADOW_SAMPLE_RATE:.0%} of requests -> {SHADOW_DB_PATH}")
     except Exception:
         traceback.print_exc()
+        print("❌ Failed to load the shadow model; serving without it")
+
+
+def preload_model():
+    """Pre-fork work for multi-worker servers: import the runtime and read the model file.
+
+    Runs no inference and starts no threads, so it is safe to fork() afterwards.
+    Workers then build their sessions over the shared MODEL_BYTES buffer.
+    """
+    global MODEL_BYTES, MODEL_BYTES_PATH
+    with startup.phase("preload"):
+        _, path, backend = resolve_model()
+        import_runtime(backend)
+        if os.path.exists(path):
+            MODEL_BYTES, MODEL_BYTES_PATH = read_model_bytes(path, backend), path
+    if MODEL_BYTES is not None:
+        print(f"📦 Preloaded {len(MODEL_BYTES) / 1e6:.1f} MB of model weights before fork")
+
+
+def shutdown():
+    """Drain queued inference and stop background workers"""
+    engine.close()
+    if shadow is not None:
+        shadow.close()
+    if cascade is not None:
+        cascade.close()
+    if history is not None:
+        history.close()
+    if _decode_pool is not None and _decode_pool_pid == os.getpid():
+        _decode_pool.shutdown(wait=True)
+
+
+def start_model_loading():
+    """Load the model on a background thread so liveness checks answer immediately"""
+    thread = threading.Thread(target=load_inference_model, name="model-loader", daemon=True)
+    thread.start()
+    start_registry_watcher()
+    return thread
+
+# --------------------------------------------------
+# Hot reload
+# --------------------------------------------------
+reload_status = {"state": "idle", "version": None, "error": None, "started_at": None, "finished_at": None}
+_reload_lock = threading.Lock()
+_watcher_pid = None
+
+
+def reload_model(version=None):
+    """Load and warm a model (default: the registry's CURRENT) while the old one keeps
+    serving, then swap it in. Returns False if it failed or another reload is running."""
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    return _reload_locked(version)
+
+
+def _reload_locked(version):
+    """reload_model once _reload_lock is held; releases it"""
+    try:
+        reload_status.update(state="loading", version=version, error=None,
+                             started_at=time.time(), finished_at=None)
+        _load(version)
+        reload_status.update(state="ready", version=engine.version)
+        if not startup.ready:
+            startup.mark_ready()
+            load_extra_models()
+        print(f"🔄 Now serving model version {engine.version}")
+        return True
+    except Exception as e:
+        traceback.print_exc()
+        reload_status.update(state="failed", error=str(e))
+        return False
+    finally:
+        reload_status["finished_at"] = time.time()
+        _reload_lock.release()
+
+
+def start_reload(version=None, before=None):
+    """Reload on a background thread; False if a reload is already running.
+
+    ``before()`` runs only once the reload is accepted, with the reload lock
+    held; if it raises, the reload is cancelled and the exception propagates.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    try:
+        if before is not None:
+            before()
+        threading.Thread(target=_reload_locked, args=(version,), name="model-reload", daemon=True).start()
+    except BaseException:
+        _reload_lock.release()
+        raise
+    return True
+
+
+def _watch_registry():
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL)
+        current = registry.current()
+        failed = reload_status["state"] == "failed" and reload_status["version"] == current
+        if current and engine.ready and current != engine.version and not failed:
+            print(f"👀 {MODEL_DIR}/CURRENT now names {current}")
+            reload_model(current)
+
+
+def start_registry_watcher():
+    """Follow MODEL_DIR/CURRENT, so activating a version reaches every worker process"""
+    global _watcher_pid
+    if MODEL_PATH_PINNED or MODEL_WATCH_INTERVAL <= 0 or _watcher_pid == os.getpid():
+        return
+    _watcher_pid = os.getpid()
+    threading.Thread(target=_watch_registry, name="model-watcher", daemon=True).start()
+
+
+def install_reload_signal(signum=signal.SIGUSR2):
+    """`kill -USR2 <pid>` reloads the CURRENT version in that process (main thread only)"""
+    try:
+        signal.signal(signum, lambda *_: start_reload())
+        return True
+    except ValueError:
         return False
 
 # --------------------------------------------------
@@ -89,15 +516,368 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def preprocess_image(img):
+def response_template(prediction):
+    """Response body for one class; the slots are filled per request"""
+    return {
+        "prediction": {
+            "disease": prediction,
+            "confidence": Slot("confidence"),
+            "is_healthy": prediction == "Healthy"
+        },
+        "recommendations": {
+            "nutrients": DISEASE_TO_NUTRIENTS.get(prediction, []),
+            "remedies": DISEASE_TO_REMEDIES.get(prediction, [])
+        },
+        "top_predictions": Slot("top_predictions"),
+        "tta": Slot("tta"),
+        "model_version": Slot("model_version")
+    }
+
+
+# Static part of every class's body, serialized once
+TOP_K = 3
+RESPONSES = ResponseTemplate(CLASS_NAMES, response_template)
+TOP_PREDICTIONS = ScoreList(CLASS_NAMES)
+
+
+def build_response(preds, version=None, tta=None):
+    """Response body (dict) for one row of model output; tta: {"views", "agreement"} or None"""
+    top = engine.top_indices(preds, TOP_K)
+    return RESPONSES.as_dict(top[0], {
+        "confidence": float(preds[top[0]]),
+        "top_predictions": [{"disease": CLASS_NAMES[i], "confidence": float(preds[i])} for i in top],
+        "tta": tta,
+        "model_version": version
+    })
+
+
+def render_response(preds, version=None, tta=None):
+    """(disease, JSON bytes) for one row of model output, spliced into the pre-encoded template"""
+    top = engine.top_indices(preds, TOP_K)
+    scores = encode_floats(preds[top])
+    body = RESPONSES.render(top[0], {
+        "confidence": scores[0],
+        "top_predictions": TOP_PREDICTIONS.encode(top, scores),
+        "tta": dumps(tta),
+        "model_version": dumps(version)
+    })
+    return CLASS_NAMES[top[0]], body
+
+
+def json_response(body, version, status=200, tier=None):
+    """JSON response tagged with the model version (and cascade tier) that produced it"""
+    response = Response(body, status=status, mimetype=JSON_MIMETYPE)
+    response.headers["X-Model-Version"] = version
+    if tier is not None:
+        response.headers["X-Cascade-Tier"] = tier
+    return response
+
+
+def cache_key(buf, served, tta=False, cascaded=False, tiles=False):
+    """Cache key for an upload (None when caching is off); values are [disease, JSON body, version]"""
+    if cache is None:
+        return None
+    variant = f"{served.digest}:json"
+    if tta:
+        variant += ":tta:" + ",".join(TTA_VIEWS)
+    if cascaded:
+        variant += f":cascade:{cascade.fast.digest}:{cascade.threshold}"
+    if tiles:
+        variant += f":tiles:{TILE_STRIDE}:{TILE_MAX_SIDE}:{TILE_MIN_LEAF}:{TILE_MIN_VOTES}:{TILE_MIN_SHARE}"
+    return content_key(buf, variant)
+
+
+def cache_value(disease, body, version, preds):
+    """Cache value for a response: [disease, JSON body, version, output row]"""
+    return [disease, body.decode(), version, [float(p) for p in preds]]
+
+
+def from_cache(cached, served):
+    """(disease, JSON body, model version, output row or None) of a cache value; entries
+    from before the cascade have no version and came from served, older ones no row"""
+    disease, body = cached[:2]
+    version = cached[2] if len(cached) > 2 else served.version
+    return disease, body, version, cached[3] if len(cached) > 3 else None
+
+
+def predict_mode(tta, tiles, similar):
+    return "tta" if tta else "tiles" if tiles else "similar" if similar else "single"
+
+
+def history_tags(*sources):
+    """orchard/plot tags of a request from the first source (query string, form) that has them"""
+    tags = {}
+    for tag in HISTORY_TAGS:
+        value = next((source.get(tag) for source in sources if source.get(tag)), None)
+        tags[tag] = value[:HISTORY_TAG_MAX_LENGTH] if value else None
+    return tags
+
+
+def record_history(preds, disease, version, mode, tags, source="api", **meta):
+    """Queue one served prediction for the history store (no-op when it is off).
+
+    ``preds`` may be None for cache entries that predate stored rows; only
+    the class is recorded then. Falsy ``meta`` values are left out.
     """
-    MUST match training preprocessing
+    if history is None:
+        return
+    history.record(
+        preds, version, source, mode, tags.get("orchard"), tags.get("plot"),
+        {k: v for k, v in meta.items() if v} or None,
+        class_index=CLASS_NAMES.index(disease) if preds is None else None
+    )
+
+
+def history_query(args, counts=False):
+    """(body, HTTP status) for GET /history or /history/counts, shared with the ASGI server"""
+    if history is None:
+        return {"error": "Prediction history is off (set HISTORY_DB_PATH)"}, 404
+    try:
+        query = {
+            "since": float(args["since"]) if args.get("since") else None,
+            "until": float(args["until"]) if args.get("until") else None,
+            "orchard": args.get("orchard") or None,
+            "plot": args.get("plot") or None,
+        }
+        if not counts:
+            return {"records": history.records(limit=int(args.get("limit", 100)), **query)}, 200
+        bucket, group = args.get("bucket", "day"), args.get("group", "plot")
+        return {"bucket": bucket, "group": group, **history.counts(bucket=bucket, group=group, **query)}, 200
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+
+def request_flag(value, default=False):
+    """Per-request switch such as ?tta=1 ("1"/"true"/"yes"/"on" or anything else); default when absent"""
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def check_modes(tta, tiles, similar, frame=False):
+    """(message, status, kind) rejecting an impossible /predict mode combination, else None"""
+    if tta + tiles + similar > 1:
+        return "Use only one of tta, tiles and similar", 400, "invalid_options"
+    if tiles and frame:
+        return "Tiled mode needs the full photo, not a pre-resized frame", 400, "invalid_options"
+    if similar and case_index is None:
+        return "Similar cases are not available (set CASE_INDEX_DIR)", 404, "no_case_index"
+    return None
+
+
+def predict_tiled(served, buf, timer):
+    """(disease, JSON body, output row) for a photo with several leaves: the usual body
+    for the aggregated diagnosis plus a "tiles" report (per-tile class grid, counts)"""
+    preds, report = engine.predict_tiles(
+        buf, served,
+        stride=TILE_STRIDE,
+        max_side=TILE_MAX_SIDE,
+        min_leaf=TILE_MIN_LEAF,
+        min_votes=TILE_MIN_VOTES,
+        min_share=TILE_MIN_SHARE,
+        batch_size=PREDICT_BATCH_SIZE,
+        timer=timer
+    )
+    with timer.stage("format"):
+        disease, body = render_response(preds, served.version)
+        return disease, extend(body, "tiles", report), preds
+
+
+def similar_cases(served, embedding):
+    """Nearest past cases and novelty for one embedding; None when the index is off
+    or was built with another model than the one that produced the embedding"""
+    if case_index is None or case_index.model != served.digest:
+        return None
+    return case_index.query(embedding, SIMILAR_K)
+
+
+def predict_similar(served, buf, timer):
+    """(disease, JSON body, output row), the body with "similar_cases" and "novelty", from
+    the same forward pass as the diagnosis (the embedding is the classifier layer's input)"""
+    with engine.pool.preprocess(buf) as job:
+        with timer.stage("inference"):
+            rows, embeddings = served.predict_embeddings(job.tensor[None])
+    timer.add(job.timings)
+    with timer.stage("search"):
+        found = similar_cases(served, embeddings[0]) or {"similar_cases": None, "novelty": None}
+    with timer.stage("format"):
+        disease, body = render_response(rows[0], served.version)
+        body = extend(body, "similar_cases", found["similar_cases"])
+        return disease, extend(body, "novelty", found["novelty"]), rows[0]
+
+
+def add_case(buf, label, fields, token=None, remote_addr=None):
+    """Store one diagnosed upload in the case index; (body, HTTP status) shared with
+    the ASGI server. ``label`` is the confirmed class, ``fields`` extra metadata."""
+    denied = check_token(token, remote_addr, CASES_TOKEN, "CASES_TOKEN")
+    if denied is not None:
+        return denied
+    if case_index is None:
+        return {"error": "Case index disabled (set CASE_INDEX_DIR)"}, 404
+    if label not in CLASS_NAMES:
+        return {"error": f"Unknown label: {label}", "classes": CLASS_NAMES}, 400
+
+    with engine.serving() as served:
+        if case_index.model != served.digest:
+            return {"error": f"The case index belongs to model {case_index.model}, "
+                             f"not the serving one ({served.digest})"}, 409
+        with engine.pool.preprocess(buf) as job:
+            rows, embeddings = served.predict_embeddings(job.tensor[None])
+    predicted, confidence = engine.classify(rows[0])
+    case = {
+        "label": label,
+        "confirmed": True,
+        "predicted": predicted,
+        "confidence": round(confidence, 4),
+        "model_version": served.version,
+        "added_at": time.time(),
+        **{k: v for k, v in fields.items() if k in CASE_FIELDS and v},
+    }
+    case_id = case_index.add(embeddings, [case])[0]
+    return {"id": case_id, "cases": len(case_index), **case}, 201
+
+
+def run_inference(served, tensor, tta=False, cascaded=False):
+    """(output row, model that answered, tta info or None): micro-batched, through the
+    cascade's fast tier first, or all TTA views in one pass"""
+    if tta:
+        preds, agreement = engine.predict_tta(tensor, TTA_VIEWS, served)
+        return preds, served, {"views": len(TTA_VIEWS), "agreement": round(agreement, 4)}
+    if cascaded:
+        preds, answered = cascade.predict(served, tensor)
+        return preds, answered, None
+    return served.predict(tensor), served, None
+
+
+_decode_pool = None
+_decode_pool_pid = None
+
+def get_decode_pool():
+    """Thread pool for parallel decode (cv2 releases the GIL); rebuilt after fork"""
+    global _decode_pool, _decode_pool_pid
+    if _decode_pool is None or _decode_pool_pid != os.getpid():
+        _decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+        _decode_pool_pid = os.getpid()
+    return _decode_pool
+
+
+def iter_batch_uploads(files):
+    """Yield (filename, payload) for every uploaded file or archive member: the encoded
+    image, None for a disallowed type, or the ValueError of an oversized member"""
+    for file in files:
+        name = file.filename or ""
+        if is_archive(name):
+            yield from iter_archive_images(
+                file.stream, name, ALLOWED_EXTENSIONS, ARCHIVE_MAX_IMAGE_BYTES, ARCHIVE_MAX_IMAGES
+            )
+        elif allowed_file(name):
+            yield name, file.stream
+        else:
+            yield name, None
+
+
+def load_tensor(payload):
+    """Decode and preprocess one upload; returns the tensor or the exception"""
+    if payload is None:
+        return ValueError("Invalid file type")
+    if isinstance(payload, Exception):
+        return payload
+
+    buf = read_upload(payload) if hasattr(payload, "read") else payload
+    try:
+        return engine.preprocess(buf)[0]
+    except Exception as e:
+        return e
+    finally:
+        release_buffer(buf)
+
+
+def predict_chunk(chunk, served, field="filename", tags=None):
+    """Decode a chunk of uploads in parallel, run one forward pass, return NDJSON lines.
+
+    Each line starts with the upload's name under ``field``; predictions go
+    to the history with ``tags``.
     """
-    img = cv2.resize(img, (224, 224))
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img = img / 255.0
-    img = np.expand_dims(img, axis=0)
-    return img
+    names = [name for name, _ in chunk]
+    tensors = list(get_decode_pool().map(load_tensor, [payload for _, payload in chunk]))
+
+    results = []
+    for name, row in zip(names, engine.predict_tensors(tensors, served)):
+        if isinstance(row, PoorQuality):
+            results.append(dumps({field: name, **retake(row)}) + b"\n")
+        elif isinstance(row, Exception):
+            ERRORS.inc(type=type(row).__name__)
+            results.append(dumps({field: name, "error": str(row)}) + b"\n")
+        else:
+            disease, body = render_response(row, served.version)
+            PREDICTIONS.inc(disease=disease)
+            record_history(row, disease, served.version, "single", tags or {}, source="batch", **{field: name})
+            # Splice the name in front of the pre-encoded body's first key
+            results.append(b'{' + dumps(field) + b':' + dumps(name) + b"," + body[1:] + b"\n")
+    return results
+
+
+def reject(message, status, kind):
+    """Error response for a request that never reached the model"""
+    ERRORS.inc(type=kind)
+    return jsonify({"error": message}), status
+
+
+def retake(error):
+    """Count a quality-gate rejection; returns its "retake photo" body.
+
+    The inference time saved is estimated as the recent mean inference stage.
+    """
+    ERRORS.inc(type="retake_photo")
+    record_rejection(error, stage_stats.mean("inference"))
+    return error.report()
+
+# --------------------------------------------------
+# Metrics
+# --------------------------------------------------
+MODEL_STATE = REGISTRY.gauge("mango_model_state", "1 for the current model state", ["state"])
+MODEL_STATE.set_function(lambda: {
+    (state,): int(state == ("ready" if startup.ready else "failed" if startup.error else "loading"))
+    for state in ("loading", "ready", "failed")
+})
+MODEL_INFO = REGISTRY.gauge("mango_model_info", "Loaded model backend and version", ["backend", "version"])
+MODEL_INFO.set_function(lambda: {(engine.model.name, engine.version): 1} if engine.ready else {})
+BATCH_QUEUE = REGISTRY.gauge("mango_batch_queue_depth", "Tensors waiting for the micro-batcher")
+BATCH_QUEUE.set_function(lambda: engine.batcher.stats()["queue_depth"] if engine.batcher is not None else 0)
+CACHE_LOOKUPS = REGISTRY.counter("mango_cache_lookups_total", "Prediction cache lookups", ["result"])
+CACHE_LOOKUPS.set_function(lambda: {
+    ("hit",): cache.stats()["hits"], ("miss",): cache.stats()["misses"]
+} if cache is not None else {})
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+@app.before_request
+def start_timer():
+    g.timer = StageTimer()
+    g.route = _route_label()
+    IN_FLIGHT.inc(route=g.route)
+
+
+@app.after_request
+def record_timings(response):
+    timer = g.get("timer")
+    if timer is not None:
+        REQUEST_SECONDS.observe(timer.total_ms() / 1000.0, route=g.route, status=response.status_code)
+        observe_stages(timer.timings)
+        if g.get("cascade_tier") is not None:
+            cascade.observe_latency(g.cascade_tier, timer.total_ms())
+        if SERVER_TIMING and timer.timings:
+            response.headers["Server-Timing"] = server_timing({**timer.timings, "total": timer.total_ms()})
+    return response
+
+
+@app.teardown_request
+def end_request(exc):
+    if g.get("timer") is not None:
+        IN_FLIGHT.dec(route=g.route)
 
 # --------------------------------------------------
 # Routes
@@ -110,12 +890,106 @@ def home():
     })
 
 
+def health_status():
+    """Liveness body shared with the ASGI server"""
+    return {
+        "status": "alive",
+        "ready": startup.ready,
+        "startup": startup.summary(),
+        "model_loaded": engine.ready,
+        "backend": engine.model.name if engine.ready else INFERENCE_BACKEND,
+        "classes": len(CLASS_NAMES),
+        "batching": engine.batcher.stats() if engine.batcher is not None else None,
+        "cache": cache.stats() if cache is not None else None,
+        "shadow": shadow.stats() if shadow is not None else None,
+        "cascade": cascade.stats() if cascade is not None else None,
+        "cases": case_index.stats() if case_index is not None else None,
+        "history": history.stats() if history is not None else None,
+        "quality_gate": {
+            **engine.quality_gate.describe(), **rejection_stats()
+        } if engine.quality_gate is not None else None,
+        "stage_timings_ms": stage_stats.summary()
+    }
+
+
+def readiness():
+    """Readiness body and HTTP status shared with the ASGI server"""
+    body = {
+        "ready": startup.ready,
+        "model_version": engine.version,
+        "error": startup.error,
+        "pid": os.getpid()
+    }
+    return body, (200 if startup.ready else 503)
+
+
+def models_status():
+    """Serving model, registry contents and last reload, shared with the ASGI server"""
+    return {
+        "serving": engine.active.describe() if engine.ready else None,
+        "registry": {
+            "root": MODEL_DIR,
+            "pinned": MODEL_PATH if MODEL_PATH_PINNED else None,
+            "current": registry.current(),
+            "versions": registry.describe()
+        },
+        "reload": reload_status,
+        "pid": os.getpid()
+    }
+
+
+def shadow_summary(since=None):
+    """Candidate vs primary on sampled traffic, shared with the ASGI server (None when off)"""
+    if shadow is None:
+        return None
+    return {**shadow.stats(), "summary": shadow.store.summary(CLASS_NAMES, since=since)}
+
+
+def check_token(token, remote_addr, expected, setting):
+    """(body, 403) unless token matches expected; without one, only localhost may call"""
+    if expected is not None:
+        if not hmac.compare_digest((token or "").encode(), expected.encode()):
+            return {"error": "Invalid token"}, 403
+    elif remote_addr not in ("127.0.0.1", "::1"):
+        return {"error": f"Set {setting} to allow remote calls"}, 403
+    return None
+
+
+def request_reload(version=None, token=None, remote_addr=None):
+    """Authorize and start a reload; (body, HTTP status) shared with the ASGI server.
+
+    With a version, CURRENT is pointed at it once the reload is accepted, so
+    the other worker processes follow through their registry watcher.
+    """
+    denied = check_token(token, remote_addr, RELOAD_TOKEN, "RELOAD_TOKEN")
+    if denied is not None:
+        return denied
+
+    if version is not None and MODEL_PATH_PINNED:
+        return {"error": "MODEL_PATH pins the model file; unset it to serve registry versions"}, 409
+
+    # CURRENT only moves once this reload is accepted: a rejected request must not
+    # switch the other workers through their registry watcher
+    try:
+        started = start_reload(version, before=(lambda: registry.activate(version)) if version is not None else None)
+    except KeyError:
+        return {"error": f"Unknown model version: {version}", "versions": registry.versions()}, 404
+    if not started:
+        return {"error": "A reload is already running", "reload": reload_status}, 409
+    return {"status": "reloading", "version": version or registry.current(), "serving": engine.version}, 202
+
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({
-        "model_loaded": model is not None,
-        "classes": len(CLASS_NAMES)
-    })
+    """Liveness: the process is up (see /ready for readiness)"""
+    return jsonify(health_status())
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: model loaded and warmed up"""
+    body, status = readiness()
+    return jsonify(body), status
 
 
 @app.route("/classes", methods=["GET"])
@@ -123,65 +997,244 @@ def classes():
     return jsonify(CLASS_NAMES)
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint (per process; scrape each worker)"""
+    return Response(REGISTRY.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/models", methods=["GET"])
+def models():
+    return jsonify(models_status())
+
+
+@app.route("/shadow", methods=["GET"])
+def shadow_report():
+    """
+    Agreement rate, confidence deltas and latency of the shadow model vs the primary,
+    overall and per class. Optional ?since=<unix time> limits the window.
+    """
+    body = shadow_summary(request.args.get("since", type=float))
+    if body is None:
+        return jsonify({"error": "Shadow evaluation is off (set SHADOW_MODEL)"}), 404
+    return jsonify(body)
+
+
+@app.route("/history", methods=["GET"])
+def history_records():
+    """
+    Most recent predictions, newest first. Optional ?orchard=, ?plot=,
+    ?since= / ?until= (unix times) and ?limit= (at most 1000).
+    """
+    body, status = history_query(request.args)
+    return jsonify(body), status
+
+
+@app.route("/history/counts", methods=["GET"])
+def history_counts():
+    """
+    Predictions per class, time bucket and plot for outbreak trends:
+    ?bucket=hour|day|week, ?group=plot|orchard|all, plus the /history filters.
+    """
+    body, status = history_query(request.args, counts=True)
+    return jsonify(body), status
+
+
+@app.route("/cases", methods=["GET"])
+def cases_report():
+    """Size, labels and model of the case index behind ?similar=1"""
+    if case_index is None:
+        return jsonify({"error": "Case index disabled (set CASE_INDEX_DIR)"}), 404
+    return jsonify(case_index.stats())
+
+
+@app.route("/cases", methods=["POST"])
+def cases_add():
+    """
+    Add a diagnosed leaf to the case index: "file" plus its confirmed "label"
+    and optional metadata (CASE_FIELDS). Needs X-Cases-Token.
+    """
+    if not engine.ready:
+        return reject("Model not loaded", 503, "model_not_loaded")
+    file = request.files.get("file")
+    if file is None or not file.filename or not allowed_file(file.filename):
+        return reject("Upload one image as \"file\"", 400, "no_file")
+
+    buf = read_upload(file.stream)
+    try:
+        body, status = add_case(
+            buf, request.form.get("label"), request.form.to_dict(),
+            request.headers.get("X-Cases-Token"), request.remote_addr
+        )
+        return jsonify(body), status
+    except PoorQuality as e:
+        return jsonify(retake(e)), 422
+    finally:
+        release_buffer(buf)
+
+
+@app.route("/models/reload", methods=["POST"])
+def models_reload():
+    """
+    Load a model version in the background and swap it in without dropping requests.
+    Optional "version" (JSON body or query string); default: reload CURRENT.
+    """
+    payload = request.get_json(silent=True) or {}
+    version = payload.get("version") or request.args.get("version")
+    body, status = request_reload(version, request.headers.get("X-Reload-Token"), request.remote_addr)
+    return jsonify(body), status
+
+
 @app.route("/predict", methods=["POST"])
 def predict():
-    if model is None:
-        return jsonify({"error": "Model not loaded"}), 503
+    timer = g.timer
+    if not engine.ready:
+        return reject("Model not loaded", 503, "model_not_loaded")
 
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
+    if request.mimetype in FRAME_TYPES:
+        # Pre-resized frame as the raw body: no multipart parsing, decode or resize
+        with timer.stage("upload"):
+            buf = request.get_data(cache=False)
+        try:
+            source = read_frames(buf, request.mimetype)[0]
+        except FrameError as e:
+            return reject(str(e), 400, "invalid_frame")
+    else:
+        with timer.stage("upload"):
+            file = request.files.get("file")
 
-    file = request.files["file"]
+        if file is None:
+            return reject("No file uploaded", 400, "no_file")
 
-    if file.filename == "":
-        return jsonify({"error": "Empty filename"}), 400
+        if file.filename == "":
+            return reject("Empty filename", 400, "empty_filename")
 
-    if not allowed_file(file.filename):
-        return jsonify({"error": "Invalid file type"}), 400
+        if not allowed_file(file.filename):
+            return reject("Invalid file type", 400, "invalid_file_type")
 
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(file.filename))
-    file.save(filepath)
+        with timer.stage("upload"):
+            buf = source = read_upload(file.stream)
+    tta = request_flag(request.args.get("tta", request.form.get("tta")), TTA_DEFAULT)
+    tiles = request_flag(request.args.get("tiles", request.form.get("tiles")))
+    similar = request_flag(request.args.get("similar", request.form.get("similar")))
+    invalid = check_modes(tta, tiles, similar, frame=source is not buf)
+    if invalid is not None:
+        release_buffer(buf)
+        return reject(*invalid)
+    mode = predict_mode(tta, tiles, similar)
+    tags = history_tags(request.args, request.form)
 
+    # One model serves the whole request, even if a reload swaps it meanwhile
     try:
-        img = cv2.imread(filepath)
-        if img is None:
-            raise ValueError("Invalid image")
-
-        img = preprocess_image(img)
-
-        preds = model.predict(img)[0]
-        class_index = int(np.argmax(preds))
-        prediction = CLASS_NAMES[class_index]
-        confidence = float(preds[class_index])
-
-        response = {
-            "prediction": {
-                "disease": prediction,
-                "confidence": confidence,
-                "is_healthy": prediction == "Healthy"
-            },
-            "recommendations": {
-                "nutrients": DISEASE_TO_NUTRIENTS.get(prediction, []),
-                "remedies": DISEASE_TO_REMEDIES.get(prediction, [])
-            },
-            "top_predictions": [
-                {
-                    "disease": CLASS_NAMES[i],
-                    "confidence": float(preds[i])
-                }
-                for i in np.argsort(preds)[-3:][::-1]
-            ]
-        }
+        with engine.serving() as primary:
+            # Shadow comparisons are single-view; TTA, tiled and similar-case requests
+            # are not sampled and always go to the full model.
+            single = not (tta or tiles or similar)
+            use_shadow = shadow is not None and single
+            served, sampled = shadow.route(primary) if use_shadow else (primary, False)
+            cascaded = cascade is not None and single and not sampled
+            # Similar cases change as the index grows: never cached
+            key = cache_key(buf, served, tta, cascaded, tiles) if not similar else None
+            if key is not None:
+                with timer.stage("cache"):
+                    cached = cache.get(key)
+                if cached is not None:
+                    disease, body, version, preds = from_cache(cached, served)
+                    PREDICTIONS.inc(disease=disease)
+                    record_history(preds, disease, version, mode, tags, cached=True)
+                    with timer.stage("serialize"):
+                        return json_response(body, version)
+
+            if tiles:
+                # Decoded at its own (bounded) resolution rather than the 224 px squash
+                answered = served
+                disease, body, preds = predict_tiled(served, buf, timer)
+            elif similar:
+                answered = served
+                disease, body, preds = predict_similar(served, source, timer)
+            else:
+                start = time.perf_counter()
+                with engine.pool.preprocess(source) as job:
+                    with timer.stage("inference"):
+                        preds, answered, tta_info = run_inference(served, job.tensor, tta, cascaded)
+                    if sampled:
+                        shadow.observe(primary, served, job.tensor, preds, timer.timings["inference"])
+                timer.add(job.timings)
+                with timer.stage("format"):
+                    disease, body = render_response(preds, answered.version, tta_info)
+                if cascaded:
+                    g.cascade_tier = cascade.tier(answered)
+
+                stage_stats.record({
+                    **job.timings,
+                    "inference": timer.timings["inference"],
+                    "total": (time.perf_counter() - start) * 1000
+                })
+            PREDICTIONS.inc(disease=disease)
+            record_history(preds, disease, answered.version, mode, tags, tier=g.get("cascade_tier"))
 
-        return jsonify(response)
+            if key is not None:
+                cache.put(key, cache_value(disease, body, answered.version, preds))
+
+            with timer.stage("serialize"):
+                return json_response(body, answered.version, tier=g.get("cascade_tier"))
+
+    except PoorQuality as e:
+        return jsonify(retake(e)), 422
 
     except Exception as e:
         traceback.print_exc()
+        ERRORS.inc(type=type(e).__name__)
         return jsonify({"error": str(e)}), 500
 
     finally:
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        release_buffer(buf)
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Many files (field "files" or "file", or a zip/tar archive) in one request.
+    Streams one NDJSON line per image as each fixed-size batch finishes.
+    """
+    if not engine.ready:
+        return reject("Model not loaded", 503, "model_not_loaded")
+
+    field = "filename"
+    tags = history_tags(request.args, request.form)
+    if request.mimetype in FRAME_TYPES:
+        # Many pre-resized frames in one raw body; lines carry the frame's index
+        with g.timer.stage("upload"):
+            body = request.get_data(cache=False)
+        try:
+            uploads = list(enumerate(read_frames(body, request.mimetype, FRAMES_MAX_BATCH)))
+        except FrameError as e:
+            return reject(str(e), 400, "invalid_frame")
+        field = "index"
+    else:
+        with g.timer.stage("upload"):
+            files = request.files.getlist("files") + request.files.getlist("file")
+        if not files:
+            return reject("No file uploaded", 400, "no_file")
+        uploads = iter_batch_uploads(files)
+
+    def generate():
+        chunk = []
+        try:
+            # Every line carries model_version; one model serves the whole stream
+            with engine.serving() as served:
+                for item in uploads:
+                    chunk.append(item)
+                    if len(chunk) >= PREDICT_BATCH_SIZE:
+                        yield from predict_chunk(chunk, served, field, tags)
+                        chunk = []
+                if chunk:
+                    yield from predict_chunk(chunk, served, field, tags)
+        except Exception as e:
+            traceback.print_exc()
+            yield dumps({"error": str(e)}) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 # --------------------------------------------------
 # Main
@@ -189,7 +1242,14 @@ def predict():
 if __name__ == "__main__":
     print("🚀 Starting Mango Leaf Detection API")
 
-    if load_keras_model():
-        app.run(host="0.0.0.0", port=5000, debug=True)
+    if load_inference_model():
+        install_reload_signal()
+        start_registry_watcher()
+        # The reloader would load (and warm) the model a second time
+        app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
     else:
         print("❌ Failed to load model")
+elif MODEL_AUTOLOAD and multiprocessing.parent_process() is None:
+    # Spawned preprocessing workers re-import this module (as __mp_main__ under
+    # "python app.py"); they only run preprocessing and must not load models
+    start_model_loading()
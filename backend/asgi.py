@@ -0,0 +1,451 @@
+"""
+Asyncio (ASGI) variant of the prediction API
+
+Serves /predict, /health, /ready, /classes, /metrics, /models and /shadow with the same
+responses as the Flask app. Uploads are read without blocking a thread,
+decode and inference run on executors, and a bounded admission queue sheds
+load with 429/503 + Retry-After. Clients can send X-Request-Timeout-Ms; requests whose budget has
+run out are dropped before reaching the model.
+
+Run (from backend/):
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import os
+import threading
+import time
+import traceback
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import app as api
+from utils.admission import AdmissionController, Rejected, request_deadline, check_deadline
+from utils.batching import DeadlineExceeded
+from utils.frames import FRAME_TYPES, FrameError, read_frames
+from utils.quality import PoorQuality
+from utils.metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, REQUEST_SECONDS, IN_FLIGHT, PREDICTIONS, ERRORS,
+    StageTimer, observe_stages, server_timing
+)
+from utils.responses import JSON_MIMETYPE
+
+# ================= CONFIGURATION =================
+# Requests decoding/inferring at once, and how many more may wait for a slot
+ASGI_MAX_CONCURRENCY = int(os.environ.get("ASGI_MAX_CONCURRENCY", 2 * api.BATCH_MAX_SIZE))
+ASGI_MAX_QUEUE = int(os.environ.get("ASGI_MAX_QUEUE", 4 * api.BATCH_MAX_SIZE))
+
+# Budget applied when the client sends no X-Request-Timeout-Ms (0 disables)
+ASGI_REQUEST_TIMEOUT_MS = float(os.environ.get("ASGI_REQUEST_TIMEOUT_MS", 30000))
+
+# Retry-After while the model is still loading
+NOT_READY_RETRY_AFTER = 5
+
+admission = AdmissionController(ASGI_MAX_CONCURRENCY, ASGI_MAX_QUEUE)
+
+
+def json_response(body, version, tier=None):
+    headers = {"X-Model-Version": version}
+    if tier is not None:
+        headers["X-Cascade-Tier"] = tier
+    return Response(body, media_type=JSON_MIMETYPE, headers=headers)
+
+
+def error(message, status, kind, retry_after=None):
+    ERRORS.inc(type=kind)
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+    return JSONResponse({"error": message}, status_code=status, headers=headers)
+
+
+class BodyTooLarge(Exception):
+    """A request body past MAX_CONTENT_LENGTH; answered with 413"""
+
+
+def limit_body(request):
+    """``request`` with its body capped at MAX_CONTENT_LENGTH as it streams in.
+
+    Content-Length is checked up front, but chunked or unannounced bodies are
+    counted chunk by chunk, so body(), form() and json() all stop at the limit
+    instead of buffering whatever the client sends.
+    """
+    limit = api.app.config["MAX_CONTENT_LENGTH"]
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise BodyTooLarge()
+    received = 0
+
+    async def receive():
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise BodyTooLarge()
+        return message
+
+    return Request(request.scope, receive)
+
+
+async def too_large(request, exc):
+    return error("File too large", 413, "too_large")
+
+
+# ================= ROUTES =================
+async def health(request):
+    """Liveness plus the Flask app's stats and the admission queue"""
+    body = api.health_status()
+    body["admission"] = admission.stats()
+    return JSONResponse(body)
+
+
+async def ready(request):
+    body, status = api.readiness()
+    return JSONResponse(body, status_code=status)
+
+
+async def classes(request):
+    return JSONResponse(api.CLASS_NAMES)
+
+
+async def metrics(request):
+    return Response(REGISTRY.render(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+async def models(request):
+    return JSONResponse(api.models_status())
+
+
+async def shadow_report(request):
+    since = request.query_params.get("since")
+    try:
+        since = float(since) if since else None
+    except ValueError:
+        return error("since must be a unix timestamp", 400, "bad_request")
+    # sqlite aggregation; keep it off the event loop
+    body = await asyncio.get_running_loop().run_in_executor(None, api.shadow_summary, since)
+    if body is None:
+        return JSONResponse({"error": "Shadow evaluation is off (set SHADOW_MODEL)"}, status_code=404)
+    return JSONResponse(body)
+
+
+async def models_reload(request):
+    request = limit_body(request)
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    version = (payload if isinstance(payload, dict) else {}).get("version") or request.query_params.get("version")
+    client = request.client.host if request.client else None
+    body, status = api.request_reload(version, request.headers.get("x-reload-token"), client)
+    return JSONResponse(body, status_code=status)
+
+
+async def history_records(request):
+    body, status = await asyncio.get_running_loop().run_in_executor(None, api.history_query, request.query_params)
+    return JSONResponse(body, status_code=status)
+
+
+async def history_counts(request):
+    body, status = await asyncio.get_running_loop().run_in_executor(
+        None, api.history_query, request.query_params, True
+    )
+    return JSONResponse(body, status_code=status)
+
+
+async def cases_report(request):
+    if api.case_index is None:
+        return JSONResponse({"error": "Case index disabled (set CASE_INDEX_DIR)"}, status_code=404)
+    return JSONResponse(await asyncio.get_running_loop().run_in_executor(None, api.case_index.stats))
+
+
+async def cases_add(request):
+    if not api.engine.ready:
+        return error("Model not loaded", 503, "model_not_loaded", NOT_READY_RETRY_AFTER)
+    form = await limit_body(request).form(max_files=1)
+    try:
+        file = form.get("file")
+        if file is None or not hasattr(file, "read") or not file.filename or not api.allowed_file(file.filename):
+            return error('Upload one image as "file"', 400, "no_file")
+        buf = await file.read()
+        fields = {k: v for k, v in form.items() if isinstance(v, str)}
+    finally:
+        await form.close()
+
+    client = request.client.host if request.client else None
+    try:
+        body, status = await asyncio.get_running_loop().run_in_executor(
+            None, api.add_case, buf, fields.get("label"), fields, request.headers.get("x-cases-token"), client
+        )
+    except PoorQuality as e:
+        return JSONResponse(api.retake(e), status_code=422)
+    return JSONResponse(body, status_code=status)
+
+
+async def predict(request):
+    deadline = request_deadline(request.headers.get("x-request-timeout-ms"), ASGI_REQUEST_TIMEOUT_MS)
+    timer = request.state.timer
+
+    if not api.engine.ready:
+        return error("Model not loaded", 503, "model_not_loaded", NOT_READY_RETRY_AFTER)
+    request = limit_body(request)
+
+    # Slow uploads are awaited here without holding a worker thread or a model slot
+    mimetype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if mimetype in FRAME_TYPES:
+        # Pre-resized frame as the raw body: no multipart parsing, decode or resize
+        with timer.stage("upload"):
+            buf = await request.body()
+        try:
+            source = read_frames(buf, mimetype)[0]
+        except FrameError as e:
+            return error(str(e), 400, "invalid_frame")
+        form = {}
+    else:
+        with timer.stage("upload"):
+            form = await request.form(max_files=1)
+        file = form.get("file")
+        try:
+            if file is None or not hasattr(file, "read"):
+                return error("No file uploaded", 400, "no_file")
+            if not file.filename:
+                return error("Empty filename", 400, "empty_filename")
+            if not api.allowed_file(file.filename):
+                return error("Invalid file type", 400, "invalid_file_type")
+            with timer.stage("upload"):
+                buf = source = await file.read()
+        finally:
+            await form.close()
+    tta = api.request_flag(request.query_params.get("tta", form.get("tta")), api.TTA_DEFAULT)
+    tiles = api.request_flag(request.query_params.get("tiles", form.get("tiles")))
+    similar = api.request_flag(request.query_params.get("similar", form.get("similar")))
+    invalid = api.check_modes(tta, tiles, similar, frame=source is not buf)
+    if invalid is not None:
+        return error(*invalid)
+    mode = api.predict_mode(tta, tiles, similar)
+    tags = api.history_tags(request.query_params, form)
+
+    try:
+        # Held across the awaits: a hot reload lets this request finish on its model
+        with api.engine.serving() as primary:
+            shadow = api.shadow
+            single = not (tta or tiles or similar)
+            use_shadow = shadow is not None and single
+            served, sampled = shadow.route(primary) if use_shadow else (primary, False)
+            cascade = api.cascade if single and not sampled else None
+            key = api.cache_key(buf, served, tta, cascade is not None, tiles) if not similar else None
+            if key is not None:
+                with timer.stage("cache"):
+                    cached = api.cache.get(key)
+                if cached is not None:
+                    disease, body, version, preds = api.from_cache(cached, served)
+                    PREDICTIONS.inc(disease=disease)
+                    api.record_history(preds, disease, version, mode, tags, cached=True)
+                    with timer.stage("serialize"):
+                        return json_response(body, version)
+
+            check_deadline(deadline, "admission")
+            async with admission.admit(deadline):
+                if tiles or similar:
+                    # Direct forward passes (tile batches, embeddings): keep them off the event loop
+                    answered = served
+                    disease, body, preds = await asyncio.get_running_loop().run_in_executor(
+                        None, api.predict_tiled if tiles else api.predict_similar, served, source, timer
+                    )
+                else:
+                    disease, body, answered, preds = await run_prediction(
+                        served, source, deadline, timer, tta, cascade,
+                        observe=(lambda tensor, preds, ms: shadow.observe(primary, served, tensor, preds, ms))
+                        if sampled else None
+                    )
+            PREDICTIONS.inc(disease=disease)
+            tier = None
+            if cascade is not None:
+                tier = request.state.cascade_tier = cascade.tier(answered)
+            api.record_history(preds, disease, answered.version, mode, tags, tier=tier)
+
+            if key is not None:
+                api.cache.put(key, api.cache_value(disease, body, answered.version, preds))
+            with timer.stage("serialize"):
+                return json_response(body, answered.version, tier)
+
+    except PoorQuality as e:
+        return JSONResponse(api.retake(e), status_code=422)
+    except Rejected as e:
+        return error(str(e), e.status, "rejected", e.retry_after)
+    except DeadlineExceeded as e:
+        return error(str(e), 504, "deadline_exceeded")
+    except Exception as e:
+        traceback.print_exc()
+        return error(str(e), 500, type(e).__name__)
+
+
+class TensorLease:
+    """Hands a preprocessed job's pool slot back once nothing reads its tensor.
+
+    A request cancelled mid-inference (client gone, deadline passed) must not
+    free the slot while the micro-batcher may still be copying the tensor into
+    its batch, or an executor thread is still running on it: the next request
+    would overwrite it mid-read. The request itself is one holder.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def hold(self, future):
+        """Keep the slot until a concurrent future (a batcher submission) is done"""
+        with self._lock:
+            self._holders += 1
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def holding(self, fn):
+        """fn for an executor thread, keeping the slot until it returns"""
+        with self._lock:
+            self._holders += 1
+
+        def run(*args):
+            try:
+                return fn(*args)
+            finally:
+                self.release()
+        return run
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders:
+                return
+        self.job.release()
+
+
+async def run_prediction(served, buf, deadline, timer, tta=False, cascade=None, observe=None):
+    """Decode/preprocess on the pool, queue for the micro-batcher (through the cascade's
+    fast tier first, or all TTA views as one batch on an executor); returns
+    (disease, JSON body, model that answered, output row).
+
+    ``observe(tensor, preds, inference_ms)`` sees the tensor before it goes back to the pool.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    # Shielded: a request cancelled during preprocessing still hands its slot back
+    preprocessing = loop.run_in_executor(None, api.engine.pool.preprocess, buf)
+    try:
+        job = await asyncio.shield(preprocessing)
+    except asyncio.CancelledError:
+        preprocessing.add_done_callback(lambda f: f.exception() is None and f.result().release())
+        raise
+    lease = TensorLease(job)
+    try:
+        check_deadline(deadline, "inference")
+        with timer.stage("inference"):
+            answered, tta_info = served, None
+            if tta:
+                preds, _, tta_info = await loop.run_in_executor(
+                    None, lease.holding(api.run_inference), served, job.tensor, True
+                )
+            elif cascade is not None:
+                fast_row = await asyncio.wrap_future(lease.hold(cascade.fast.submit(job.tensor, deadline=deadline)))
+                if cascade.confident(fast_row):
+                    preds, answered = fast_row, cascade.fast
+                    cascade.record(fast_row)
+                else:
+                    preds = await asyncio.wrap_future(lease.hold(served.submit(job.tensor, deadline=deadline)))
+                    cascade.record(fast_row, preds)
+            else:
+                preds = await asyncio.wrap_future(lease.hold(served.submit(job.tensor, deadline=deadline)))
+        if observe is not None:
+            observe(job.tensor, preds, timer.timings["inference"])
+    finally:
+        # Not job.release(): a batcher or executor may still be reading the tensor
+        lease.release()
+    timer.add(job.timings)
+
+    api.stage_stats.record({
+        **job.timings,
+        "inference": timer.timings["inference"],
+        "total": (time.perf_counter() - start) * 1000
+    })
+    with timer.stage("format"):
+        disease, body = api.render_response(preds, answered.version, tta_info)
+    return disease, body, answered, preds
+
+
+class MetricsMiddleware:
+    """Request latency, in-flight gauge, stage histograms and Server-Timing"""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = set(routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timer = StageTimer()
+        scope.setdefault("state", {})["timer"] = timer
+        route = scope["path"] if scope["path"] in self.routes else "unmatched"
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if api.SERVER_TIMING and timer.timings:
+                    value = server_timing({**timer.timings, "total": timer.total_ms()})
+                    message = {**message, "headers": list(message.get("headers", [])) +
+                               [(b"server-timing", value.encode())]}
+            await send(message)
+
+        with IN_FLIGHT.track_inprogress(route=route):
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                REQUEST_SECONDS.observe(timer.total_ms() / 1000.0, route=route, status=status["code"])
+                observe_stages(timer.timings)
+                tier = scope["state"].get("cascade_tier")
+                if tier is not None:
+                    api.cascade.observe_latency(tier, timer.total_ms())
+
+
+# ================= APP =================
+@asynccontextmanager
+async def lifespan(app):
+    # Importing app.py already started the background model load (MODEL_AUTOLOAD)
+    # and the registry watcher; USR2 needs the main thread, which runs this
+    api.install_reload_signal()
+    yield
+    await asyncio.get_running_loop().run_in_executor(None, api.shutdown)
+
+
+routes = [
+    Route("/health", health, methods=["GET"]),
+    Route("/ready", ready, methods=["GET"]),
+    Route("/classes", classes, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/models", models, methods=["GET"]),
+    Route("/models/reload", models_reload, methods=["POST"]),
+    Route("/shadow", shadow_report, methods=["GET"]),
+    Route("/history", history_records, methods=["GET"]),
+    Route("/history/counts", history_counts, methods=["GET"]),
+    Route("/cases", cases_report, methods=["GET"]),
+    Route("/cases", cases_add, methods=["POST"]),
+    Route("/predict", predict, methods=["POST"]),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(MetricsMiddleware, routes=[r.path for r in routes]),
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+    ],
+    exception_handlers={BodyTooLarge: too_large},
+    lifespan=lifespan,
+)
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the prediction service
+Run from backend/, e.g. python -m benchmarks.bench_decode
+"""
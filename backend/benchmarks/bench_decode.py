@@ -0,0 +1,155 @@
+"""
+Decode benchmark: full JPEG decode vs DCT-domain reduced decode
+
+Reports decode + preprocess time and peak RSS for each path (each run in its
+own process so peak RSS is not shared), plus an accuracy check comparing the
+preprocessed tensors and, with --model, top-1 agreement.
+
+Usage (from backend/):
+    python -m benchmarks.bench_decode --images path/to/leaves
+    python -m benchmarks.bench_decode --synthetic 8 --model model/best_model.keras
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import synthetic_jpeg, peak_rss_mb, current_rss_mb
+from utils.image_io import decode_image
+from utils.preprocessing import preprocess_image, DECODE_MIN_SIDE
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# ================= INPUTS =================
+def write_synthetic_jpegs(folder, count, size=(3000, 4000), seed=0):
+    """Camera-sized JPEGs with leaf-like low-frequency structure plus noise"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"synthetic_{i}.jpg")
+        with open(path, "wb") as f:
+            f.write(synthetic_jpeg(size, seed=seed + i))
+        paths.append(path)
+    return paths
+
+
+def folder_images(folder, limit=None):
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+                if limit and len(paths) >= limit:
+                    return paths
+    return paths
+
+
+# ================= MEASUREMENT =================
+def _run_mode(paths, min_side, repeats, conn):
+    """Child process: time decode + preprocess, report peak RSS growth.
+
+    Files are read one at a time (outside the timed region) so only a single
+    encoded image is resident and the peak reflects the decode path.
+    """
+    baseline = current_rss_mb()
+    decode_ms, total_ms, tensors = [], [], []
+    for r in range(repeats):
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            t0 = time.perf_counter()
+            img = decode_image(data, min_side=min_side)
+            t1 = time.perf_counter()
+            tensor = preprocess_image(img)
+            t2 = time.perf_counter()
+            decode_ms.append((t1 - t0) * 1000)
+            total_ms.append((t2 - t0) * 1000)
+            if r == 0:
+                tensors.append(tensor[0])
+    conn.send({
+        'decode_ms_mean': float(np.mean(decode_ms)),
+        'decode_ms_p95': float(np.percentile(decode_ms, 95)),
+        'decode_preprocess_ms_mean': float(np.mean(total_ms)),
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_growth_mb': peak_rss_mb() - baseline,
+        'tensors': np.stack(tensors),
+    })
+    conn.close()
+
+
+def measure(paths, min_side, repeats):
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_run_mode, args=(paths, min_side, repeats, child))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def top1_agreement(model_path, full, reduced):
+    from tensorflow.keras.models import load_model
+    model = load_model(model_path)
+    a = np.argmax(model.predict(full, verbose=0), axis=1)
+    b = np.argmax(model.predict(reduced, verbose=0), axis=1)
+    return float(np.mean(a == b))
+
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Folder of sample leaf photos")
+    parser.add_argument("--limit", type=int, default=64, help="Max images to load from --images")
+    parser.add_argument("--synthetic", type=int, default=8, help="Synthetic 12MP JPEGs when --images is not given")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--model", help="Keras model for the top-1 agreement check")
+    parser.add_argument("--out", default=os.path.join("benchmarks", "results", "decode.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images:
+            paths = folder_images(args.images, args.limit)
+        else:
+            paths = write_synthetic_jpegs(tmp, args.synthetic)
+        if not paths:
+            raise SystemExit("No images found")
+        print(f"🖼️  {len(paths)} images, {args.repeats} repeats")
+
+        full = measure(paths, None, args.repeats)
+        reduced = measure(paths, DECODE_MIN_SIDE, args.repeats)
+
+    diff = np.abs(full['tensors'] - reduced['tensors'])
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'images': len(paths),
+        'source': args.images or f"synthetic x{args.synthetic}",
+        'full': {k: v for k, v in full.items() if k != 'tensors'},
+        'reduced': {k: v for k, v in reduced.items() if k != 'tensors'},
+        'tensor_mean_abs_diff': float(diff.mean()),
+        'tensor_max_abs_diff': float(diff.max()),
+        'top1_agreement': top1_agreement(args.model, full['tensors'], reduced['tensors']) if args.model else None,
+    }
+
+    for mode in ('full', 'reduced'):
+        r = report[mode]
+        print(f"{mode:>8}: decode {r['decode_ms_mean']:.1f} ms (p95 {r['decode_ms_p95']:.1f}), "
+              f"decode+preprocess {r['decode_preprocess_ms_mean']:.1f} ms, "
+              f"peak RSS +{r['peak_rss_growth_mb']:.0f} MB")
+    print(f"tensor |diff| mean {report['tensor_mean_abs_diff']:.4f}, max {report['tensor_max_abs_diff']:.4f}")
+    if report['top1_agreement'] is not None:
+        print(f"top-1 agreement: {report['top1_agreement'] * 100:.1f}%")
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
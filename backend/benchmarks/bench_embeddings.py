@@ -0,0 +1,69 @@
+"""
+Case index: append cost, search latency and recall@k against exact search
+
+Synthetic embeddings (class centre + low-rank variation + noise, the shape
+of real CNN features) are appended in chunks, the index is reopened from
+disk, and noisy copies of stored cases are searched.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --cases 100000 --dim 1280
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import environment, save_results, summarize_ms, RESULTS_DIR
+from utils.embeddings import DEFAULT_K, EmbeddingIndex, normalize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=1280)
+    parser.add_argument("--classes", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "embeddings.json"))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.classes, args.dim)).astype(np.float32)
+    labels = rng.integers(0, args.classes, args.cases)
+    basis = rng.standard_normal((32, args.dim)).astype(np.float32)
+    data = (centers[labels] + rng.standard_normal((args.cases, 32)).astype(np.float32) @ basis
+            + 0.3 * rng.standard_normal((args.cases, args.dim)).astype(np.float32))
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = EmbeddingIndex(directory, args.dim, model="bench")
+        start = time.perf_counter()
+        for i in range(0, args.cases, 500):
+            index.add(data[i:i + 500], [{'label': f"class{c}"} for c in labels[i:i + 500]])
+        add_ms = (time.perf_counter() - start) * 1000
+        print(f"  {args.cases:,} cases appended in {add_ms:.0f} ms")
+
+        reopened = EmbeddingIndex(directory, args.dim, model="bench")
+        exact = normalize(data)
+        recalls, times = [], []
+        for q in rng.integers(0, args.cases, args.queries):
+            query = data[q] + 0.5 * rng.standard_normal(args.dim).astype(np.float32)
+            t0 = time.perf_counter()
+            ids, _ = reopened.search(query, args.k)
+            times.append((time.perf_counter() - t0) * 1000)
+            truth = np.argsort(-(exact @ normalize(query)))[:args.k]
+            recalls.append(len(set(ids) & set(truth)) / args.k)
+        search = summarize_ms(times)
+        recall = round(float(np.mean(recalls)), 4)
+        print(f"  search: recall@{args.k} {recall}, p50 {search['p50']:.2f} ms, p95 {search['p95']:.2f} ms")
+
+    report = {'benchmark': 'embeddings', **environment(), 'cases': args.cases, 'dim': args.dim, 'k': args.k,
+              'add_ms': round(add_ms, 1), 'recall': recall, 'search_ms': search}
+    save_results(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
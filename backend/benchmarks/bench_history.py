@@ -0,0 +1,86 @@
+"""
+Prediction history: write throughput and trend-query latency on a large store
+
+    queued    records handed to the background writer, then flushed
+    fill      bulk inserts (a year over 4 orchards x 10 plots) with their rollups
+    queries   /history/counts shapes: hourly for one plot, weekly per orchard, ...
+
+The store is a scratch sqlite file, removed afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --rows 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import environment, save_results, summarize_ms, RESULTS_DIR
+from utils.history import DAY, HistoryStore, PredictionHistory, history_row
+
+CLASSES = [f"class{i}" for i in range(8)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "history.json"))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.db"))
+        history = PredictionHistory(store, CLASSES)
+        now = time.time()
+
+        start = time.perf_counter()
+        for _ in range(200):
+            history.record(rng.dirichlet(np.ones(len(CLASSES))), "v1", orchard="North", plot="B4")
+        history.flush()
+        queued_ms = (time.perf_counter() - start) * 1000
+        print(f"  200 queued records: {queued_ms:.0f} ms, {history.stats()['batches']} transactions")
+
+        start = time.perf_counter()
+        chunk = 50_000
+        for done in range(0, args.rows, chunk):
+            n = min(chunk, args.rows - done)
+            preds = rng.dirichlet(np.ones(len(CLASSES)), n).astype(np.float32)
+            ts = now - rng.random(n) * 365 * DAY
+            orchards = rng.integers(0, 4, n)
+            plots = rng.integers(0, 10, n)
+            store.add([
+                history_row(float(t), p, "v1", "api", "single", f"orchard{o}", f"plot{pl}")
+                for t, p, o, pl in zip(ts, preds, orchards, plots)
+            ])
+        fill_s = time.perf_counter() - start
+        size_mb = os.path.getsize(store.path) / 1e6
+        print(f"  fill: {store.size():,} rows in {fill_s:.1f} s, {size_mb:.0f} MB")
+
+        queries = {
+            'hour_one_plot_7d': dict(bucket='hour', orchard='orchard2', plot='plot3', since=now - 7 * DAY),
+            'week_one_orchard_all': dict(bucket='week', orchard='orchard1'),
+            'week_per_orchard_all': dict(bucket='week', group='orchard'),
+            'day_per_plot_30d': dict(bucket='day', since=now - 30 * DAY),
+        }
+        results = {}
+        for name, query in queries.items():
+            times = []
+            for _ in range(args.repeats):
+                result = history.counts(**query)
+                times.append(result['query_ms'])
+            results[name] = {'buckets': len(result['buckets']), **summarize_ms(times)}
+            print(f"  {name}: {results[name]['buckets']} buckets, {results[name]['p50']:.1f} ms (p50)")
+        history.close()
+
+    report = {'benchmark': 'history', **environment(), 'rows': args.rows, 'queued_200_ms': round(queued_ms, 1),
+              'fill_seconds': round(fill_s, 2), 'store_mb': round(size_mb, 1), 'queries_ms': results}
+    save_results(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
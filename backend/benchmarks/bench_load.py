@@ -0,0 +1,117 @@
+"""
+Load generator for /predict
+
+Drives the Flask app in-process through its test client (or a running server
+with --url) from closed-loop client threads at each concurrency level, and
+reports p50/p95/p99 latency, throughput and peak RSS. In-process runs use the
+registry's current model (or MODEL_PATH) when it exists, otherwise a small stand-in model, so the
+HTTP, decode and batching overhead can be tracked without the weights.
+
+Usage (from backend/):
+    python -m benchmarks.bench_load --concurrency 1,4,16,32
+    python -m benchmarks.bench_load --url http://localhost:5000 --duration 30
+    python -m benchmarks.compare benchmarks/results/load_before.json benchmarks/results/load.json
+"""
+
+import argparse
+import io
+import os
+
+from benchmarks.common import (
+    synthetic_jpeg, StandInBackend, multipart_body, post, drive_load,
+    peak_rss_mb, current_rss_mb, environment, save_results, RESULTS_DIR
+)
+from utils.startup import parse_batch_sizes
+
+
+# ================= TARGETS =================
+def in_process_sender(jpeg, use_cache=False):
+    """send() for the Flask test client; loads the real model or installs the stand-in"""
+    # Read by app.py at import time
+    os.environ["MODEL_AUTOLOAD"] = "0"
+    if not use_cache:
+        os.environ["CACHE_MAX_ENTRIES"] = "0"
+    import app
+
+    _, path, _ = app.resolve_model()
+    if os.path.exists(path):
+        if not app.load_inference_model():
+            raise SystemExit(f"Failed to load {path}")
+        model_desc = path
+    else:
+        print(f"⚠️ {path} not found, using the stand-in model")
+        app.install_model(StandInBackend(num_classes=len(app.CLASS_NAMES)), "standin")
+        model_desc = "stand-in"
+
+    def send():
+        # Test clients are cheap; one per call keeps threads independent
+        with app.app.test_client() as client:
+            resp = client.post("/predict", data={"file": (io.BytesIO(jpeg), "leaf.jpg")},
+                               content_type="multipart/form-data")
+            return resp.status_code
+
+    return send, model_desc
+
+
+def url_sender(url, jpeg):
+    body, content_type = multipart_body("file", "leaf.jpg", jpeg)
+    return lambda: post(url.rstrip("/") + "/predict", body, content_type), url
+
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Running server to target instead of the in-process app")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds per level")
+    parser.add_argument("--image-size", default="480x640", help="Synthetic JPEG HxW")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache on (in-process)")
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "load.json"))
+    args = parser.parse_args()
+
+    height, width = (int(v) for v in args.image_size.lower().split("x"))
+    jpeg = synthetic_jpeg((height, width))
+    baseline_rss = current_rss_mb()
+
+    if args.url:
+        send, target = url_sender(args.url, jpeg)
+    else:
+        send, target = in_process_sender(jpeg, use_cache=args.cache)
+    print(f"🎯 Target: {'in-process Flask app' if not args.url else args.url} ({target})")
+
+    report = {
+        'benchmark': 'load',
+        **environment(),
+        'target': args.url or "in-process",
+        'model': target,
+        'image_size': [height, width],
+        'image_bytes': len(jpeg),
+        'duration_s': args.duration,
+        'levels': {},
+    }
+
+    for concurrency in parse_batch_sizes(args.concurrency):
+        drive_load(send, concurrency, args.warmup)
+        r = drive_load(send, concurrency, args.duration)
+        r['rss_mb'] = round(current_rss_mb(), 1)
+        report['levels'][str(concurrency)] = r
+        print(f"  c={concurrency:>3}: {r['throughput_rps']:.1f} req/s, p50 {r['latency_ms_p50']:.1f} ms, "
+              f"p95 {r['latency_ms_p95']:.1f} ms, p99 {r['latency_ms_p99']:.1f} ms, {r['errors']} errors")
+
+    # Client-side only when --url is used; includes the model when in-process
+    report['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    report['peak_rss_growth_mb'] = round(peak_rss_mb() - baseline_rss, 1)
+    print(f"📈 Peak RSS {report['peak_rss_mb']:.0f} MB (+{report['peak_rss_growth_mb']:.0f} MB)")
+
+    if not args.url:
+        import app
+        report['batching'] = app.engine.batcher.stats()
+        report['stage_timings_ms'] = app.stage_stats.summary()
+        app.shutdown()
+
+    save_results(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Microbenchmarks for the prediction path, one stage at a time
+
+    decode      full and reduced-scale decode of a camera-sized and a small JPEG
+    preprocess  preprocess_image on a decoded image
+    predict     model.predict at batch sizes 1..64 (ms per batch and per image)
+    response    build_response for one row of model output
+
+Falls back to a small stand-in model when --model does not exist, so the
+non-model stages can always be measured.
+
+Usage (from backend/):
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --model model/best_model.keras --repeats 50
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.common import (
+    synthetic_jpeg, load_model, summarize_ms, time_call, environment, save_results, RESULTS_DIR
+)
+from utils.image_io import decode_image
+from utils.preprocessing import preprocess_image, DECODE_MIN_SIDE, INPUT_SHAPE
+from utils.startup import parse_batch_sizes
+
+DEFAULT_BATCH_SIZES = "1,2,4,8,16,32,64"
+DECODE_SIZES = {'12mp': (3000, 4000), 'vga': (480, 640)}
+
+
+# ================= STAGES =================
+def bench_decode(repeats):
+    results = {}
+    for label, size in DECODE_SIZES.items():
+        data = synthetic_jpeg(size)
+        results[label] = {
+            'full': summarize_ms(time_call(lambda: decode_image(data), repeats)),
+            'reduced': summarize_ms(time_call(lambda: decode_image(data, min_side=DECODE_MIN_SIDE), repeats)),
+        }
+    return results
+
+
+def bench_preprocess(repeats):
+    results = {}
+    for label, size in DECODE_SIZES.items():
+        img = decode_image(synthetic_jpeg(size), min_side=DECODE_MIN_SIDE)
+        results[label] = summarize_ms(time_call(lambda: preprocess_image(img), repeats))
+    return results
+
+
+def bench_predict(model, batch_sizes, repeats):
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in batch_sizes:
+        batch = rng.random((size,) + INPUT_SHAPE, dtype=np.float32)
+        stats = summarize_ms(time_call(lambda: model.predict(batch), repeats))
+        stats['per_image_mean'] = round(stats['mean'] / size, 4)
+        stats['images_per_s'] = round(1000 * size / stats['mean'], 1) if stats['mean'] else None
+        results[str(size)] = stats
+    return results
+
+
+def bench_response(model, repeats):
+    # Imported here: app.py builds its pools and cache at import time
+    os.environ.setdefault("MODEL_AUTOLOAD", "0")
+    import app
+
+    preds = model.predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32))[0]
+    return summarize_ms(time_call(lambda: app.build_response(preds), repeats * 10))
+
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", os.path.join("model", "best_model.keras")))
+    parser.add_argument("--backend", help="keras, tflite or onnx (default: from the model extension)")
+    parser.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "micro.json"))
+    args = parser.parse_args()
+
+    model, model_desc = load_model(args.model, args.backend)
+    print(f"🧠 Model: {model_desc} ({model.name})")
+
+    report = {'benchmark': 'micro', **environment(), 'model': model_desc, 'backend': model.name,
+              'repeats': args.repeats}
+
+    print("🖼️  decode...")
+    report['decode_ms'] = bench_decode(args.repeats)
+    print("🎨 preprocess...")
+    report['preprocess_ms'] = bench_preprocess(args.repeats)
+    print("🔮 predict...")
+    report['predict_ms'] = bench_predict(model, parse_batch_sizes(args.batch_sizes), args.repeats)
+    print("🧾 response...")
+    report['response_ms'] = bench_response(model, args.repeats)
+
+    for label, r in report['decode_ms'].items():
+        print(f"  decode {label:>5}: full {r['full']['p50']:.2f} ms, reduced {r['reduced']['p50']:.2f} ms (p50)")
+    for label, r in report['preprocess_ms'].items():
+        print(f"  preprocess {label:>5}: {r['p50']:.3f} ms (p50)")
+    for size, r in report['predict_ms'].items():
+        print(f"  predict batch {size:>3}: {r['p50']:.2f} ms, {r['per_image_mean']:.3f} ms/img")
+    print(f"  build_response: {report['response_ms']['p50'] * 1000:.1f} µs (p50)")
+
+    save_results(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Response assembly cost per request, before and after the pre-encoded templates
+
+    api           /predict body: build_response + json.dumps vs render_response
+    predict_leaf  format_prediction + json.dumps vs format_prediction_json
+
+Each path is timed with orjson (when installed) and with the stdlib encoder.
+Before timing, the template output is checked to decode to the same
+document as the dict path.
+
+Usage (from backend/):
+    python -m benchmarks.bench_response
+    python -m benchmarks.bench_response --repeats 20000
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from benchmarks.common import summarize_ms, time_call, environment, save_results, RESULTS_DIR
+from utils import responses
+
+
+def sample_rows(num_classes, count=64, seed=0):
+    """Softmax-like float32 rows, as the model returns them"""
+    logits = np.random.default_rng(seed).standard_normal((count, num_classes)).astype(np.float32) * 3
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def without_timestamp(doc):
+    doc.pop('timestamp', None)
+    return doc
+
+
+def check_parity(rows, app, predict):
+    for row in rows:
+        _, body = app.render_response(row)
+        if json.loads(body) != json.loads(json.dumps(app.build_response(row))):
+            raise SystemExit(f"❌ render_response differs from build_response for {row}")
+        rendered = without_timestamp(json.loads(predict.format_prediction_json(row)))
+        if rendered != without_timestamp(json.loads(json.dumps(predict.format_prediction(row)))):
+            raise SystemExit(f"❌ format_prediction_json differs from format_prediction for {row}")
+    print(f"✅ Template output matches the dict path on {len(rows)} rows")
+
+
+def bench(fn, rows, repeats):
+    """Per-call ms, cycling through rows so the winning class varies"""
+    state = {'i': 0}
+
+    def call():
+        fn(rows[state['i'] % len(rows)])
+        state['i'] += 1
+    return summarize_ms(time_call(call, repeats, warmup=100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5000)
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "response.json"))
+    args = parser.parse_args()
+
+    # Imported here: app.py builds its pools and cache at import time
+    os.environ.setdefault("MODEL_AUTOLOAD", "0")
+    import app
+    from utils import predict
+
+    rows = sample_rows(len(app.CLASS_NAMES))
+    check_parity(rows, app, predict)
+
+    paths = {
+        'api': {
+            'dict_json': lambda r: json.dumps(app.build_response(r)).encode(),
+            'template': app.render_response,
+        },
+        'predict_leaf': {
+            'dict_json': lambda r: json.dumps(predict.format_prediction(r)).encode(),
+            'template': predict.format_prediction_json,
+        },
+    }
+
+    fast = responses.orjson
+    encoders = {'orjson': fast, 'stdlib': None} if fast is not None else {'stdlib': None}
+    report = {'benchmark': 'response', **environment(), 'repeats': args.repeats,
+              'orjson': fast is not None, 'paths': {}}
+
+    for path, variants in paths.items():
+        report['paths'][path] = {}
+        for encoder, module in encoders.items():
+            responses.orjson = module
+            try:
+                results = {name: bench(fn, rows, args.repeats) for name, fn in variants.items()}
+            finally:
+                responses.orjson = fast
+            results['speedup'] = round(results['dict_json']['p50'] / results['template']['p50'], 2)
+            report['paths'][path][encoder] = results
+            print(f"  {path:>12} ({encoder}): dict+json.dumps {results['dict_json']['p50'] * 1000:.1f} µs, "
+                  f"template {results['template']['p50'] * 1000:.1f} µs (p50, {results['speedup']}x)")
+
+    save_results(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
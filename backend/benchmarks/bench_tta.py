@@ -0,0 +1,68 @@
+"""
+Cost of test-time augmentation against single-view inference
+
+    single    one view, batch of 1 (the default /predict forward pass)
+    augment   building the TTA batch from one preprocessed tensor
+    batched   augment + every view in one forward pass (what TTA mode runs)
+    loop      one forward pass per view, for comparison
+
+Falls back to a small stand-in model when --model does not exist.
+
+Usage (from backend/):
+    python -m benchmarks.bench_tta
+    python -m benchmarks.bench_tta --model model/best_model.keras --views identity,hflip,vflip
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.common import load_model, summarize_ms, time_call, environment, save_results, RESULTS_DIR
+from utils.preprocessing import INPUT_SHAPE
+from utils.tta import augment, aggregate, parse_views
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", os.path.join("model", "best_model.keras")))
+    parser.add_argument("--backend", help="keras, tflite or onnx (default: from the model extension)")
+    parser.add_argument("--views", help="comma-separated TTA views (default: utils.tta.DEFAULT_VIEWS)")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "tta.json"))
+    args = parser.parse_args()
+
+    views = parse_views(args.views)
+    model, model_desc = load_model(args.model, args.backend)
+    print(f"🧠 Model: {model_desc} ({model.name}), {len(views)} views")
+
+    tensor = np.random.default_rng(0).random(INPUT_SHAPE, dtype=np.float32)
+    batch = augment(tensor, views)
+    for size in (1, len(views)):
+        model.predict(np.zeros((size,) + INPUT_SHAPE, dtype=np.float32))
+
+    results = {
+        'single': summarize_ms(time_call(lambda: model.predict(tensor[None]), args.repeats)),
+        'augment': summarize_ms(time_call(lambda: augment(tensor, views, out=batch), args.repeats)),
+        'batched': summarize_ms(time_call(lambda: aggregate(model.predict(augment(tensor, views))), args.repeats)),
+        'loop': summarize_ms(time_call(
+            lambda: aggregate([model.predict(view[None])[0] for view in augment(tensor, views)]), args.repeats
+        )),
+    }
+    single = results['single']['p50']
+    for name in ('batched', 'loop'):
+        results[name]['x_single'] = round(results[name]['p50'] / single, 2) if single else None
+
+    report = {'benchmark': 'tta', **environment(), 'model': model_desc, 'backend': model.name,
+              'views': list(views), 'repeats': args.repeats, 'results_ms': results}
+
+    print(f"  single view:        {single:.2f} ms (p50)")
+    print(f"  augment:            {results['augment']['p50']:.3f} ms")
+    print(f"  TTA, one pass:      {results['batched']['p50']:.2f} ms ({results['batched']['x_single']}x single)")
+    print(f"  TTA, pass per view: {results['loop']['p50']:.2f} ms ({results['loop']['x_single']}x single)")
+
+    save_results(report, args.out)
+
+
+if __name__ == "__main__":
+    main()
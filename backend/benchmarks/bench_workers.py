@@ -0,0 +1,142 @@
+"""
+Worker scaling benchmark for the gunicorn deployment
+
+Starts `gunicorn -c gunicorn.conf.py app:app` once per worker count, waits
+for every worker to report ready, then drives /predict with concurrent
+clients for a fixed duration. Reports throughput, latency percentiles and
+the memory footprint of the whole server (RSS and PSS, where PSS counts
+copy-on-write shared pages once).
+
+Usage (from backend/):
+    python -m benchmarks.bench_workers --workers 1,2,4,8
+    python -m benchmarks.bench_workers --model model/best_model.tflite --concurrency 32
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from benchmarks.common import synthetic_jpeg, multipart_body, post, drive_load
+from utils.startup import parse_batch_sizes
+
+
+# ================= SERVER =================
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base_url, workers, timeout):
+    """Poll /ready until `workers` distinct processes have answered 200"""
+    ready_pids, deadline = set(), time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/ready", timeout=5) as resp:
+                ready_pids.add(json.loads(resp.read())["pid"])
+                if len(ready_pids) >= workers:
+                    return True
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    return False
+
+
+def _process_tree(pid):
+    children = []
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        pass
+    return [pid] + [p for c in children for p in _process_tree(c)]
+
+
+def _smaps_mb(pid, field):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def server_memory(pid):
+    """Summed RSS and PSS (shared pages split between sharers) of master + workers"""
+    pids = _process_tree(pid)
+    return {
+        'processes': len(pids),
+        'rss_mb': round(sum(_smaps_mb(p, "Rss") for p in pids), 1),
+        'pss_mb': round(sum(_smaps_mb(p, "Pss") for p in pids), 1),
+    }
+
+
+def run_workers(workers, args, body, content_type):
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}", ACCESS_LOG="")
+    if args.model:
+        env["MODEL_PATH"] = args.model
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_ready(base_url, workers, args.ready_timeout):
+            raise SystemExit(f"Server with {workers} workers did not become ready")
+        send = lambda: post(base_url + "/predict", body, content_type)
+        drive_load(send, args.concurrency, args.warmup)
+        result = drive_load(send, args.concurrency, args.duration)
+        result.update(server_memory(proc.pid))
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--model", help="MODEL_PATH for the server (default: app.py's)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of unmeasured load first")
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--out", default=os.path.join("benchmarks", "results", "workers.json"))
+    args = parser.parse_args()
+
+    body, content_type = multipart_body("file", "leaf.jpg", synthetic_jpeg())
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'model': args.model or "app.py default",
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'runs': {},
+    }
+
+    for workers in parse_batch_sizes(args.workers):
+        print(f"🚀 {workers} worker(s)...")
+        r = report['runs'][str(workers)] = run_workers(workers, args, body, content_type)
+        print(f"   {r['throughput_rps']:.1f} req/s, p50 {r['latency_ms_p50']:.1f} ms, "
+              f"p99 {r['latency_ms_p99']:.1f} ms, {r['errors']} errors, "
+              f"RSS {r['rss_mb']:.0f} MB / PSS {r['pss_mb']:.0f} MB")
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
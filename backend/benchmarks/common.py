@@ -0,0 +1,225 @@
+"""
+Shared helpers for the benchmarks: inputs, stand-in model, stats and results
+"""
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from utils.backends import InferenceBackend, load_backend
+from utils.preprocessing import INPUT_SHAPE
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+# ================= INPUTS =================
+def synthetic_image(size=(480, 640), seed=0):
+    """BGR uint8 image with leaf-like low-frequency structure plus noise"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, size=(max(size[0] // 128, 3), max(size[1] // 128, 4), 3), dtype=np.uint8)
+    img = cv2.resize(base, (size[1], size[0]), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(-12, 13, size=img.shape, dtype=np.int16)
+    return np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_jpeg(size=(480, 640), seed=0, quality=90):
+    img = synthetic_image(size, seed)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+# ================= STAND-IN MODEL =================
+class StandInBackend(InferenceBackend):
+    """Deterministic numpy classifier with the real model's input/output shapes.
+
+    Used when the trained weights are absent so the rest of the pipeline
+    (decode, batching, response assembly, HTTP) can still be measured. Its
+    own cost is small; predict timings from it say nothing about the CNN.
+    """
+
+    name = 'standin'
+
+    def __init__(self, num_classes=8, seed=0, **kwargs):
+        super().__init__("<stand-in>")
+        rng = np.random.default_rng(seed)
+        self._pool = 8
+        features = (INPUT_SHAPE[0] // self._pool) * (INPUT_SHAPE[1] // self._pool) * INPUT_SHAPE[2]
+        self._weights = rng.standard_normal((features, num_classes)).astype(np.float32) * 0.05
+        self._classes = num_classes
+
+    @property
+    def input_shape(self):
+        return (None,) + INPUT_SHAPE
+
+    @property
+    def output_shape(self):
+        return (None, self._classes)
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        n, h, w, c = batch.shape
+        p = self._pool
+        pooled = batch.reshape(n, h // p, p, w // p, p, c).mean(axis=(2, 4))
+        logits = pooled.reshape(n, -1) @ self._weights
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_model(path=None, backend=None):
+    """(backend, description): the model at path if it exists, else the stand-in"""
+    if path and os.path.exists(path):
+        return load_backend(path, backend), path
+    if path:
+        print(f"⚠️ {path} not found, using the stand-in model")
+    return StandInBackend(), "stand-in"
+
+
+# ================= MEASUREMENT =================
+def _proc_status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    raise ValueError(field)
+
+
+def peak_rss_mb():
+    # VmHWM is reset on exec; ru_maxrss can carry the parent's high-water mark
+    try:
+        return _proc_status_mb("VmHWM")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def current_rss_mb():
+    try:
+        return _proc_status_mb("VmRSS")
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def summarize_ms(samples):
+    """mean/p50/p95/p99/min/max of a list of millisecond timings"""
+    a = np.asarray(samples, dtype=np.float64)
+    if a.size == 0:
+        return {'n': 0}
+    return {
+        'n': int(a.size),
+        'mean': round(float(a.mean()), 4),
+        'p50': round(float(np.percentile(a, 50)), 4),
+        'p95': round(float(np.percentile(a, 95)), 4),
+        'p99': round(float(np.percentile(a, 99)), 4),
+        'min': round(float(a.min()), 4),
+        'max': round(float(a.max()), 4),
+    }
+
+
+def time_call(fn, repeats, warmup=3):
+    """Per-call wall times in ms after `warmup` untimed calls"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+# ================= LOAD =================
+def multipart_body(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def post(url, body, content_type, timeout=60):
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+        return resp.status
+
+
+def drive_load(send, concurrency, duration):
+    """Closed-loop clients: each calls send() again as soon as the last call returns.
+
+    send() returns an HTTP status; anything but 200, or an exception, counts
+    as an error and is left out of the latency percentiles.
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                status = send()
+            except Exception as e:
+                status = e
+            elapsed = (time.perf_counter() - t0) * 1000
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(str(status))
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client, name=f"load-{i}") for i in range(concurrency)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'latency_ms_p50': round(float(np.percentile(lat, 50)), 2),
+        'latency_ms_p95': round(float(np.percentile(lat, 95)), 2),
+        'latency_ms_p99': round(float(np.percentile(lat, 99)), 2),
+    }
+
+
+# ================= RESULTS =================
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def save_results(report, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Saved {path}")
@@ -0,0 +1,88 @@
+"""
+Compare two saved benchmark results
+
+Prints every numeric metric present in both files with its relative change
+and flags regressions beyond --threshold. Throughput-style metrics (req/s,
+images/s, agreement) are better when higher; everything timed in ms or
+measured in MB is better when lower. Exits 1 if any regression is flagged.
+
+Usage (from backend/):
+    python -m benchmarks.compare benchmarks/results/micro_main.json benchmarks/results/micro.json
+"""
+
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("throughput", "rps", "per_s", "agreement", "speedup")
+LOWER_IS_BETTER = ("_ms", "ms_", "mean", "p50", "p95", "p99", "rss", "max", "min")
+IGNORED = ("n", "count", "requests", "batches", "items", "timestamp",
+           "cpu_count", "repeats", "duration_s", "image_bytes")
+
+
+def flatten(obj, prefix=""):
+    """{'a': {'b': 1}} -> {'a.b': 1} for numeric leaves"""
+    out = {}
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            out.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix[:-1]] = obj
+    return out
+
+
+def direction(key):
+    """+1 if higher is better, -1 if lower is better, 0 if unknown"""
+    leaf = key.rsplit(".", 1)[-1]
+    if leaf in IGNORED:
+        return 0
+    if any(tag in key for tag in HIGHER_IS_BETTER):
+        return 1
+    if any(tag in key for tag in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(before, after, threshold):
+    a, b = flatten(before), flatten(after)
+    rows, regressions = [], []
+    for key in sorted(a.keys() & b.keys()):
+        sign = direction(key)
+        if sign == 0 or a[key] == 0:
+            continue
+        change = (b[key] - a[key]) / abs(a[key])
+        regressed = sign * change < -threshold
+        rows.append((key, a[key], b[key], change, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before.get('git_commit')} {before.get('timestamp')}")
+    print(f"after:  {after.get('git_commit')} {after.get('timestamp')}")
+    rows, regressions = compare(before, after, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    for key, old, new, change, regressed in rows:
+        flag = "❌" if regressed else "  "
+        print(f"{flag} {key:<{width}} {old:>12.3f} -> {new:>12.3f} ({change:+.1%})")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Export the Keras model to TFLite or ONNX Runtime formats
+
+Optionally applies dynamic-range or full INT8 post-training quantization
+(calibrated on a folder of leaf images) and writes an accuracy-parity report
+comparing the exported model's top-1 predictions with the Keras model.
+
+Usage (from backend/):
+    python export_model.py --model model/best_model.keras --format tflite
+    python export_model.py --format tflite --quantize int8 --calibration data/calibration
+    python export_model.py --format onnx --quantize dynamic --eval data/holdout
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from utils.backends import KerasBackend, load_backend
+from utils.image_io import load_image
+from utils.preprocessing import preprocess_image, DECODE_MIN_SIDE, INPUT_SHAPE
+from utils.engine import DISEASE_CLASSES
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+# ================= DATA =================
+def load_folder(folder, limit=None):
+    """Preprocessed (N, 224, 224, 3) float32 tensors for every image in folder"""
+    tensors = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = load_image(os.path.join(root, name), min_side=DECODE_MIN_SIDE)
+            tensors.append(preprocess_image(img)[0])
+            if limit and len(tensors) >= limit:
+                return np.stack(tensors)
+    if not tensors:
+        raise SystemExit(f"No images found in {folder}")
+    return np.stack(tensors)
+
+
+# ================= EXPORTERS =================
+def export_tflite(keras_model, out_path, quantize, calibration):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        def representative_dataset():
+            for sample in calibration:
+                yield [sample[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        # INT8 kernels throughout; float32 input/output keeps the API unchanged
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+
+
+class _CalibrationReader:
+    """onnxruntime CalibrationDataReader over preprocessed tensors"""
+
+    def __init__(self, input_name, calibration):
+        self._feeds = iter({input_name: sample[np.newaxis].astype(np.float32)} for sample in calibration)
+
+    def get_next(self):
+        return next(self._feeds, None)
+
+
+def export_onnx(keras_model, out_path, quantize, calibration):
+    import tensorflow as tf
+    import tf2onnx
+
+    spec = (tf.TensorSpec((None,) + INPUT_SHAPE, tf.float32, name="input"),)
+    if quantize == "none":
+        tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=13, output_path=out_path)
+        return
+
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model_fp32.onnx")
+        tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=13, output_path=fp32_path)
+        if quantize == "dynamic":
+            quantize_dynamic(fp32_path, out_path, weight_type=QuantType.QInt8)
+        else:
+            quantize_static(
+                fp32_path, out_path, _CalibrationReader("input", calibration),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QInt8,
+                weight_type=QuantType.QInt8
+            )
+
+
+EXPORTERS = {
+    'tflite': export_tflite,
+    'onnx': export_onnx,
+}
+
+
+# ================= PARITY =================
+def _timed_predict(backend, tensors, batch_size=16):
+    preds, start = [], time.perf_counter()
+    for i in range(0, len(tensors), batch_size):
+        preds.append(backend.predict(tensors[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(preds), elapsed * 1000 / len(tensors)
+
+
+def parity_report(reference, candidate, tensors):
+    """Top-1 agreement, probability drift and latency of candidate vs reference"""
+    ref_probs, ref_ms = _timed_predict(reference, tensors)
+    cand_probs, cand_ms = _timed_predict(candidate, tensors)
+    ref_top1 = np.argmax(ref_probs, axis=1)
+    cand_top1 = np.argmax(cand_probs, axis=1)
+    agree = ref_top1 == cand_top1
+    drift = np.abs(ref_probs - cand_probs)
+
+    per_class = {}
+    for idx, name in enumerate(DISEASE_CLASSES):
+        mask = ref_top1 == idx
+        if mask.any():
+            per_class[name] = {'images': int(mask.sum()), 'agreement': round(float(agree[mask].mean()), 4)}
+
+    return {
+        'images': int(len(tensors)),
+        'top1_agreement': round(float(agree.mean()), 4),
+        'max_abs_prob_diff': round(float(drift.max()), 6),
+        'mean_abs_prob_diff': round(float(drift.mean()), 6),
+        'reference_ms_per_image': round(ref_ms, 3),
+        'candidate_ms_per_image': round(cand_ms, 3),
+        'per_class': per_class,
+    }
+
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join("model", "best_model.keras"), help="Source .keras/.h5 model")
+    parser.add_argument("--format", choices=sorted(EXPORTERS), required=True)
+    parser.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="none")
+    parser.add_argument("--calibration", help="Folder of images for INT8 calibration")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--eval", help="Folder of images for the parity report (default: --calibration)")
+    parser.add_argument("--out", help="Output path (default: next to --model)")
+    args = parser.parse_args()
+
+    if args.quantize == "int8" and not args.calibration:
+        parser.error("--quantize int8 needs --calibration")
+
+    suffix = "" if args.quantize == "none" else f"_{args.quantize}"
+    out_path = args.out or f"{os.path.splitext(args.model)[0]}{suffix}.{args.format}"
+
+    print(f"📦 Loading Keras model: {args.model}")
+    reference = KerasBackend(args.model)
+    calibration = load_folder(args.calibration, args.calibration_limit) if args.calibration else None
+
+    print(f"🔧 Exporting {args.format} (quantize={args.quantize}) -> {out_path}")
+    EXPORTERS[args.format](reference.model, out_path, args.quantize, calibration)
+    print(f"✅ Wrote {out_path} ({os.path.getsize(out_path) / 1e6:.1f} MB)")
+
+    eval_folder = args.eval or args.calibration
+    if not eval_folder:
+        print("⚠️ No --eval/--calibration folder, skipping parity report")
+        return
+
+    candidate = load_backend(out_path, args.format)
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'source_model': args.model,
+        'exported_model': out_path,
+        'format': args.format,
+        'quantize': args.quantize,
+        'eval_folder': eval_folder,
+        **parity_report(reference, candidate, load_folder(eval_folder)),
+    }
+
+    report_path = os.path.splitext(out_path)[0] + "_parity.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"🎯 Top-1 agreement: {report['top1_agreement'] * 100:.2f}% on {report['images']} images")
+    print(f"⏱️  Keras {report['reference_ms_per_image']:.2f} ms/img vs "
+          f"{args.format} {report['candidate_ms_per_image']:.2f} ms/img")
+    print(f"💾 Parity report: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
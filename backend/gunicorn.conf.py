@@ -0,0 +1,69 @@
+"""
+Gunicorn configuration for production serving
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) and the model file is
+read there before workers fork, so TFLite/ONNX weights are shared
+copy-on-write. Each worker then builds its own runtime session on a
+background thread (/ready turns 200 once it is warm). CPU cores are split
+evenly between workers so their inference thread pools do not oversubscribe.
+"""
+
+import multiprocessing
+import os
+
+# ================= SERVER =================
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 0)) or max(1, multiprocessing.cpu_count() // 2)
+
+# Threads per worker feed concurrent /predict calls into the micro-batcher
+worker_class = "gthread"
+threads = int(os.environ.get("WORKER_THREADS", 8))
+
+preload_app = os.environ.get("PRELOAD_MODEL", "1") == "1"
+
+# Model load + warm-up runs off the request path, but leave headroom for slow disks
+timeout = int(os.environ.get("WORKER_TIMEOUT", 120))
+# On SIGTERM workers stop accepting and get this long to finish in-flight requests
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+accesslog = os.environ.get("ACCESS_LOG", "-") or None
+
+# ================= THREADS PER WORKER =================
+# Must be in the environment before app.py is imported (it reads them at import time)
+_per_worker = max(1, multiprocessing.cpu_count() // workers)
+os.environ.setdefault("INFERENCE_THREADS", str(_per_worker))
+os.environ.setdefault("INFERENCE_INTER_OP_THREADS", "1")
+os.environ.setdefault("OMP_NUM_THREADS", str(_per_worker))
+
+# Loading starts in post_fork; a loader thread in the master would not survive fork()
+os.environ["MODEL_AUTOLOAD"] = "0"
+
+
+# ================= HOOKS =================
+def on_starting(server):
+    server.log.info(
+        "Starting %d workers x %d threads, %s inference threads each",
+        workers, threads, os.environ["INFERENCE_THREADS"]
+    )
+    if preload_app:
+        import app
+        app.preload_model()
+
+
+def post_fork(server, worker):
+    import app
+    app.start_model_loading()
+
+
+def post_worker_init(server, worker):
+    # After the worker installs its own signal handlers, so ours is not overwritten
+    import app
+    app.install_reload_signal()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown()
@@ -0,0 +1,322 @@
+"""
+Bulk scanner for orchard survey folders
+
+Walks a directory tree, decodes images on a thread pool, runs batched
+inference and appends one row per image to a CSV, JSONL or Parquet output.
+Re-running with the same output skips images already recorded there, so an
+interrupted scan picks up where it stopped. Memory stays bounded by the
+prefetch window and batch size, not by the size of the folder.
+
+Usage (from backend/):
+    python scan.py survey/2024-06 --out scans/2024-06.csv
+    python scan.py survey/ --out scans/survey.parquet --batch-size 32 --workers 8
+    python scan.py survey/ --out scans/survey.jsonl --model model/mango_model.tflite
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from utils import predict
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+COLUMNS = ["path", "disease", "confidence", "category", "deficiencies", "error", "model_version", "scanned_at"]
+
+
+# ================= INPUT =================
+def iter_images(root, extensions=IMAGE_EXTENSIONS):
+    """Image paths under root (relative to it), depth-first in sorted order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(extensions):
+                yield os.path.relpath(os.path.join(dirpath, name), root)
+
+
+def iter_decoded(paths, root, pool, prefetch, engine=predict.engine):
+    """(path, tensor or exception) in input order, with at most `prefetch` decodes in flight"""
+    window = deque()
+    for path in paths:
+        window.append((path, pool.submit(engine.load_tensor, os.path.join(root, path))))
+        if len(window) >= prefetch:
+            path, future = window.popleft()
+            yield path, future.result()
+    while window:
+        path, future = window.popleft()
+        yield path, future.result()
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ================= OUTPUT =================
+def _trim_partial_line(path):
+    """Drop a trailing line cut short by an interrupted run"""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(max(size - 65536, 0))
+        tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        cut = tail.rfind(b"\n")
+        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+
+class CSVOutput:
+    def __init__(self, path):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            _trim_partial_line(path)
+            exists = os.path.getsize(path) > 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if not exists:
+            self._writer.writeheader()
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.exists(path):
+            return set()
+        with open(path, newline="", encoding="utf-8") as f:
+            return {row["path"] for row in csv.DictReader(f) if row.get("path")}
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JSONLOutput:
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            _trim_partial_line(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.exists(path):
+            return set()
+        done = set()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    continue
+        return done
+
+    def write(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetOutput:
+    """Directory of part files; each run adds parts of at most `rows_per_part` rows.
+
+    Parquet files are only readable once closed, so parts are kept small: an
+    interrupted run loses at most the part it was writing.
+    """
+
+    def __init__(self, path, rows_per_part=10000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa, self._pq = pa, pq
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self._schema = pa.schema([
+            ("path", pa.string()), ("disease", pa.string()), ("confidence", pa.float64()),
+            ("category", pa.string()), ("deficiencies", pa.string()), ("error", pa.string()),
+            ("model_version", pa.string()), ("scanned_at", pa.string()),
+        ])
+        self._writer = None
+        self._rows = 0
+        self._run = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self._part = 0
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def done_paths(path):
+        if not os.path.isdir(path):
+            return set()
+        import pyarrow.parquet as pq
+
+        done = set()
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".parquet"):
+                continue
+            try:
+                done.update(pq.read_table(os.path.join(path, name), columns=["path"]).column("path").to_pylist())
+            except Exception as e:
+                print(f"⚠️ Skipping unreadable part {name} (its images will be rescanned): {e}", file=sys.stderr)
+        return done
+
+    def write(self, rows):
+        if self._writer is None:
+            part = os.path.join(self.path, f"part-{self._run}-{self._part:05d}.parquet")
+            self._writer = self._pq.ParquetWriter(part, self._schema)
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+        self._rows += len(rows)
+        if self._rows >= self.rows_per_part:
+            self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._rows = 0
+            self._part += 1
+
+
+OUTPUTS = {
+    'csv': CSVOutput,
+    'jsonl': JSONLOutput,
+    'parquet': ParquetOutput,
+}
+
+
+def output_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in OUTPUTS:
+        raise SystemExit(f"Unknown output format '{fmt}' (use --format {'/'.join(OUTPUTS)})")
+    return fmt
+
+
+# ================= SCAN =================
+def result_rows(paths, preds, version, engine=predict.engine):
+    """Output rows for one batch; preds has an output row or the decode error per path"""
+    scanned_at = datetime.now().isoformat(timespec="seconds")
+    rows = []
+    for path, p in zip(paths, preds):
+        row = dict.fromkeys(COLUMNS)
+        row.update(path=path, model_version=version, scanned_at=scanned_at)
+        if isinstance(p, Exception):
+            row["error"] = str(p) or type(p).__name__
+        else:
+            disease, confidence = engine.classify(p)
+            row.update(
+                disease=disease,
+                confidence=round(confidence * 100, 2),
+                category='Healthy' if disease == 'Healthy' else 'Disease',
+                deficiencies="; ".join(predict.DISEASE_TO_NUTRIENTS_SIMPLE.get(disease, [])),
+            )
+        rows.append(row)
+    return rows
+
+
+class Progress:
+    """Throttled images/sec + ETA line on stderr"""
+
+    def __init__(self, total, interval=1.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, count, errors=0, force=False):
+        self.done += count
+        self.errors += errors
+        now = time.perf_counter()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        rate = self.done / max(now - self.start, 1e-9)
+        if self.total is not None:
+            eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+            eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+            pct = self.done / self.total if self.total else 1.0
+            line = f"{self.done}/{self.total} ({pct:.1%}) {rate:.1f} img/s ETA {eta_text}"
+        else:
+            line = f"{self.done} {rate:.1f} img/s"
+        print(f"\r🔍 {line}, {self.errors} errors ", end="", file=sys.stderr, flush=True)
+
+
+def scan(root, output, engine, batch_size=32, workers=4, prefetch=None, done=(), count=True):
+    prefetch = prefetch or 2 * batch_size
+    total = sum(1 for p in iter_images(root) if p not in done) if count else None
+    progress = Progress(total)
+    paths = (p for p in iter_images(root) if p not in done)
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="scan-decode") as pool:
+        for batch in iter_batches(iter_decoded(paths, root, pool, prefetch, engine), batch_size):
+            preds = engine.predict_tensors([t for _, t in batch])
+            output.write(result_rows([p for p, _ in batch], preds, engine.version, engine))
+            progress.update(len(batch), errors=sum(isinstance(p, Exception) for p in preds))
+
+    progress.update(0, force=True)
+    print(file=sys.stderr)
+    return progress
+
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Folder of leaf images (searched recursively)")
+    parser.add_argument("--out", required=True, help="Output .csv, .jsonl or .parquet (a folder of parts)")
+    parser.add_argument("--format", choices=sorted(OUTPUTS), help="Output format (default: from --out)")
+    parser.add_argument("--model", help="Model file (default: utils.predict's model search)")
+    parser.add_argument("--backend", help="keras, tflite or onnx (default: from the model extension)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4, help="Decode threads")
+    parser.add_argument("--no-count", action="store_true", help="Skip the counting pass (no ETA)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        raise SystemExit(f"Not a folder: {args.root}")
+
+    fmt = output_format(args.out, args.format)
+    engine = predict.engine
+    if args.model:
+        engine.load(args.model, args.backend)
+    else:
+        predict.load_prediction_model()
+
+    if os.path.dirname(args.out):
+        os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    # Opening first trims a partial last line left by an interrupted run
+    output = OUTPUTS[fmt](args.out)
+    try:
+        done = output.done_paths(args.out)
+        if done:
+            print(f"↩️  Resuming: {len(done)} images already in {args.out}", file=sys.stderr)
+        progress = scan(args.root, output, engine, args.batch_size, args.workers,
+                        done=done, count=not args.no_count)
+    finally:
+        output.close()
+
+    elapsed = time.perf_counter() - progress.start
+    print(f"✅ Scanned {progress.done} images in {elapsed:.1f}s "
+          f"({progress.done / max(elapsed, 1e-9):.1f} img/s, {progress.errors} errors) -> {args.out}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,9 +15,9 @@ def test_api():
     response = requests.get(f"{base_url}/classes")
     print(f"Classes: {response.json()}\n")
     
-    print("3. Testing model info...")
-    response = requests.get(f"{base_url}/model-info")
-    print(f"Model Info: {response.json()}\n")
+    print("3. Testing readiness...")
+    response = requests.get(f"{base_url}/ready")
+    print(f"Ready ({response.status_code}): {response.json()}\n")
     
     print("4. Testing prediction with a sample image...")
     # Create a dummy image for testing
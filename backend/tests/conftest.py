@@ -0,0 +1,26 @@
+"""
+Shared fixtures: encoded photos and an engine serving the benchmark stand-in model
+"""
+
+import cv2
+import pytest
+
+from benchmarks.common import StandInBackend
+from tests.images import random_image
+from utils.engine import InferenceEngine, DISEASE_CLASSES
+
+
+@pytest.fixture(scope="session")
+def jpegs():
+    """JPEGs at the model size, phone sizes and a portrait crop"""
+    sizes = ((224, 224), (480, 640), (1200, 1600), (300, 200))
+    return [cv2.imencode(".jpg", random_image(size + (3,), seed))[1].tobytes() for seed, size in enumerate(sizes)]
+
+
+@pytest.fixture(params=["thread", "process"])
+def engine(request):
+    """InferenceEngine with the stand-in model, preprocessing in threads or processes"""
+    engine = InferenceEngine(batch_max_size=4, preprocess_workers=2, preprocess_mode=request.param)
+    engine.install(StandInBackend(num_classes=len(DISEASE_CLASSES)), "standin")
+    yield engine
+    engine.close()
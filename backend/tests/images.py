@@ -0,0 +1,16 @@
+"""
+Synthetic test images
+"""
+
+import numpy as np
+
+
+def random_image(shape, seed=0):
+    """Uniform-noise uint8 image"""
+    return np.random.default_rng(seed).integers(0, 256, size=shape, dtype=np.uint8)
+
+
+def leaf_image(shape=(224, 224, 3), seed=0):
+    """Textured green BGR image that passes the leaf-colour mask"""
+    rng = np.random.default_rng(seed)
+    return np.clip(rng.normal((50, 150, 70), 25, shape), 0, 255).astype(np.uint8)
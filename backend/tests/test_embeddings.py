@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from utils.embeddings import EmbeddingIndex, normalize
+
+DIM, CLASSES, PER_CLASS = 256, 4, 500
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Class centres plus low-rank variation and noise, like real embeddings"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((CLASSES, DIM)).astype(np.float32)
+    labels = np.repeat(np.arange(CLASSES), PER_CLASS)
+    basis = rng.standard_normal((16, DIM)).astype(np.float32)
+    vectors = (centers[labels] + rng.standard_normal((len(labels), 16)).astype(np.float32) @ basis
+               + 0.3 * rng.standard_normal((len(labels), DIM)).astype(np.float32))
+    return vectors, labels
+
+
+@pytest.fixture
+def index(tmp_path, data):
+    vectors, labels = data
+    index = EmbeddingIndex(str(tmp_path), DIM, model="m1")
+    for start in range(0, len(vectors), 400):  # incremental appends
+        index.add(vectors[start:start + 400], [{'label': f"class{c}"} for c in labels[start:start + 400]])
+    return index
+
+
+def test_search_finds_the_exact_neighbours(tmp_path, index, data):
+    vectors, _ = data
+    reopened = EmbeddingIndex(str(tmp_path), DIM, model="m1")
+    assert len(reopened) == len(vectors)
+    exact = normalize(vectors)
+    rng = np.random.default_rng(1)
+    recalls = []
+    for q in rng.integers(0, len(vectors), 20):
+        query = vectors[q] + 0.5 * rng.standard_normal(DIM).astype(np.float32)
+        ids, _ = reopened.search(query, 10)
+        truth = np.argsort(-(exact @ normalize(query)))[:10]
+        recalls.append(len(set(ids) & set(truth)) / 10)
+    assert np.mean(recalls) >= 0.9
+
+
+def test_query_reports_labels_and_novelty(index, data):
+    vectors, _ = data
+    result = index.query(vectors[0])
+    assert result['similar_cases'][0]['label'] == "class0"
+    assert not result['novelty']['novel']
+    assert index.query(np.random.default_rng(2).standard_normal(DIM))['novelty']['novel']
+
+
+def test_index_belongs_to_one_model(tmp_path, index):
+    with pytest.raises(ValueError):
+        EmbeddingIndex(str(tmp_path), DIM, model="m2")
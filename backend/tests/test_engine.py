@@ -0,0 +1,31 @@
+import numpy as np
+
+from utils.image_io import load_image
+from utils.preprocessing import reference_preprocess
+
+
+def test_every_path_gives_the_same_tensor(engine, jpegs):
+    for data in jpegs:
+        offline = engine.preprocess(data)[0]
+        with engine.pool.preprocess(data) as job:
+            pooled = job.tensor.copy()
+        reference = reference_preprocess(load_image(data, min_side=engine.min_side))[0]
+        np.testing.assert_array_equal(pooled, offline)
+        np.testing.assert_array_equal(reference, offline)
+
+
+def test_every_path_ranks_the_same_top_k(engine, jpegs):
+    tensors = [engine.preprocess(data)[0] for data in jpegs]
+    batched = engine.predict_tensors(tensors)
+    for tensor, row in zip(tensors, batched):
+        expected = engine.top_k(row, 3)
+        for other in (engine.predict(tensor), engine.predict_batch(tensor[None])[0]):
+            assert [name for name, _ in engine.top_k(other, 3)] == [name for name, _ in expected]
+            np.testing.assert_allclose(other, row, rtol=1e-5, atol=1e-6)
+
+
+def test_failed_decodes_stay_in_place(engine, jpegs):
+    error = ValueError("Invalid image")
+    rows = engine.predict_tensors([engine.preprocess(jpegs[0])[0], error])
+    assert rows[1] is error
+    assert rows[0].shape == (len(engine.class_names),)
@@ -0,0 +1,70 @@
+import cv2
+import numpy as np
+import pytest
+
+from tests.images import random_image
+from utils.frames import (
+    FRAMES_CONTENT_TYPE, WEBP_CONTENT_TYPE, FrameError, decode_webp, encode_frames, frame_into, parse_frames,
+    read_frames
+)
+from utils.preprocessing import INPUT_SHAPE, preprocess_image
+
+BGR = random_image((3,) + INPUT_SHAPE)
+
+
+@pytest.mark.parametrize("order", ["BGR", "RGB"])
+def test_frames_match_the_image_pipeline_bit_for_bit(order):
+    frames = BGR if order == "BGR" else BGR[..., ::-1]
+    out = np.empty(INPUT_SHAPE, dtype=np.float32)
+    parsed = parse_frames(encode_frames(frames, order), max_frames=3)
+    assert len(parsed) == 3
+    for frame, img in zip(parsed, BGR):
+        np.testing.assert_array_equal(frame_into(frame, out), preprocess_image(img)[0])
+
+
+def test_quality_check_sees_bgr_pixels():
+    seen = []
+    frame = parse_frames(encode_frames(BGR[0][..., ::-1], "RGB"))[0]
+    frame_into(frame, np.empty(INPUT_SHAPE, dtype=np.float32), check=seen.append)
+    np.testing.assert_array_equal(seen[0], BGR[0])
+
+
+def test_lossless_webp_round_trip():
+    webp = cv2.imencode(".webp", BGR[0], [cv2.IMWRITE_WEBP_QUALITY, 101])[1].tobytes()
+    np.testing.assert_array_equal(decode_webp(webp)[0].pixels, BGR[0])
+
+
+PAYLOAD = encode_frames(BGR[0])
+
+
+@pytest.mark.parametrize("body, content_type, message", [
+    (PAYLOAD[:-1], FRAMES_CONTENT_TYPE, "frames need"),
+    (PAYLOAD[:10], FRAMES_CONTENT_TYPE, "shorter than"),
+    (b"JUNK" + PAYLOAD[4:], FRAMES_CONTENT_TYPE, "bad magic"),
+    (PAYLOAD[:4] + bytes([2]) + PAYLOAD[5:], FRAMES_CONTENT_TYPE, "version"),
+    (PAYLOAD[:5] + bytes([2]) + PAYLOAD[6:], FRAMES_CONTENT_TYPE, "uint8"),
+    (PAYLOAD[:6] + bytes([2]) + PAYLOAD[7:], FRAMES_CONTENT_TYPE, "NHWC"),
+    (PAYLOAD[:7] + bytes([0]) + PAYLOAD[8:], FRAMES_CONTENT_TYPE, "channel order"),
+    (PAYLOAD[:18] + bytes([1, 0]) + PAYLOAD[20:], FRAMES_CONTENT_TYPE, "Reserved"),
+    (encode_frames(BGR), FRAMES_CONTENT_TYPE, "Expected 1 to 1 frames"),
+    (cv2.imencode(".webp", BGR[0][:200])[1].tobytes(), WEBP_CONTENT_TYPE, "224x200"),
+    (PAYLOAD, WEBP_CONTENT_TYPE, "Not a WebP"),
+    (PAYLOAD, "image/jpeg", "Unsupported content type"),
+])
+def test_bad_payloads_are_rejected(body, content_type, message):
+    with pytest.raises(FrameError, match=message):
+        read_frames(body, content_type)
+
+
+def test_wrong_frame_size_is_rejected():
+    header = bytearray(PAYLOAD[:20])
+    header[12:14] = (200).to_bytes(2, "little")
+    with pytest.raises(FrameError, match="Frames must be"):
+        parse_frames(bytes(header) + PAYLOAD[20:])
+
+
+def test_encode_checks_its_input():
+    with pytest.raises(ValueError):
+        encode_frames(BGR.astype(np.float32))
+    with pytest.raises(ValueError):
+        encode_frames(BGR[0], order="HSV")
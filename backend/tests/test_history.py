@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+import pytest
+
+from utils.history import DAY, MAX_RECORDS, HistoryStore, PredictionHistory, history_row
+
+CLASSES = [f"class{i}" for i in range(4)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.db"))
+
+
+def fill(store, count, start, orchard="North", plot="B4", step=3600.0):
+    rng = np.random.default_rng(0)
+    store.add([
+        history_row(start + i * step, rng.dirichlet(np.ones(len(CLASSES))), "v1", "api", "single", orchard, plot)
+        for i in range(count)
+    ])
+
+
+def test_background_writer_batches_and_flushes(store):
+    history = PredictionHistory(store, CLASSES)
+    for _ in range(50):
+        history.record([0.1, 0.7, 0.1, 0.1], "v1", orchard="North", plot="B4")
+    history.flush()
+    stats = history.stats()
+    assert stats['written'] == 50 and stats['dropped'] == 0
+    assert stats['batches'] <= 50
+    record = history.records(limit=1)[0]
+    assert record['disease'] == "class1" and record['orchard'] == "North"
+
+
+def test_rollups_add_up_and_weeks_start_on_monday(store):
+    start = time.time() - 60 * DAY
+    fill(store, 500, start, step=3 * 3600.0)
+    fill(store, 200, start, orchard="South", plot=None, step=7 * 3600.0)
+    for bucket in ('hour', 'day', 'week'):
+        buckets = store.counts(CLASSES, bucket=bucket, group='all')
+        assert sum(b['total'] for b in buckets) == store.size() == 700
+    weeks = store.counts(CLASSES, bucket='week', group='orchard')
+    assert all(time.gmtime(b['start']).tm_wday == 0 for b in weeks)
+    assert {b['orchard'] for b in weeks} == {"North", "South"}
+    assert all(b['plot'] is None for b in store.counts(CLASSES, bucket='week', orchard="South"))
+
+
+def test_counts_filter_by_plot_and_time(store):
+    now = time.time()
+    fill(store, 48, now - 2 * DAY)
+    fill(store, 48, now - 2 * DAY, plot="C1")
+    recent = store.counts(CLASSES, bucket='hour', orchard="North", plot="B4", since=now - DAY)
+    assert all(b['plot'] == "B4" for b in recent)
+    assert sum(b['total'] for b in recent) <= 25
+
+
+def test_unknown_bucket_or_group_is_an_error(store):
+    with pytest.raises(ValueError):
+        store.counts(CLASSES, bucket='month')
+    with pytest.raises(ValueError):
+        store.counts(CLASSES, group='tree')
+
+
+@pytest.mark.parametrize("limit, expected", [(-1, 1), (0, 1), (5, 5), (10 ** 6, MAX_RECORDS)])
+def test_records_limit_is_clamped(store, limit, expected):
+    fill(store, MAX_RECORDS + 10, time.time() - DAY, step=1.0)
+    records = store.records(CLASSES, limit=limit)
+    assert len(records) == expected
+    assert [r['ts'] for r in records] == sorted((r['ts'] for r in records), reverse=True)
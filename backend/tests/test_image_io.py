@@ -0,0 +1,43 @@
+import io
+import tarfile
+import zipfile
+
+from utils.image_io import iter_archive_images
+
+
+def zip_archive(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buf
+
+
+def test_archive_yields_images_only():
+    buf = zip_archive([("a/1.jpg", b"one"), ("readme.txt", b"x"), ("a/2.PNG", b"two")])
+    assert list(iter_archive_images(buf, "set.zip")) == [("a/1.jpg", b"one"), ("a/2.PNG", b"two")]
+
+
+def test_oversized_member_is_reported_not_read():
+    bomb = zip_archive([("bomb.jpg", b"\0" * (4 << 20)), ("ok.jpg", b"fine")])
+    assert len(bomb.getvalue()) < 64 << 10
+    (name, error), ok = iter_archive_images(bomb, "set.zip", max_image_bytes=1 << 20)
+    assert name == "bomb.jpg" and isinstance(error, ValueError)
+    assert ok == ("ok.jpg", b"fine")
+
+
+def test_understated_size_is_caught_while_reading():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as archive:
+        info = tarfile.TarInfo("big.jpg")
+        info.size = 3000
+        archive.addfile(info, io.BytesIO(b"z" * 3000))
+    [(name, error)] = iter_archive_images(buf, "set.tar.gz", max_image_bytes=1000)
+    assert name == "big.jpg" and isinstance(error, ValueError)
+
+
+def test_archive_contributes_at_most_max_images():
+    buf = zip_archive([(f"{i}.jpg", b"x") for i in range(5)])
+    items = list(iter_archive_images(buf, "set.zip", max_images=3))
+    assert [name for name, _ in items] == ["0.jpg", "1.jpg", "2.jpg", "set.zip"]
+    assert isinstance(items[-1][1], ValueError)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from tests.images import random_image
+from utils.preprocessing import INPUT_SHAPE, preprocess_into, preprocess_image, reference_preprocess
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_fused_kernel_matches_training_pipeline(seed):
+    h, w = np.random.default_rng(seed).integers(64, 1600, size=2)
+    img = random_image((h, w, 3), seed)
+    out = np.empty(INPUT_SHAPE, dtype=np.float32)
+    np.testing.assert_array_equal(preprocess_into(img, out), reference_preprocess(img)[0])
+
+
+def test_preprocess_image_adds_batch_axis():
+    tensor = preprocess_image(random_image((300, 400, 3)))
+    assert tensor.shape == (1,) + INPUT_SHAPE
+    assert tensor.dtype == np.float32
+    assert 0.0 <= tensor.min() and tensor.max() <= 1.0
@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+import pytest
+
+from tests.images import leaf_image
+from utils.quality import ADVICE, PoorQuality, QualityGate
+
+LEAF = leaf_image()
+
+
+def test_a_sharp_leaf_passes():
+    QualityGate().check(LEAF)
+
+
+@pytest.mark.parametrize("reason, img", [
+    ('blurry', cv2.GaussianBlur(LEAF, (0, 0), 6)),
+    ('underexposed', LEAF // 8),
+    ('overexposed', np.full_like(LEAF, 250)),
+    ('no_leaf', np.clip(np.random.default_rng(1).normal((210, 170, 140), 15, LEAF.shape), 0, 255).astype(np.uint8)),
+])
+def test_poor_photos_are_turned_away(reason, img):
+    with pytest.raises(PoorQuality) as caught:
+        QualityGate().check(img)
+    assert reason in caught.value.reasons
+    report = caught.value.report()
+    assert report['retake'] is True
+    assert report['advice'] == [ADVICE[r] for r in caught.value.reasons]
+
+
+def test_zero_threshold_turns_a_check_off():
+    QualityGate(min_sharpness=0).check(cv2.GaussianBlur(LEAF, (0, 0), 6))
@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+
+from utils.responses import ResponseTemplate, ScoreList, Slot, dumps, encode_floats, extend, scale_floats
+
+CLASSES = ["Anthracnose", "Healthy", "Sooty Mould"]
+
+
+def build(name):
+    return {
+        'prediction': {'disease': name, 'confidence': Slot('confidence')},
+        'top_predictions': Slot('top'),
+        'note': "static \"quoted\" text é",
+    }
+
+
+def test_template_renders_the_same_json_as_the_dict_path():
+    template = ResponseTemplate(CLASSES, build)
+    scores = ScoreList(CLASSES)
+    preds = np.array([0.1, 0.7, 0.2], dtype=np.float32)
+    order = [1, 2, 0]
+    for index in range(len(CLASSES)):
+        values = {
+            'confidence': encode_floats([preds[index]])[0],
+            'top': scores.encode(order, encode_floats(preds[order])),
+        }
+        expected = template.as_dict(index, {
+            'confidence': float(preds[index]),
+            'top': [{'disease': CLASSES[i], 'confidence': float(preds[i])} for i in order],
+        })
+        assert json.loads(template.render(index, values)) == expected
+
+
+def test_template_slots():
+    assert ResponseTemplate(CLASSES, build).slots() == ['confidence', 'top']
+
+
+def test_non_finite_scores_encode_as_null():
+    encoded = encode_floats([0.5, float('nan'), float('inf'), -float('inf')], 100, 2)
+    assert encoded == [b'50.0', b'null', b'null', b'null']
+    assert json.loads(b"[" + b",".join(encoded) + b"]") == [50.0, None, None, None]
+
+
+def test_scaled_floats_are_rounded():
+    assert scale_floats(np.array([0.123456], dtype=np.float32), 100, 2) == [12.35]
+    assert [float(v) for v in encode_floats([1 / 3], decimals=4)] == [0.3333]
+
+
+def test_extend_adds_a_top_level_key():
+    body = extend(dumps({'a': 1}), "tiles", {'rows': 2})
+    assert json.loads(body) == {'a': 1, 'tiles': {'rows': 2}}
+    assert json.loads(extend(body, "novelty", None)) == {'a': 1, 'tiles': {'rows': 2}, 'novelty': None}
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from tests.images import leaf_image
+from utils.tiling import (
+    TILE_SIZE, aggregate_tiles, fit_image, leaf_fraction, leaf_integral, predict_tiles, tile_origins, tile_views
+)
+
+CLASSES = ["Anthracnose", "Sooty Mould", "Healthy"]
+HEALTHY = CLASSES.index("Healthy")
+HEALTHY_ROW = np.array([0.02, 0.03, 0.95], dtype=np.float32)
+SICK_ROW = np.array([0.6, 0.1, 0.3], dtype=np.float32)
+
+
+@pytest.mark.parametrize("length, stride, expected", [
+    (224, 112, [0]),
+    (448, 112, [0, 112, 224]),
+    (500, 112, [0, 112, 224, 276]),
+    (300, 224, [0, 76]),
+])
+def test_last_tile_is_flush_with_the_edge(length, stride, expected):
+    assert tile_origins(length, TILE_SIZE, stride) == expected
+
+
+def test_tile_views_copy_nothing():
+    img = leaf_image((300, 400, 3))
+    views = tile_views(img)
+    assert views.shape == (300 - TILE_SIZE + 1, 400 - TILE_SIZE + 1, TILE_SIZE, TILE_SIZE, 3)
+    assert np.shares_memory(views, img)
+    np.testing.assert_array_equal(views[10, 20], img[10:10 + TILE_SIZE, 20:20 + TILE_SIZE])
+
+
+def test_leaf_fraction():
+    img = np.zeros((448, 448, 3), dtype=np.uint8)
+    img[:, :224] = leaf_image((448, 224, 3))
+    integral = leaf_integral(img)
+    assert leaf_fraction(integral, 0, 0) > 0.9
+    assert leaf_fraction(integral, 0, 224) == 0.0
+
+
+def test_fit_image_bounds_both_sides():
+    assert max(fit_image(leaf_image((2000, 3000, 3)), max_side=1000).shape[:2]) == 1000
+    assert min(fit_image(leaf_image((100, 150, 3)), max_side=1000).shape[:2]) == TILE_SIZE
+
+
+def test_one_stray_tile_does_not_overrule_healthy_leaves():
+    row, votes, winners = aggregate_tiles([HEALTHY_ROW] * 10 + [SICK_ROW], HEALTHY)
+    assert winners == []
+    assert row.argmax() == HEALTHY
+    assert votes[0][0] == 1 and votes[HEALTHY][0] == 10
+
+
+def test_a_few_sick_leaves_still_diagnose_the_branch():
+    row, votes, winners = aggregate_tiles([HEALTHY_ROW] * 10 + [SICK_ROW] * 3, HEALTHY)
+    assert winners == [0]
+    assert row.argmax() == 0
+    np.testing.assert_allclose(row, SICK_ROW, rtol=1e-6)
+
+
+def test_disease_needs_its_share_of_the_vote():
+    rows = [HEALTHY_ROW] * 40 + [SICK_ROW] * 3
+    assert aggregate_tiles(rows, HEALTHY)[2] == []
+    assert aggregate_tiles(rows, HEALTHY, min_share=0.01)[2] == [0]
+
+
+def test_leaf_share_weighs_the_vote():
+    rows = [HEALTHY_ROW] * 4 + [SICK_ROW] * 2
+    _, votes, winners = aggregate_tiles(rows, HEALTHY, weights=[1.0] * 4 + [0.05] * 2)
+    assert winners == []
+    assert votes[0][1] < 0.1
+
+
+def test_single_tile_is_enough_when_only_one_is_analyzed():
+    row, _, winners = aggregate_tiles([SICK_ROW], HEALTHY)
+    assert winners == [0] and row.argmax() == 0
+
+
+def fake_model(rows_for):
+    """predict_batch returning rows_for(tile) for every tile"""
+    def predict(batch):
+        return np.stack([rows_for(tile) for tile in batch])
+    return predict
+
+
+def test_predict_tiles_reports_its_votes():
+    img = leaf_image((448, 672, 3))
+    # Tiles whose top-left pixel is in the left third look sick
+    img[:, :5] = 0
+    row, report = predict_tiles(
+        img, fake_model(lambda tile: SICK_ROW if tile[0, 0].sum() == 0 else HEALTHY_ROW), CLASSES, stride=224
+    )
+    assert report['rows'] == 2 and report['cols'] == 3 and report['analyzed'] == 6
+    assert report['class_counts'] == {"Anthracnose": 2, "Healthy": 4}
+    assert report['votes']["Anthracnose"]['tiles'] == 2
+    assert report['diagnosis_from'] == ["Anthracnose"]
+    assert report['grid'][0] == ["Anthracnose", "Healthy", "Healthy"]
+    assert row.argmax() == 0
+
+
+def test_leafless_photo_is_scored_whole():
+    img = np.full((448, 448, 3), 255, dtype=np.uint8)
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        return np.tile(HEALTHY_ROW, (len(batch), 1))
+    row, report = predict_tiles(img, predict, CLASSES)
+    assert calls == [1]
+    assert report['analyzed'] == 0 and report['diagnosis_from'] == [] and report['votes'] == {}
+    np.testing.assert_allclose(row, HEALTHY_ROW)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from utils.preprocessing import INPUT_SHAPE
+from utils.tta import DEFAULT_VIEWS, VIEWS, aggregate, augment, parse_views
+
+TENSOR = np.random.default_rng(0).random(INPUT_SHAPE, dtype=np.float32)
+
+
+def test_views_are_the_expected_transforms():
+    batch = augment(TENSOR, VIEWS)
+    assert batch.shape == (len(VIEWS),) + INPUT_SHAPE
+    np.testing.assert_array_equal(batch[VIEWS.index('identity')], TENSOR)
+    np.testing.assert_array_equal(batch[VIEWS.index('hflip')], TENSOR[:, ::-1])
+    np.testing.assert_array_equal(batch[VIEWS.index('vflip')], TENSOR[::-1])
+    for k in (1, 2, 3):
+        np.testing.assert_array_equal(batch[VIEWS.index(f'rot{90 * k}')], np.rot90(TENSOR, k))
+    assert not np.array_equal(batch[VIEWS.index('crop_top_left')], batch[VIEWS.index('crop_bottom_right')])
+
+
+def test_augment_reuses_the_output_buffer():
+    out = np.empty((len(DEFAULT_VIEWS),) + INPUT_SHAPE, dtype=np.float32)
+    assert augment(TENSOR, DEFAULT_VIEWS, out=out) is out
+
+
+def test_parse_views():
+    assert parse_views(None) == DEFAULT_VIEWS
+    assert parse_views("identity, hflip") == ('identity', 'hflip')
+    with pytest.raises(ValueError):
+        parse_views("identity,sepia")
+
+
+def test_aggregate_reports_agreement():
+    mean, agreement = aggregate([[0.9, 0.1], [0.8, 0.2], [0.3, 0.7]])
+    np.testing.assert_allclose(mean, [2 / 3, 1 / 3], rtol=1e-6)
+    assert agreement == pytest.approx(2 / 3)
@@ -5,21 +5,11 @@ Mango Leaf Detection Utilities Package
 __version__ = '1.0.0'
 __author__ = 'MangoLeaf AI Team'
 
-from .predict import (
-    predict_leaf,
-    get_model_info,
-    get_diagnosis_info,  # Legacy support
-    determine_category,   # Legacy support
-    CLASS_NAMES,
-    DISEASE_CLASSES,
-    NUTRIENT_CLASSES,
-    DISEASE_TO_TREATMENT,
-    NUTRIENT_TREATMENTS,
-    DISEASE_TO_NUTRIENTS_SIMPLE
-)
-
 __all__ = [
     'predict_leaf',
+    'predict_leaf_image',
+    'predict_leaf_json',
+    'predict_leaf_batch',
     'get_model_info',
     'get_diagnosis_info',
     'determine_category',
@@ -29,4 +19,17 @@ __all__ = [
     'DISEASE_TO_TREATMENT',
     'NUTRIENT_TREATMENTS',
     'DISEASE_TO_NUTRIENTS_SIMPLE'
-]
\ No newline at end of file
+]
+
+
+# Exports are resolved on first access so importing a light submodule
+# (e.g. utils.batching) does not pull in the prediction stack.
+def __getattr__(name):
+    if name in __all__:
+        from . import predict
+        return getattr(predict, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
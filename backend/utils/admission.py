@@ -0,0 +1,113 @@
+"""
+Admission control for the asyncio server
+Bounds concurrent work, queues a limited number of waiters and rejects the rest
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+from .batching import DeadlineExceeded
+
+# ================= CONFIGURATION =================
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MAX_QUEUE = 64
+
+
+class Rejected(Exception):
+    """Request turned away before doing any work; maps to an HTTP status"""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# ================= DEADLINES =================
+def request_deadline(timeout_ms, default_ms=None, start=None):
+    """time.monotonic() deadline from a client budget in ms (header value or None)"""
+    start = time.monotonic() if start is None else start
+    try:
+        budget = float(timeout_ms) if timeout_ms not in (None, "") else default_ms
+    except ValueError:
+        budget = default_ms
+    if not budget or budget <= 0:
+        return None
+    return start + budget / 1000.0
+
+
+def check_deadline(deadline, stage):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+# ================= CONTROLLER =================
+class AdmissionController:
+    """At most ``max_concurrency`` requests run; up to ``max_queue`` more wait.
+
+    A request arriving when the queue is full is rejected at once with 429 and
+    a Retry-After estimated from the recent service time. A queued request
+    whose deadline passes while waiting fails with DeadlineExceeded.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.max_concurrency = int(max_concurrency)
+        self.max_queue = max(int(max_queue), 0)
+
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._active = 0
+        self._waiting = 0
+        self._service_s = 0.05  # EWMA of time spent holding a slot
+
+        self._admitted = 0
+        self._rejected = 0
+        self._expired = 0
+
+    def retry_after(self):
+        """Seconds until a new request would likely get a slot (at least 1)"""
+        backlog = self._waiting + self._active + 1
+        return max(1, math.ceil(backlog * self._service_s / self.max_concurrency))
+
+    @asynccontextmanager
+    async def admit(self, deadline=None):
+        if self._waiting + self._active >= self.max_concurrency + self.max_queue:
+            self._rejected += 1
+            raise Rejected(429, "Server busy, retry later", self.retry_after())
+
+        self._waiting += 1
+        try:
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._expired += 1
+            raise DeadlineExceeded("Deadline exceeded while queued") from None
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        self._admitted += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._slots.release()
+            self._service_s = 0.9 * self._service_s + 0.1 * (time.perf_counter() - start)
+
+    def stats(self):
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'active': self._active,
+            'waiting': self._waiting,
+            'admitted': self._admitted,
+            'rejected': self._rejected,
+            'expired': self._expired,
+            'avg_service_ms': round(self._service_s * 1000, 2),
+        }
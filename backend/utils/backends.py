@@ -0,0 +1,443 @@
+"""
+Pluggable inference backends
+Keras, TFLite (XNNPACK) and ONNX Runtime behind one predict(batch) interface;
+loaded with embeddings=True they also return the classifier's input (the
+penultimate-layer embedding) from the same forward pass
+"""
+
+import os
+import threading
+
+import numpy as np
+
+# ================= CONFIGURATION =================
+BACKEND_EXTENSIONS = {
+    '.keras': 'keras',
+    '.h5': 'keras',
+    '.tflite': 'tflite',
+    '.onnx': 'onnx',
+    '.ort': 'onnx',
+}
+
+
+# Ops between the embedding and the output: the final dense layer (whose first
+# input is the embedding) and what may follow it (bias, activation, reshapes)
+CLASSIFIER_OPS = {'MatMul', 'Gemm', 'FULLY_CONNECTED'}
+HEAD_OPS = {
+    'Add', 'Softmax', 'Sigmoid', 'Identity', 'Reshape', 'Cast', 'Squeeze',
+    'SOFTMAX', 'LOGISTIC', 'ADD', 'RESHAPE', 'DEQUANTIZE', 'QUANTIZE', 'SQUEEZE',
+}
+
+
+def backend_for_path(path):
+    """Guess the backend name from a model file extension"""
+    return BACKEND_EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'keras')
+
+
+def find_embedding(output, producer):
+    """Walk back from the model output to the input of its final dense layer.
+
+    ``producer(tensor)`` returns (op type, [input tensors produced by other
+    ops]) for the op that outputs ``tensor``, or None for graph inputs.
+    """
+    tensor = output
+    for _ in range(16):
+        op = producer(tensor)
+        if op is None:
+            break
+        op_type, inputs = op
+        if op_type in CLASSIFIER_OPS and inputs:
+            return inputs[0]
+        if op_type not in HEAD_OPS or not inputs:
+            break
+        tensor = inputs[0]
+    raise ValueError("Cannot find the embedding: the model does not end in a dense classifier layer")
+
+
+# ================= BACKENDS =================
+class InferenceBackend:
+    """Common interface: predict(batch) -> (N, classes) float32 probabilities"""
+
+    name = None
+    embedding_dim = None  # set when loaded with embeddings=True
+
+    def __init__(self, path):
+        self.path = path
+
+    @property
+    def input_shape(self):
+        raise NotImplementedError
+
+    @property
+    def output_shape(self):
+        raise NotImplementedError
+
+    def predict(self, batch):
+        raise NotImplementedError
+
+    def predict_embeddings(self, batch):
+        """(probabilities, embeddings) from one forward pass; needs embeddings=True at load"""
+        raise NotImplementedError(f"{self.name} backend was not loaded with embeddings=True")
+
+    def plan_batch_sizes(self, sizes):
+        """Prepare for these batch sizes ahead of time (warm-up); a no-op unless the
+        runtime has to re-plan for every new input shape"""
+
+    def describe(self):
+        return {
+            'backend': self.name,
+            'path': self.path,
+            'input_shape': list(self.input_shape),
+            'output_shape': list(self.output_shape),
+            'embedding_dim': self.embedding_dim,
+        }
+
+
+class KerasBackend(InferenceBackend):
+    """Full TensorFlow/Keras model (.keras or .h5)"""
+
+    name = 'keras'
+
+    def __init__(self, path, model=None, num_threads=None, inter_op_threads=None, embeddings=False, **kwargs):
+        super().__init__(path)
+        if model is None:
+            configure_tf_threads(num_threads, inter_op_threads)
+        self.model = model if model is not None else self._load(path)
+        self._dual = None
+        if embeddings:
+            import tensorflow as tf
+
+            # Same layers and weights, one more output: no second forward pass
+            dense = [layer for layer in self.model.layers if isinstance(layer, tf.keras.layers.Dense)]
+            if not dense:
+                raise ValueError("Cannot find the embedding: the model has no Dense layer")
+            self._dual = tf.keras.Model(self.model.inputs, [dense[-1].input, self.model.output])
+            self.embedding_dim = int(dense[-1].input.shape[-1])
+
+    @staticmethod
+    def _load(path):
+        import tensorflow as tf
+
+        try:
+            return tf.keras.models.load_model(path)
+        except Exception as e:
+            # Older .h5 files store InputLayer(batch_shape=...), which newer Keras rejects
+            if not path.endswith('.h5') or "batch_shape" not in str(e):
+                raise
+
+            class FixedInputLayer(tf.keras.layers.InputLayer):
+                def __init__(self, **kwargs):
+                    kwargs.pop('batch_shape', None)
+                    super().__init__(**kwargs)
+
+            print("⚠️ Retrying .h5 load with batch_shape fix")
+            return tf.keras.models.load_model(path, custom_objects={'InputLayer': FixedInputLayer})
+
+    @property
+    def input_shape(self):
+        return tuple(self.model.input_shape)
+
+    @property
+    def output_shape(self):
+        return tuple(self.model.output_shape)
+
+    def predict(self, batch):
+        # predict_on_batch skips the tf.data/callback machinery of predict()
+        return np.asarray(self.model.predict_on_batch(batch))
+
+    def predict_embeddings(self, batch):
+        if self._dual is None:
+            return super().predict_embeddings(batch)
+        embeddings, probs = self._dual.predict_on_batch(batch)
+        return np.asarray(probs), np.asarray(embeddings, dtype=np.float32)
+
+
+class _TFLitePlan:
+    """One TFLite interpreter with its tensors allocated for one batch size"""
+
+    def __init__(self, interpreter, batch_size):
+        self.interpreter = interpreter
+        # One interpreter holds one set of tensors; calls must not interleave
+        self.lock = threading.Lock()
+        self.resize(batch_size)
+
+    def resize(self, batch_size):
+        details = self.interpreter.get_input_details()[0]
+        if int(details['shape'][0]) != batch_size:
+            self.interpreter.resize_tensor_input(details['index'], [batch_size] + list(details['shape'][1:]))
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = batch_size
+
+
+class TFLiteBackend(InferenceBackend):
+    """TFLite interpreter; uses the XNNPACK delegate on CPU by default.
+
+    Resizing an interpreter re-plans its tensors and re-prepares XNNPACK, far
+    too slow for every micro-batch. plan_batch_sizes (called by the warm-up)
+    gives each expected batch size its own interpreter; other batches are
+    zero-padded up to the next planned size, or split at the largest one.
+    Without a plan, one interpreter is resized to each batch (the cold path).
+    """
+
+    name = 'tflite'
+
+    def __init__(self, path, num_threads=None, model_bytes=None, embeddings=False, **kwargs):
+        super().__init__(path)
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        # Intermediate tensors are only readable after invoke() when the
+        # interpreter does not reuse their memory
+        options = {'experimental_preserve_all_tensors': True} if embeddings else {}
+        if model_bytes is None:
+            with open(path, 'rb') as f:
+                model_bytes = f.read()
+        # The flatbuffer is used in place, so every interpreter (and, with bytes read
+        # before fork(), every worker) shares one copy of the weights
+        self._model_bytes = model_bytes
+        self._new_interpreter = lambda: Interpreter(model_content=model_bytes, num_threads=num_threads, **options)
+
+        interpreter = self._new_interpreter()
+        interpreter.allocate_tensors()
+        self._base = _TFLitePlan(interpreter, int(interpreter.get_input_details()[0]['shape'][0]))
+        self._plans = {}  # batch size -> _TFLitePlan
+        self._embedding = None
+        if embeddings:
+            self._embedding = self._find_embedding()
+            self.embedding_dim = int(interpreter.get_tensor_details()[self._embedding]['shape'][-1])
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(d) for d in self._base.input['shape'][1:])
+
+    @property
+    def output_shape(self):
+        return (None,) + tuple(int(d) for d in self._base.output['shape'][1:])
+
+    def plan_batch_sizes(self, sizes):
+        for size in sizes:
+            if size not in self._plans:
+                self._plans[size] = _TFLitePlan(self._new_interpreter(), size)
+
+    def _find_embedding(self):
+        interpreter = self._base.interpreter
+        producers = {}
+        for op in interpreter._get_ops_details():
+            for index in op['outputs']:
+                producers[index] = op
+        tensors = interpreter.get_tensor_details()
+
+        def producer(index):
+            op = producers.get(index)
+            if op is None:
+                return None
+            # Weights and biases are constant tensors no op produces
+            return op['op_name'], [i for i in op['inputs'] if i in producers or i == self._base.input['index']]
+        index = find_embedding(self._base.output['index'], producer)
+        return next(i for i, t in enumerate(tensors) if t['index'] == index)
+
+    def predict(self, batch):
+        return self._run(np.asarray(batch, dtype=np.float32), False)
+
+    def predict_embeddings(self, batch):
+        if self._embedding is None:
+            return super().predict_embeddings(batch)
+        return self._run(np.asarray(batch, dtype=np.float32), True)
+
+    def _run(self, batch, embeddings):
+        n = len(batch)
+        fits = [size for size in self._plans if size >= n]
+        if fits:
+            plan = self._plans[min(fits)]
+        elif self._plans:
+            # Larger than any planned size: run it in chunks of the largest
+            step = max(self._plans)
+            parts = [self._run(batch[i:i + step], embeddings) for i in range(0, n, step)]
+            if embeddings:
+                return tuple(np.concatenate(p) for p in zip(*parts))
+            return np.concatenate(parts)
+        else:
+            plan = self._base
+
+        if plan.batch_size > n:
+            padded = np.zeros((plan.batch_size,) + batch.shape[1:], dtype=np.float32)
+            padded[:n] = batch
+            batch = padded
+        with plan.lock:
+            if plan is self._base and plan.batch_size != n:
+                plan.resize(n)
+            probs = self._invoke(plan, batch)[:n]
+            if not embeddings:
+                return probs
+            details = plan.interpreter.get_tensor_details()[self._embedding]
+            values = plan.interpreter.get_tensor(details['index'])
+            if details['dtype'] != np.float32:
+                scale, zero_point = details['quantization']
+                values = (values.astype(np.float32) - zero_point) * scale
+            return probs, np.array(values, dtype=np.float32).reshape(len(batch), -1)[:n]
+
+    @staticmethod
+    def _invoke(plan, batch):
+        # Fully-INT8 models take quantized input and return quantized output
+        if plan.input['dtype'] != np.float32:
+            scale, zero_point = plan.input['quantization']
+            info = np.iinfo(plan.input['dtype'])
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+            batch = batch.astype(plan.input['dtype'])
+
+        plan.interpreter.set_tensor(plan.input['index'], batch)
+        plan.interpreter.invoke()
+        out = plan.interpreter.get_tensor(plan.output['index'])
+
+        if plan.output['dtype'] != np.float32:
+            scale, zero_point = plan.output['quantization']
+            out = (out.astype(np.float32) - zero_point) * scale
+        return np.array(out, dtype=np.float32)
+
+
+class ONNXBackend(InferenceBackend):
+    """ONNX Runtime on the CPU execution provider"""
+
+    name = 'onnx'
+
+    def __init__(self, path, num_threads=None, inter_op_threads=None, model_bytes=None, embeddings=False,
+                 **kwargs):
+        super().__init__(path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        source = path
+        if model_bytes is not None:
+            # ORT-format (.ort) models then keep initializers in the shared buffer
+            options.add_session_config_entry("session.use_ort_model_bytes_directly", "1")
+            options.add_session_config_entry("session.use_ort_model_bytes_for_initializers", "1")
+            source = model_bytes
+        if embeddings:
+            source = self._with_embedding_output(path, model_bytes)
+        self.session = ort.InferenceSession(source, options, providers=["CPUExecutionProvider"])
+        self._input = self.session.get_inputs()[0]
+        self._output = self.session.get_outputs()[0]
+        self._embedding = None
+        if embeddings:
+            self._embedding = self.session.get_outputs()[1]
+            dim = self._embedding.shape[-1]
+            if not isinstance(dim, int):
+                # Symbolic in the graph: read it off one pass
+                dim = self.predict_embeddings(np.zeros((1,) + self.input_shape[1:], dtype=np.float32))[1].shape[1]
+            self.embedding_dim = dim
+
+    @staticmethod
+    def _with_embedding_output(path, model_bytes=None):
+        """Serialized model with the embedding added as a second graph output"""
+        import onnx
+
+        if path.endswith('.ort'):
+            raise ValueError("Embeddings need the .onnx model (ORT-format graphs cannot be edited)")
+        model = onnx.load_from_string(model_bytes) if model_bytes is not None else onnx.load(path)
+        graph = model.graph
+        producers = {out: node for node in graph.node for out in node.output}
+        inputs = {i.name for i in graph.input}
+
+        def producer(name):
+            node = producers.get(name)
+            if node is None:
+                return None
+            return node.op_type, [i for i in node.input if i in producers or i in inputs]
+        name = find_embedding(graph.output[0].name, producer)
+        graph.output.append(onnx.helper.make_empty_tensor_value_info(name))
+        return model.SerializeToString()
+
+    @property
+    def input_shape(self):
+        return tuple(d if isinstance(d, int) else None for d in self._input.shape)
+
+    @property
+    def output_shape(self):
+        return tuple(d if isinstance(d, int) else None for d in self._output.shape)
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run([self._output.name], {self._input.name: batch})[0]
+
+    def predict_embeddings(self, batch):
+        if self._embedding is None:
+            return super().predict_embeddings(batch)
+        batch = np.asarray(batch, dtype=np.float32)
+        probs, embeddings = self.session.run(
+            [self._output.name, self._embedding.name], {self._input.name: batch}
+        )
+        return probs, np.asarray(embeddings, dtype=np.float32).reshape(len(probs), -1)
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+    'onnx': ONNXBackend,
+}
+
+
+def import_runtime(backend):
+    """Import the heavy framework a backend needs (so its cost can be timed separately)"""
+    if backend == 'onnx':
+        import onnxruntime  # noqa: F401
+    elif backend == 'tflite':
+        try:
+            import tflite_runtime.interpreter  # noqa: F401
+        except ImportError:
+            import tensorflow  # noqa: F401
+    else:
+        import tensorflow  # noqa: F401
+
+
+def configure_tf_threads(intra_op=None, inter_op=None):
+    """Pin TensorFlow's thread pools; only effective before the first TF op runs"""
+    if not intra_op and not inter_op:
+        return
+    import tensorflow as tf
+
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    except RuntimeError as e:
+        print(f"⚠️ TensorFlow thread settings ignored: {e}")
+
+
+def read_model_bytes(path, backend=None):
+    """Model file contents for backends that can run from an in-memory buffer.
+
+    Read in the parent before fork(), the buffer is shared copy-on-write by
+    every worker. Returns None for Keras, which always loads from the file.
+    """
+    if (backend or backend_for_path(path)) == 'keras':
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_backend(path, backend=None, num_threads=None, inter_op_threads=None, model_bytes=None,
+                 embeddings=False):
+    """Load a model file with the named backend (inferred from the extension if None).
+
+    ``embeddings=True`` enables predict_embeddings.
+    """
+    name = backend or backend_for_path(path)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name} (expected one of {sorted(BACKENDS)})")
+    if model_bytes is None and not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found: {path}")
+    return BACKENDS[name](
+        path, num_threads=num_threads, inter_op_threads=inter_op_threads, model_bytes=model_bytes,
+        embeddings=embeddings
+    )
@@ -0,0 +1,208 @@
+"""
+Dynamic micro-batching for model inference
+Coalesces single-image requests into one model.predict call
+"""
+
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+import numpy as np
+
+# ================= CONFIGURATION =================
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 5.0
+
+# Upper bounds of the queue-depth histogram buckets (last bucket is open)
+QUEUE_DEPTH_BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64, 128]
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before it reached the model"""
+
+
+# ================= BATCHER =================
+class MicroBatcher:
+    """Queue preprocessed tensors and flush them as one batch.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or when the
+    oldest queued item has waited ``max_wait_ms`` milliseconds, whichever
+    comes first. Each caller gets back the row of the output that belongs
+    to its own input. Batches are assembled in one preallocated buffer that
+    is reused for every flush.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_ms = float(max_wait_ms)
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._closed = False
+        self._batch_buf = None
+
+        self._batch_size_hist = {}
+        self._queue_depth_hist = {str(b): 0 for b in QUEUE_DEPTH_BUCKETS}
+        self._queue_depth_hist["+Inf"] = 0
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._dropped = 0
+
+    # ---------- public API ----------
+    def submit(self, tensor, deadline=None):
+        """Queue a single (H, W, C) or (1, H, W, C) tensor, return a Future.
+
+        ``deadline`` is a ``time.monotonic()`` timestamp; an item still queued
+        past it fails with DeadlineExceeded instead of reaching the model.
+        Cancelled futures are dropped the same way.
+        """
+        if self._closed:
+            raise RuntimeError("Batcher is closed")
+
+        if tensor.ndim == 4:
+            if tensor.shape[0] != 1:
+                raise ValueError("submit() expects a single image, use predict_fn for batches")
+            tensor = tensor[0]
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((tensor, future, deadline))
+        return future
+
+    def predict(self, tensor, timeout=None):
+        """Blocking helper: submit one tensor and wait for its prediction row"""
+        return self.submit(tensor).result(timeout=timeout)
+
+    def stats(self):
+        """Snapshot of batching counters and histograms"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'errors': self._errors,
+                'dropped': self._dropped,
+                'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in sorted(self._batch_size_hist.items())},
+                'queue_depth_histogram': dict(self._queue_depth_hist),
+            }
+
+    def close(self):
+        """Stop the worker thread after draining queued requests"""
+        self._closed = True
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+
+    # ---------- worker ----------
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a pre-fork batcher restarts its
+        # worker lazily in each child process.
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until full or timed out"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Flush what we have, then let the loop see the sentinel again
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _record(self, batch_size, depth):
+        with self._lock:
+            self._batches += 1
+            self._items += batch_size
+            self._batch_size_hist[batch_size] = self._batch_size_hist.get(batch_size, 0) + 1
+            for bound in QUEUE_DEPTH_BUCKETS:
+                if depth <= bound:
+                    self._queue_depth_hist[str(bound)] += 1
+                    break
+            else:
+                self._queue_depth_hist["+Inf"] += 1
+
+    def _assemble(self, tensors):
+        """Copy tensors into the reusable batch buffer, return a view of the filled rows"""
+        first = tensors[0]
+        buf = self._batch_buf
+        if buf is None or buf.shape[1:] != first.shape or buf.dtype != first.dtype:
+            buf = self._batch_buf = np.empty((self.max_batch_size,) + first.shape, dtype=first.dtype)
+        return np.stack(tensors, out=buf[:len(tensors)])
+
+    def _live(self, batch):
+        """Drop cancelled and expired items; the rest can no longer be cancelled"""
+        now = time.monotonic()
+        live = []
+        for tensor, future, deadline in batch:
+            if deadline is not None and now >= deadline:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(DeadlineExceeded("Deadline exceeded before inference"))
+            elif future.set_running_or_notify_cancel():
+                live.append((tensor, future))
+        if len(live) < len(batch):
+            with self._lock:
+                self._dropped += len(batch) - len(live)
+        return live
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            batch = self._live(batch)
+            if not batch:
+                continue
+
+            self._record(len(batch), self._queue.qsize())
+            tensors = [t for t, _ in batch]
+            futures = [f for _, f in batch]
+
+            try:
+                preds = np.asarray(self.predict_fn(self._assemble(tensors)))
+                for i, future in enumerate(futures):
+                    future.set_result(preds[i])
+            except Exception as e:
+                traceback.print_exc()
+                with self._lock:
+                    self._errors += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,191 @@
+"""
+Prediction cache keyed by image content
+In-process LRU with an optional sqlite tier that survives restarts
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# ================= CONFIGURATION =================
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_DISK_MAX_ENTRIES = 100_000
+DISK_PRUNE_EVERY = 64  # puts between prunes of the disk tier (its overshoot bound)
+
+
+# ================= KEYS =================
+def content_key(data, model_version):
+    """Cache key: hash of the raw image bytes plus the model version"""
+    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+    return f"{model_version}:{digest}"
+
+
+def model_version(path, chunk_size=1 << 20):
+    """Short content hash of a model file, used to invalidate cached predictions"""
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ================= CACHE =================
+class PredictionCache:
+    """Bounded LRU of JSON-serializable prediction results.
+
+    Entries expire after ``ttl_seconds``. When ``disk_path`` is set, entries
+    are also written to a sqlite file; memory misses fall through to disk and
+    disk hits are promoted back into the LRU. The disk tier keeps at most
+    ``disk_max_entries`` rows (oldest dropped first, expired rows pruned as
+    puts come in) and has its own lock, so memory hits never wait on sqlite.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 disk_path=None, disk_max_entries=DEFAULT_DISK_MAX_ENTRIES):
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self.disk_path = disk_path
+        self.disk_max_entries = int(disk_max_entries)
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._disk_lock = threading.Lock()
+        self._disk_puts = 0
+
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # ---------- public API ----------
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._hits += 1
+            self._store(key, value, now)
+        return value
+
+    def put(self, key, value):
+        """Store a value in memory (and on disk if enabled)"""
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+        self._disk_put(key, value, now)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_tier': self.disk_path is not None,
+                'disk_max_entries': self.disk_max_entries,
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+        with self._disk_lock:
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM predictions")
+                db.commit()
+
+    # ---------- memory tier ----------
+    def _store(self, key, value, now):
+        self._entries[key] = (now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    # ---------- disk tier ----------
+    def _connect(self):
+        # sqlite connections must not be shared across fork(); reopen per process
+        if self.disk_path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_stored_at ON predictions (stored_at)")
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def _disk_get(self, key, now):
+        if self.disk_path is None:
+            return None
+        with self._disk_lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT value, stored_at FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                db.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                db.commit()
+                return None
+        return json.loads(row[0])
+
+    def _disk_put(self, key, value, now):
+        if self.disk_path is None:
+            return
+        payload = json.dumps(value)
+        with self._disk_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO predictions (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, payload, now)
+            )
+            self._disk_puts += 1
+            if self._disk_puts % DISK_PRUNE_EVERY == 0:
+                self._disk_prune(db, now)
+            db.commit()
+
+    def _disk_prune(self, db, now):
+        """Drop expired rows, then all but the newest disk_max_entries"""
+        db.execute("DELETE FROM predictions WHERE stored_at < ?", (now - self.ttl_seconds,))
+        db.execute(
+            "DELETE FROM predictions WHERE key IN "
+            "(SELECT key FROM predictions ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
@@ -0,0 +1,110 @@
+"""
+Confidence-gated two-tier cascade
+A small, fast model answers first; only images whose top-1 confidence falls
+below the threshold are escalated to the full model
+"""
+
+import bisect
+import threading
+
+import numpy as np
+
+from .metrics import REGISTRY
+from .pipeline import StageStats
+
+# ================= CONFIGURATION =================
+DEFAULT_THRESHOLD = 0.85
+TIERS = ("fast", "full")
+
+# Fast-tier confidence buckets for the agreement report on escalated images
+CONFIDENCE_BUCKETS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+CASCADE_REQUESTS = REGISTRY.counter(
+    "mango_cascade_requests_total", "Cascade predictions by the tier that answered", ["tier"]
+)
+CASCADE_SECONDS = REGISTRY.histogram(
+    "mango_cascade_request_duration_seconds", "End-to-end request latency by the tier that answered", ["tier"]
+)
+
+
+def _bucket_labels(bounds):
+    edges = (0.0,) + tuple(bounds) + (1.0,)
+    return [f"{lo:.2f}-{hi:.2f}" for lo, hi in zip(edges, edges[1:])]
+
+
+# ================= CASCADE =================
+class Cascade:
+    """Fast tier (a ServedModel) in front of the full model.
+
+    ``predict(full, tensor)`` returns the fast tier's row when its top-1
+    confidence reaches ``threshold``, else the full model's. For every
+    escalated image the fast tier's top-1 is checked against the full
+    model's, bucketed by the fast tier's confidence: high agreement just
+    below the threshold means it can be lowered.
+    """
+
+    def __init__(self, fast, threshold=DEFAULT_THRESHOLD):
+        if not 0.0 <= threshold <= 1.0:
+            raise ValueError("threshold must be between 0 and 1")
+        self.fast = fast
+        self.threshold = float(threshold)
+
+        self.latency = StageStats()
+        self._lock = threading.Lock()
+        self._answered = dict.fromkeys(TIERS, 0)
+        self._labels = _bucket_labels(CONFIDENCE_BUCKETS)
+        self._escalated = [[0, 0] for _ in self._labels]  # [count, agreed] per bucket
+
+    def confident(self, row):
+        return float(np.max(row)) >= self.threshold
+
+    def tier(self, answered):
+        return "fast" if answered is self.fast else "full"
+
+    def predict(self, full, tensor, timeout=None):
+        """(output row, ServedModel that answered) for one (224, 224, 3) tensor"""
+        row = self.fast.predict(tensor, timeout=timeout)
+        if self.confident(row):
+            self.record(row)
+            return row, self.fast
+        full_row = full.predict(tensor, timeout=timeout)
+        self.record(row, full_row)
+        return full_row, full
+
+    def record(self, fast_row, full_row=None):
+        """Count one prediction; full_row is the escalated answer, if any"""
+        tier = "fast" if full_row is None else "full"
+        CASCADE_REQUESTS.inc(tier=tier)
+        with self._lock:
+            self._answered[tier] += 1
+            if full_row is not None:
+                bucket = self._escalated[bisect.bisect_right(CONFIDENCE_BUCKETS, float(np.max(fast_row)))]
+                bucket[0] += 1
+                bucket[1] += int(np.argmax(fast_row) == np.argmax(full_row))
+
+    def observe_latency(self, tier, total_ms):
+        """End-to-end latency of a request answered by tier"""
+        self.latency.record({tier: total_ms})
+        CASCADE_SECONDS.observe(total_ms / 1000.0, tier=tier)
+
+    def stats(self):
+        with self._lock:
+            answered = dict(self._answered)
+            escalated = {
+                label: {'count': count, 'agreement_rate': round(agreed / count, 4) if count else None}
+                for label, (count, agreed) in zip(self._labels, self._escalated)
+                if count
+            }
+        total = sum(answered.values())
+        return {
+            'threshold': self.threshold,
+            'fast_model': self.fast.describe(),
+            'answered': answered,
+            'escalation_rate': round(answered["full"] / total, 4) if total else None,
+            'latency_ms': self.latency.summary(),
+            # Fast-tier confidence -> how often the full model kept its top-1
+            'escalated_agreement': escalated,
+        }
+
+    def close(self):
+        self.fast.close()
@@ -0,0 +1,276 @@
+"""
+Nearest-neighbour index of past diagnosed cases
+Penultimate-layer embeddings are kept L2-normalized in an append-only,
+memory-mapped float16 matrix with a JSON-lines sidecar of labels and
+metadata; queries return the most similar cases and a novelty score
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+
+# ================= CONFIGURATION =================
+VECTORS_FILE = "vectors.f16"   # (capacity, dim) float16, rows past "count" unused
+CASES_FILE = "cases.jsonl"     # one JSON object per row, in row order
+HEADER_FILE = "index.json"     # dim, count, capacity, model; replaced atomically
+LOCK_FILE = ".lock"
+
+DEFAULT_K = 5
+
+# Queries shortlist candidates on a random projection of every vector (kept in
+# RAM as float32), then re-rank the shortlist exactly from the float16 matrix
+SKETCH_DIM = 128
+SHORTLIST = 256
+MIN_CAPACITY = 1024  # rows; the files grow by doubling
+
+# Mean cosine distance to the k nearest cases above which an upload is flagged
+# as unlike anything in the index (0 = identical direction, 1 = orthogonal)
+DEFAULT_NOVELTY_THRESHOLD = 0.35
+
+
+def normalize(vectors):
+    """Rows scaled to unit length (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ================= INDEX =================
+class EmbeddingIndex:
+    """k-NN index of case embeddings stored under ``directory``.
+
+    ``add`` appends rows in place: the vector file is extended (doubling
+    its capacity when full), the sidecar gets new lines and the header's
+    count is bumped last, so a crash mid-append leaves the old index
+    intact. Appends from several processes are serialized by a file lock;
+    every process picks up the others' rows on its next query.
+
+    An index belongs to one model (``model``, its digest): embeddings from
+    another model are not comparable, so opening it with a different one
+    raises ValueError.
+    """
+
+    def __init__(self, directory, dim, model=None, novelty_threshold=DEFAULT_NOVELTY_THRESHOLD, seed=0):
+        self.directory = directory
+        self.dim = int(dim)
+        self.novelty_threshold = float(novelty_threshold)
+        os.makedirs(directory, exist_ok=True)
+
+        # Fixed by the seed, so every process shortlists the same way
+        rng = np.random.default_rng(seed)
+        self._projection = rng.standard_normal((self.dim, SKETCH_DIM)).astype(np.float32) / np.sqrt(SKETCH_DIM)
+
+        self._lock = threading.Lock()
+        self._count = 0
+        self._capacity = 0
+        self._vectors = None
+        self._sketch = np.empty((0, SKETCH_DIM), dtype=np.float32)
+        self._labels = []
+        self._offsets = [0]  # sidecar byte offset of each row, plus the end
+        self._header_mtime = None
+
+        with self._file_lock():
+            header = self._read_header()
+            if header is None:
+                header = {'dim': self.dim, 'count': 0, 'capacity': 0, 'model': model,
+                          'dtype': 'float16', 'created_at': time.time()}
+                self._write_header(header)
+            if header['dim'] != self.dim:
+                raise ValueError(f"Index at {directory} holds {header['dim']}-d embeddings, not {self.dim}-d")
+            if model is not None and header['model'] not in (None, model):
+                raise ValueError(
+                    f"Index at {directory} was built with model {header['model']}, not {model}: "
+                    "rebuild it for this model"
+                )
+            self.model = header['model'] or model
+        self.refresh()
+
+    # ---------- files ----------
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        # flock on a fresh descriptor also excludes other threads of this process
+        with open(self._path(LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_header(self):
+        try:
+            with open(self._path(HEADER_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_header(self, header):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".index-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(header, f)
+            os.replace(tmp, self._path(HEADER_FILE))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def refresh(self, force=False):
+        """Load rows appended since the last call (by any process); a stat() when none were"""
+        mtime = os.stat(self._path(HEADER_FILE)).st_mtime_ns
+        if not force and mtime == self._header_mtime:
+            return
+        with self._lock:
+            header = self._read_header()
+            count, capacity = header['count'], header['capacity']
+            if capacity != self._capacity:
+                self._vectors = np.memmap(
+                    self._path(VECTORS_FILE), dtype=np.float16, mode="r", shape=(capacity, self.dim)
+                ) if capacity else None
+                self._capacity = capacity
+            if count > self._count:
+                self._load_rows(count)
+            self._header_mtime = mtime
+            if header.get('model') and self.model is None:
+                self.model = header['model']
+
+    def _load_rows(self, count):
+        # Sketch rows for the new vectors, into a buffer grown by doubling
+        if count > len(self._sketch):
+            sketch = np.empty((max(MIN_CAPACITY, 2 * len(self._sketch), count), SKETCH_DIM), dtype=np.float32)
+            sketch[:self._count] = self._sketch[:self._count]
+            self._sketch = sketch
+        for start in range(self._count, count, 4096):
+            stop = min(start + 4096, count)
+            block = np.asarray(self._vectors[start:stop], dtype=np.float32)
+            np.matmul(block, self._projection, out=self._sketch[start:stop])
+
+        with open(self._path(CASES_FILE), "rb") as f:
+            f.seek(self._offsets[-1])
+            for _ in range(count - self._count):
+                line = f.readline()
+                self._offsets.append(self._offsets[-1] + len(line))
+                self._labels.append(json.loads(line)['label'])
+        self._count = count
+
+    # ---------- writing ----------
+    def add(self, embeddings, cases):
+        """Append (N, dim) embeddings with one metadata dict per row (each with a 'label').
+
+        Returns the new rows' ids. Nothing already stored is rewritten.
+        """
+        embeddings = normalize(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim))
+        cases = list(cases)
+        if len(cases) != len(embeddings):
+            raise ValueError(f"{len(embeddings)} embeddings but {len(cases)} cases")
+        if any('label' not in case for case in cases):
+            raise ValueError("Every case needs a 'label'")
+
+        with self._file_lock():
+            self.refresh(force=True)
+            header = self._read_header()
+            start = header['count']
+            stop = start + len(cases)
+
+            capacity = header['capacity']
+            if stop > capacity:
+                capacity = max(MIN_CAPACITY, 2 * capacity, stop)
+                with open(self._path(VECTORS_FILE), "ab") as f:
+                    f.truncate(capacity * self.dim * np.dtype(np.float16).itemsize)
+            vectors = np.memmap(self._path(VECTORS_FILE), dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+            vectors[start:stop] = embeddings
+            vectors.flush()
+            del vectors
+
+            lines = b"".join(
+                json.dumps({'id': i, **case}, ensure_ascii=False).encode() + b"\n"
+                for i, case in enumerate(cases, start)
+            )
+            with open(self._path(CASES_FILE), "ab") as f:
+                # Lines past the header's count are from an append that never finished
+                f.truncate(self._offsets[-1])
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._write_header({**header, 'count': stop, 'capacity': capacity, 'model': header['model'] or self.model})
+            self.refresh(force=True)
+        return list(range(start, stop))
+
+    # ---------- queries ----------
+    def __len__(self):
+        return self._count
+
+    def search(self, embedding, k=DEFAULT_K):
+        """(ids, cosine similarities) of the k nearest cases, most similar first"""
+        self.refresh()
+        with self._lock:
+            count, sketch, vectors = self._count, self._sketch, self._vectors
+        if count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize(np.asarray(embedding, dtype=np.float32).reshape(self.dim))
+        shortlist = max(SHORTLIST, 16 * k)
+        if count <= shortlist:
+            candidates = np.arange(count)
+        else:
+            scores = sketch[:count] @ (query @ self._projection)
+            candidates = np.sort(np.argpartition(-scores, shortlist)[:shortlist])
+        similarities = np.asarray(vectors[candidates], dtype=np.float32) @ query
+        order = np.argsort(-similarities, kind="stable")[:k]
+        return candidates[order], similarities[order]
+
+    def cases(self, ids):
+        """Metadata dicts of the given rows, read from the sidecar"""
+        with self._lock:
+            offsets = [self._offsets[i] for i in ids]
+        out = []
+        with open(self._path(CASES_FILE), "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                out.append(json.loads(f.readline()))
+        return out
+
+    def novelty(self, similarities):
+        """Mean cosine distance to the nearest cases (None for an empty index)"""
+        if len(similarities) == 0:
+            return None
+        return float(1.0 - np.mean(similarities))
+
+    def query(self, embedding, k=DEFAULT_K):
+        """Similar cases (metadata plus similarity) and the novelty verdict for one embedding"""
+        ids, similarities = self.search(embedding, k)
+        score = self.novelty(similarities)
+        return {
+            'similar_cases': [
+                {**case, 'similarity': round(float(s), 4)} for case, s in zip(self.cases(ids), similarities)
+            ],
+            'novelty': {
+                'score': round(score, 4) if score is not None else None,
+                'threshold': self.novelty_threshold,
+                'novel': score > self.novelty_threshold if score is not None else None,
+            },
+        }
+
+    def stats(self):
+        self.refresh()
+        with self._lock:
+            labels = Counter(self._labels)
+            count, capacity = self._count, self._capacity
+        return {
+            'path': self.directory,
+            'model': self.model,
+            'dim': self.dim,
+            'count': count,
+            'capacity': capacity,
+            'labels': dict(labels),
+            'vector_bytes': capacity * self.dim * np.dtype(np.float16).itemsize,
+        }
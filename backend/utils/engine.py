@@ -0,0 +1,341 @@
+"""
+Inference engine shared by the Flask/ASGI servers, utils.predict and scan.py
+Owns the model, preprocessing, batched inference and class ranking so every
+entry point produces the same tensor and the same top-k for the same image
+"""
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+from .backends import load_backend, backend_for_path, import_runtime
+from .batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from .cache import model_version
+from .frames import Frame, frame_into
+from .image_io import load_image
+from .metrics import StageTimer
+from .pipeline import PreprocessPool, DEFAULT_WORKERS
+from .preprocessing import preprocess_image, DECODE_MIN_SIDE, INPUT_SHAPE
+from .startup import warm_up
+from .tiling import (
+    fit_image, predict_tiles, DEFAULT_STRIDE, DEFAULT_MAX_SIDE, DEFAULT_MIN_LEAF, DEFAULT_MIN_VOTES,
+    DEFAULT_MIN_SHARE
+)
+from .tta import augment, aggregate, DEFAULT_VIEWS
+
+# ================= CLASSES =================
+# Model output order (MUST match training order)
+DISEASE_CLASSES = [
+    'Anthracnose',
+    'Bacterial Canker',
+    'Cutting Weevil',
+    'Die Back',
+    'Gall Midge',
+    'Healthy',
+    'Powdery Mildew',
+    'Sooty Mould'
+]
+
+
+# ================= SERVED MODEL =================
+class ServedModel:
+    """A loaded backend with its own micro-batcher, version and in-flight count.
+
+    Requests hold one through ``InferenceEngine.serving()`` so a hot swap never
+    moves them to another model half-way; a replaced model's batcher is
+    closed once its last request finishes.
+    """
+
+    def __init__(self, model, version, path=None, digest=None, batch_max_size=DEFAULT_MAX_BATCH_SIZE,
+                 batch_max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.model = model
+        self.version = version
+        self.path = path
+        self.digest = digest or version
+        self.loaded_at = time.time()
+        self.batcher = MicroBatcher(
+            lambda batch: model.predict(batch),
+            max_batch_size=batch_max_size,
+            max_wait_ms=batch_max_wait_ms
+        )
+        self.in_flight = 0
+        self.retired = False
+
+    def predict(self, tensor, timeout=None):
+        return self.batcher.predict(tensor, timeout=timeout)
+
+    def submit(self, tensor, deadline=None):
+        return self.batcher.submit(tensor, deadline=deadline)
+
+    def predict_batch(self, batch):
+        return self.model.predict(batch)
+
+    def predict_embeddings(self, batch):
+        """(output rows, penultimate-layer embeddings) from one forward pass"""
+        return self.model.predict_embeddings(batch)
+
+    def close(self):
+        self.batcher.close()
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'digest': self.digest,
+            'path': self.path,
+            'backend': self.model.name,
+            'loaded_at': self.loaded_at,
+            'in_flight': self.in_flight,
+        }
+
+
+# ================= ENGINE =================
+class InferenceEngine:
+    """One model plus everything needed to turn images into ranked classes.
+
+    - ``load``/``install`` publish a backend and its micro-batcher together,
+      swapping out the previous one atomically (``serving`` pins a request
+      to one model for its whole lifetime); ``prepare`` loads one without
+      serving it
+    - ``preprocess`` (in-thread) and ``pool`` (worker pool) share one decode
+      and preprocessing kernel, so both yield bit-identical tensors; with a
+      ``quality_gate`` both raise PoorQuality for unusable photos
+    - ``predict`` goes through the micro-batcher, ``predict_tensors`` runs a
+      whole list in one forward pass, ``predict_tta`` one image's augmented
+      views in one forward pass, ``predict_tiles`` the leaf tiles of a
+      full-resolution photo in batched passes
+    - with ``embeddings=True`` models are loaded so ``predict_embeddings``
+      also returns the penultimate-layer embedding of each image (see
+      utils.embeddings for the nearest-neighbour index)
+    - ``classify``/``top_k`` rank a row of output; response shapes are left
+      to the callers (API, predict_leaf, scan.py)
+    """
+
+    def __init__(self, class_names=DISEASE_CLASSES, batch_max_size=DEFAULT_MAX_BATCH_SIZE,
+                 batch_max_wait_ms=DEFAULT_MAX_WAIT_MS, preprocess_workers=DEFAULT_WORKERS,
+                 preprocess_mode="thread", preprocess_slots=None, min_side=DECODE_MIN_SIDE,
+                 quality_gate=None, embeddings=False):
+        self.class_names = list(class_names)
+        self.embeddings = embeddings
+        self.batch_max_size = int(batch_max_size)
+        self.batch_max_wait_ms = float(batch_max_wait_ms)
+        self.min_side = min_side
+        self.quality_gate = quality_gate
+        check = quality_gate.check if quality_gate is not None else None
+
+        self.active = None
+        self.pool = PreprocessPool(
+            workers=preprocess_workers,
+            mode=preprocess_mode,
+            slots=preprocess_slots or max(2 * self.batch_max_size, 2 * preprocess_workers),
+            min_side=min_side,
+            check=check
+        )
+        self._lock = threading.Lock()
+
+    # ---------- loading ----------
+    @property
+    def ready(self):
+        return self.active is not None
+
+    @property
+    def model(self):
+        return self.active.model if self.active is not None else None
+
+    @property
+    def batcher(self):
+        return self.active.batcher if self.active is not None else None
+
+    @property
+    def version(self):
+        return self.active.version if self.active is not None else None
+
+    def load(self, path, backend=None, num_threads=None, inter_op_threads=None, model_bytes=None,
+             warmup_batch_sizes=(), tracker=None, version=None):
+        """Import the runtime, load and warm up the model at path, then install it.
+
+        ``tracker`` (a StartupTracker) times the import/load/warmup phases.
+        ``version`` names the model (default: a hash of the file). Requests
+        keep being served by the current model until this one is warm.
+        """
+        served = self.prepare(
+            path, backend,
+            num_threads=num_threads,
+            inter_op_threads=inter_op_threads,
+            model_bytes=model_bytes,
+            warmup_batch_sizes=warmup_batch_sizes,
+            tracker=tracker,
+            version=version
+        )
+        self._publish(served)
+        return served.model
+
+    def prepare(self, path, backend=None, num_threads=None, inter_op_threads=None, model_bytes=None,
+                warmup_batch_sizes=(), tracker=None, version=None, embeddings=None):
+        """Load and warm up the model at path as a ServedModel, without serving it.
+
+        ``embeddings`` overrides the engine's setting for this model.
+        """
+        name = backend or backend_for_path(path)
+        phase = tracker.phase if tracker is not None else (lambda _: nullcontext())
+
+        with phase("import"):
+            import_runtime(name)
+        with phase("load"):
+            model = load_backend(
+                path, name,
+                num_threads=num_threads,
+                inter_op_threads=inter_op_threads,
+                model_bytes=model_bytes,
+                embeddings=self.embeddings if embeddings is None else embeddings
+            )
+            digest = model_version(path)
+        if warmup_batch_sizes:
+            with phase("warmup"):
+                warm_up(model, warmup_batch_sizes, tracker=tracker)
+
+        return ServedModel(model, version or digest, path, digest, self.batch_max_size, self.batch_max_wait_ms)
+
+    def install(self, model, version, path=None, digest=None):
+        """Serve predictions from an already loaded (and warmed) backend.
+
+        New requests go to this model at once; requests already holding the
+        previous one finish on it, and its batcher is closed after the last.
+        """
+        return self._publish(
+            ServedModel(model, version, path, digest, self.batch_max_size, self.batch_max_wait_ms)
+        )
+
+    def _publish(self, served):
+        with self._lock:
+            old, self.active = self.active, served
+            idle = old is not None and self._retire(old)
+        if idle:
+            old.close()
+        return served
+
+    def _retire(self, served):
+        served.retired = True
+        return served.in_flight == 0
+
+    @contextmanager
+    def serving(self):
+        """Pin the current model for the duration of one request"""
+        with self._lock:
+            served = self.active
+            if served is None:
+                raise RuntimeError("Model not loaded")
+            served.in_flight += 1
+        try:
+            yield served
+        finally:
+            with self._lock:
+                served.in_flight -= 1
+                drained = served.retired and served.in_flight == 0
+            if drained:
+                served.close()
+
+    def close(self):
+        """Drain queued inference and stop the preprocessing workers"""
+        if self.active is not None:
+            self.active.close()
+        self.pool.close()
+
+    # ---------- preprocessing ----------
+    def preprocess(self, image, timer=None):
+        """Path, encoded bytes, BGR ndarray or Frame -> (1, 224, 224, 3) float32 tensor"""
+        timer = timer or StageTimer()
+        if isinstance(image, Frame):
+            with timer.stage('preprocess'):
+                out = np.empty((1,) + INPUT_SHAPE, dtype=np.float32)
+                frame_into(image, out[0], self.pool.check)
+                return out
+        with timer.stage('decode'):
+            img = load_image(image, min_side=self.min_side)
+        with timer.stage('preprocess'):
+            return preprocess_image(img, self.pool.check)
+
+    def load_tensor(self, image):
+        """(224, 224, 3) tensor, or the exception if the image cannot be read"""
+        try:
+            return self.preprocess(image)[0]
+        except Exception as e:
+            return e
+
+    # ---------- inference ----------
+    # Outside serving() these use whichever model is current at the call
+    def predict(self, tensor, timeout=None):
+        """One (224, 224, 3) tensor through the micro-batcher -> its output row"""
+        return self.active.predict(tensor, timeout=timeout)
+
+    def submit(self, tensor, deadline=None):
+        """Future for one tensor's output row (see MicroBatcher.submit)"""
+        return self.active.submit(tensor, deadline=deadline)
+
+    def predict_batch(self, batch):
+        """(N, 224, 224, 3) -> (N, classes) in one forward pass, bypassing the batcher"""
+        return self.active.predict_batch(batch)
+
+    def predict_tensors(self, tensors, served=None):
+        """Output rows for a list of tensors in one forward pass.
+
+        Entries that are exceptions (failed decodes) are passed through in
+        place, so the result lines up with the input.
+        """
+        valid = [i for i, t in enumerate(tensors) if not isinstance(t, Exception)]
+        rows = {}
+        if valid:
+            preds = (served or self.active).predict_batch(np.stack([tensors[i] for i in valid]))
+            rows = dict(zip(valid, preds))
+        return [rows[i] if i in rows else tensors[i] for i in range(len(tensors))]
+
+    def predict_embeddings(self, batch, served=None):
+        """(output rows, embeddings) for a (N, 224, 224, 3) batch in one forward pass,
+        skipping the micro-batcher; the engine must have been built with embeddings=True"""
+        return (served or self.active).predict_embeddings(batch)
+
+    def predict_tta(self, tensor, views=DEFAULT_VIEWS, served=None):
+        """Mean output over augmented views of one tensor, scored as one batch.
+
+        Returns (row, agreement); see utils.tta. The views skip the
+        micro-batcher: they already make a batch of their own.
+        """
+        rows = (served or self.active).predict_batch(augment(tensor, views))
+        return aggregate(rows)
+
+    def predict_tiles(self, image, served=None, stride=DEFAULT_STRIDE, max_side=DEFAULT_MAX_SIDE,
+                      min_leaf=DEFAULT_MIN_LEAF, batch_size=None, timer=None,
+                      min_votes=DEFAULT_MIN_VOTES, min_share=DEFAULT_MIN_SHARE):
+        """Tile a photo with several leaves and score the leaf tiles (see utils.tiling).
+
+        Returns (aggregated row, tile report). Decoding keeps the resolution
+        the tiles need instead of squashing the photo to 224x224.
+        """
+        timer = timer or StageTimer()
+        with timer.stage('decode'):
+            img = fit_image(image, max_side)
+        with timer.stage('inference'):
+            return predict_tiles(
+                img, (served or self.active).predict_batch, self.class_names,
+                stride=stride,
+                min_leaf=min_leaf,
+                batch_size=batch_size or self.batch_max_size,
+                min_votes=min_votes,
+                min_share=min_share
+            )
+
+    # ---------- ranking ----------
+    @staticmethod
+    def top_indices(preds, k=None):
+        """Class indices best first; ties keep class order like argmax"""
+        return np.argsort(-np.asarray(preds), kind="stable")[:k]
+
+    def top_k(self, preds, k=None):
+        """[(class name, probability)] best first"""
+        return [(self.class_names[i], float(preds[i])) for i in self.top_indices(preds, k)]
+
+    def classify(self, preds):
+        """(class name, probability) of the top class"""
+        idx = int(np.argmax(preds))
+        return self.class_names[idx], float(preds[idx])
@@ -0,0 +1,133 @@
+"""
+Pre-resized frames from edge clients
+A 224x224x3 uint8 frame (compact binary format or WebP) goes straight into
+the float32 input buffer: no multipart parsing, no JPEG decode, no resize
+"""
+
+import struct
+
+import cv2
+import numpy as np
+
+from .preprocessing import INPUT_SHAPE
+
+# ================= CONFIGURATION =================
+FRAMES_CONTENT_TYPE = "application/x-mango-frames"
+WEBP_CONTENT_TYPE = "image/webp"
+FRAME_TYPES = (FRAMES_CONTENT_TYPE, WEBP_CONTENT_TYPE)
+
+# Header, little-endian, 20 bytes:
+#   magic "MNGF" | version u8 | dtype u8 | layout u8 | channel order u8 |
+#   frame count u32 | height u16 | width u16 | channels u16 | reserved u16 (0)
+# followed by count * height * width * channels pixel bytes.
+MAGIC = b"MNGF"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBIHHHH")
+
+DTYPES = {1: np.uint8}
+LAYOUTS = {1: "NHWC"}
+ORDERS = {1: "RGB", 2: "BGR"}
+_ORDER_CODES = {name: code for code, name in ORDERS.items()}
+
+FRAME_BYTES = int(np.prod(INPUT_SHAPE))
+_SCALE = np.float32(255.0)
+
+
+class FrameError(ValueError):
+    """A frame payload that does not match the model input; answered with 400"""
+
+
+# ================= FRAMES =================
+class Frame:
+    """One (224, 224, 3) uint8 frame, a view into the request body, and its channel order"""
+
+    __slots__ = ("pixels", "order")
+
+    def __init__(self, pixels, order):
+        self.pixels = pixels
+        self.order = order
+
+
+def encode_frames(frames, order="RGB"):
+    """(N, 224, 224, 3) or (224, 224, 3) uint8 array -> frame payload bytes (for clients and tests)"""
+    frames = np.asarray(frames)
+    if frames.ndim == 3:
+        frames = frames[None]
+    if order not in _ORDER_CODES:
+        raise ValueError(f"order must be one of {sorted(_ORDER_CODES)}")
+    if frames.dtype != np.uint8 or frames.shape[1:] != INPUT_SHAPE:
+        raise ValueError(f"frames must be uint8 of shape (N,) + {INPUT_SHAPE}")
+    header = HEADER.pack(MAGIC, VERSION, 1, 1, _ORDER_CODES[order], len(frames), *INPUT_SHAPE, 0)
+    return header + np.ascontiguousarray(frames).tobytes()
+
+
+def parse_frames(body, max_frames=1):
+    """Validate a frame payload and return its Frames as views into ``body``.
+
+    Everything the preprocessing depends on is checked rather than
+    guessed: version, uint8 dtype, channels-last layout, a declared RGB or
+    BGR channel order, the exact model input size, and a body length that
+    matches the frame count to the byte.
+    """
+    body = memoryview(body).cast("B")
+    if len(body) < HEADER.size:
+        raise FrameError(f"Frame payload shorter than its {HEADER.size}-byte header")
+    magic, version, dtype, layout, order, count, height, width, channels, reserved = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise FrameError("Not a frame payload (bad magic)")
+    if version != VERSION:
+        raise FrameError(f"Unsupported frame format version {version} (expected {VERSION})")
+    if dtype not in DTYPES:
+        raise FrameError("Frames must be uint8: scaling to [0, 1] is done by the server")
+    if layout not in LAYOUTS:
+        raise FrameError("Frames must be channels-last (NHWC)")
+    if order not in ORDERS:
+        raise FrameError(f"Unknown channel order {order} (expected 1 = RGB or 2 = BGR)")
+    if reserved:
+        raise FrameError("Reserved header field must be 0")
+    if (height, width, channels) != INPUT_SHAPE:
+        raise FrameError(f"Frames must be {INPUT_SHAPE}, got {(height, width, channels)}")
+    if not 1 <= count <= max_frames:
+        raise FrameError(f"Expected 1 to {max_frames} frames, got {count}")
+    if len(body) != HEADER.size + count * FRAME_BYTES:
+        raise FrameError(f"Payload is {len(body)} bytes; {count} frames need {HEADER.size + count * FRAME_BYTES}")
+
+    pixels = np.frombuffer(body, dtype=np.uint8, offset=HEADER.size).reshape((count,) + INPUT_SHAPE)
+    return [Frame(frame, ORDERS[order]) for frame in pixels]
+
+
+def decode_webp(body):
+    """A WebP already at the model input size -> [Frame]; anything else is rejected, never resized"""
+    body = np.frombuffer(body, dtype=np.uint8)
+    if len(body) < 12 or body[:4].tobytes() != b"RIFF" or body[8:12].tobytes() != b"WEBP":
+        raise FrameError("Not a WebP image")
+    img = cv2.imdecode(body, cv2.IMREAD_COLOR)
+    if img is None:
+        raise FrameError("Invalid WebP image")
+    if img.shape != INPUT_SHAPE:
+        raise FrameError(f"WebP frames must be {INPUT_SHAPE[1]}x{INPUT_SHAPE[0]}, got {img.shape[1]}x{img.shape[0]}")
+    return [Frame(img, "BGR")]
+
+
+def read_frames(body, content_type, max_frames=1):
+    """Frames of a request body sent as FRAMES_CONTENT_TYPE or WEBP_CONTENT_TYPE"""
+    if content_type == WEBP_CONTENT_TYPE:
+        return decode_webp(body)
+    if content_type == FRAMES_CONTENT_TYPE:
+        return parse_frames(body, max_frames)
+    raise FrameError(f"Unsupported content type {content_type!r} (expected one of {FRAME_TYPES})")
+
+
+# ================= PREPROCESSING =================
+def frame_into(frame, out, check=None):
+    """Scale a Frame into a (224, 224, 3) float32 buffer, RGB in [0, 1].
+
+    Same arithmetic as preprocessing.preprocess_into minus the resize, so a
+    frame and the equivalent 224x224 image give bit-identical tensors.
+    ``check`` (the quality gate) sees the frame in BGR order first.
+    """
+    rgb = frame.pixels if frame.order == "RGB" else frame.pixels[..., ::-1]
+    if check is not None:
+        check(frame.pixels if frame.order == "BGR" else cv2.cvtColor(frame.pixels, cv2.COLOR_RGB2BGR))
+    np.divide(rgb, _SCALE, out=out, dtype=np.float32)
+    return out
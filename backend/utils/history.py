@@ -0,0 +1,344 @@
+"""
+Prediction history for outbreak trends
+Every prediction is appended to a local sqlite store (WAL mode) by a
+background writer in batched transactions; hourly, daily and weekly count
+rollups kept in the same transactions answer per-orchard/plot trend queries
+without scanning the raw rows
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from collections import Counter
+
+import numpy as np
+
+from .metrics import REGISTRY
+
+# ================= CONFIGURATION =================
+DEFAULT_QUEUE_SIZE = 4096
+MAX_WRITE_BATCH = 1024  # rows per transaction
+
+# Trend buckets as (seconds, offset), aligned to UTC. Weeks start on Monday (the epoch
+# was a Thursday). Each bucket has its own rollup table, counts_<bucket>.
+HOUR = 3600
+DAY = 86400
+BUCKETS = {'hour': (HOUR, 0), 'day': (DAY, 0), 'week': (7 * DAY, 4 * DAY)}
+
+# How counts are grouped besides time: per plot (within its orchard), per orchard, or overall
+GROUPS = {'plot': ('orchard', 'plot'), 'orchard': ('orchard',), 'all': ()}
+
+MAX_RECORDS = 1000
+
+HISTORY_RECORDS = REGISTRY.counter(
+    "mango_history_records_total", "Predictions handed to the history store, by outcome", ["result"]
+)
+
+
+# ================= STORE =================
+class HistoryStore:
+    """Append-only sqlite log of predictions plus hourly, daily and weekly count rollups.
+
+    A ``predictions`` row holds the top-1 class index and confidence, every
+    class confidence as a float16 blob, the model version, optional
+    orchard/plot tags and a small JSON ``meta`` (mode, source, cache hit...).
+    ``counts_hour`` / ``counts_day`` / ``counts_week`` hold one row per
+    (orchard, plot, bucket, class) and are updated in the same transaction as
+    the inserts, so a trend query reads the rollup rows of its buckets, never
+    the predictions themselves.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._db_pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # sqlite connections must not be shared across fork(); reopen per process
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Workers of every process append to the same file: wait for the write lock
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: commits skip the fsync, a power cut can only lose the last ones
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "id INTEGER PRIMARY KEY, ts REAL NOT NULL, class_index INTEGER NOT NULL, "
+                "confidence REAL NOT NULL, scores BLOB, model_version TEXT, "
+                "orchard TEXT, plot TEXT, source TEXT, mode TEXT, meta TEXT);"
+                "CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts);"
+                "CREATE INDEX IF NOT EXISTS predictions_plot ON predictions (orchard, plot, ts);"
+                + "".join(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    "orchard TEXT NOT NULL, plot TEXT NOT NULL, bucket INTEGER NOT NULL, "
+                    "class_index INTEGER NOT NULL, n INTEGER NOT NULL, "
+                    "PRIMARY KEY (orchard, plot, bucket, class_index)) WITHOUT ROWID;"
+                    # Covering, so time-range queries never touch the table itself
+                    f"CREATE INDEX IF NOT EXISTS {table}_bucket ON {table} (bucket, orchard, plot, class_index, n);"
+                    for table in (f"counts_{bucket}" for bucket in BUCKETS)
+                )
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def add(self, rows):
+        """rows: dicts with the predictions columns (scores as bytes or None)"""
+        rollups = {f"counts_{bucket}": Counter() for bucket in BUCKETS}
+        for row in rows:
+            # Untagged predictions are counted under '' (rollup keys cannot be NULL)
+            tags = (row['orchard'] or '', row['plot'] or '')
+            for bucket, (step, offset) in BUCKETS.items():
+                start = int((row['ts'] - offset) // step * step + offset)
+                rollups[f"counts_{bucket}"][tags + (start, row['class_index'])] += 1
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT INTO predictions (ts, class_index, confidence, scores, model_version, "
+                    "orchard, plot, source, mode, meta) VALUES (:ts, :class_index, :confidence, :scores, "
+                    ":model_version, :orchard, :plot, :source, :mode, :meta)",
+                    rows
+                )
+                for table, counts in rollups.items():
+                    db.executemany(
+                        f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (orchard, plot, bucket, class_index) DO UPDATE SET n = n + excluded.n",
+                        [key + (n,) for key, n in counts.items()]
+                    )
+
+    def counts(self, class_names, bucket='day', group='plot', since=None, until=None, orchard=None, plot=None):
+        """Predictions per class, time bucket and group (see GROUPS), oldest bucket first.
+
+        ``since``/``until`` are unix times; ``since`` is rounded down to its
+        bucket. Untagged predictions appear with null orchard/plot. Rows come
+        straight from the bucket's rollup (plots are summed into orchards by
+        sqlite), so the cost grows with the buckets returned, not with the
+        number of predictions.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket {bucket!r} (expected one of {sorted(BUCKETS)})")
+        if group not in GROUPS:
+            raise ValueError(f"Unknown group {group!r} (expected one of {sorted(GROUPS)})")
+        step, offset = BUCKETS[bucket]
+        columns = GROUPS[group]
+
+        where, params = [], []
+        for column, value in (('orchard', orchard), ('plot', plot)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("bucket >= ?")
+            params.append(int((since - offset) // step * step + offset))
+        if until is not None:
+            where.append("bucket < ?")
+            params.append(until)
+        keys = ", ".join(('bucket',) + columns)
+        sql = f"SELECT {keys}, class_index, SUM(n) FROM counts_{bucket} "
+        if group == 'plot':
+            # Rollup rows are already one per (orchard, plot, bucket, class)
+            sql = f"SELECT {keys}, class_index, n FROM counts_{bucket} "
+        sql += f"WHERE {' AND '.join(where)} " if where else ""
+        if group != 'plot':
+            sql += f"GROUP BY {keys}, class_index"
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+
+        names = list(class_names)
+        buckets = {}
+        for row in rows:
+            key = row[:-2]
+            entry = buckets.get(key)
+            if entry is None:
+                entry = buckets[key] = {
+                    'start': key[0],
+                    **{column: value or None for column, value in zip(columns, key[1:])},
+                    'total': 0,
+                    'counts': {},
+                }
+            class_index, n = row[-2:]
+            name = names[class_index] if 0 <= class_index < len(names) else str(class_index)
+            entry['counts'][name] = entry['counts'].get(name, 0) + n
+            entry['total'] += n
+        return [buckets[key] for key in sorted(buckets)]
+
+    def records(self, class_names, since=None, until=None, orchard=None, plot=None, limit=100):
+        """Most recent predictions, newest first, with their confidences decoded"""
+        where, params = [], []
+        for clause, value in (("orchard = ?", orchard), ("plot = ?", plot), ("ts >= ?", since), ("ts < ?", until)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, ts, class_index, confidence, scores, model_version, orchard, plot, source, mode, meta "
+                f"FROM predictions {'WHERE ' + ' AND '.join(where) if where else ''} "
+                "ORDER BY ts DESC LIMIT ?",
+                # sqlite reads a negative LIMIT as no limit at all
+                params + [max(1, min(int(limit), MAX_RECORDS))]
+            ).fetchall()
+        return [self._record(row, class_names) for row in rows]
+
+    @staticmethod
+    def _record(row, class_names):
+        id_, ts, class_index, confidence, scores, version, orchard, plot, source, mode, meta = row
+        return {
+            'id': id_,
+            'ts': ts,
+            'disease': class_names[class_index] if 0 <= class_index < len(class_names) else None,
+            'confidence': round(confidence, 4),
+            'scores': [round(float(s), 4) for s in np.frombuffer(scores, dtype=np.float16)] if scores else None,
+            'model_version': version,
+            'orchard': orchard,
+            'plot': plot,
+            'source': source,
+            'mode': mode,
+            **(json.loads(meta) if meta else {}),
+        }
+
+    def size(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+
+def history_row(ts, preds, model_version, source, mode=None, orchard=None, plot=None, meta=None, class_index=None):
+    """predictions row for one model output row (preds None: only class_index is known)"""
+    if preds is not None:
+        preds = np.asarray(preds, dtype=np.float32)
+        class_index = int(np.argmax(preds)) if class_index is None else class_index
+    return {
+        'ts': ts,
+        'class_index': int(class_index),
+        'confidence': float(preds[class_index]) if preds is not None else 0.0,
+        'scores': preds.astype(np.float16).tobytes() if preds is not None else None,
+        'model_version': model_version,
+        'orchard': orchard or None,
+        'plot': plot or None,
+        'source': source,
+        'mode': mode,
+        'meta': json.dumps(meta, separators=(",", ":")) if meta else None,
+    }
+
+
+# ================= WRITER =================
+class PredictionHistory:
+    """Hands predictions to a background thread that appends them to a HistoryStore.
+
+    ``record(...)`` never blocks the request: it queues the output row and
+    tags, and when the queue is full the prediction is dropped and counted.
+    The writer turns everything already waiting into one transaction, so
+    under load rows are inserted in batches of up to MAX_WRITE_BATCH.
+    """
+
+    def __init__(self, store, class_names, queue_size=DEFAULT_QUEUE_SIZE):
+        self.store = store
+        self.class_names = list(class_names)
+        self.queue_size = int(queue_size)
+
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self._written = 0
+        self._dropped = 0
+        self._errors = 0
+        self._batches = 0
+
+    # ---------- request path ----------
+    def record(self, preds, model_version, source="api", mode=None, orchard=None, plot=None, meta=None,
+               class_index=None):
+        """Queue one prediction; never blocks"""
+        self._ensure_worker()
+        if preds is not None:
+            preds = np.array(preds, dtype=np.float32, copy=True)
+        item = (time.time(), preds, model_version, source, mode, orchard, plot, meta, class_index)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            HISTORY_RECORDS.inc(result="dropped")
+            with self._lock:
+                self._dropped += 1
+
+    # ---------- worker ----------
+    def _ensure_worker(self):
+        # Same lazy, fork-aware start as MicroBatcher
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._worker = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            if items[0] is None:
+                return
+            # Whatever else is already waiting goes into the same transaction
+            while len(items) < MAX_WRITE_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                items.append(item)
+
+            try:
+                self.store.add([history_row(*item) for item in items])
+            except Exception:
+                traceback.print_exc()
+                HISTORY_RECORDS.inc(len(items), result="error")
+                with self._lock:
+                    self._errors += len(items)
+                continue
+            HISTORY_RECORDS.inc(len(items), result="written")
+            with self._lock:
+                self._written += len(items)
+                self._batches += 1
+
+    # ---------- queries ----------
+    def counts(self, **query):
+        """Timed HistoryStore.counts for this store's classes"""
+        start = time.perf_counter()
+        buckets = self.store.counts(self.class_names, **query)
+        return {'buckets': buckets, 'query_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+    def records(self, **query):
+        return self.store.records(self.class_names, **query)
+
+    # ---------- status ----------
+    def stats(self):
+        with self._lock:
+            return {
+                'store': self.store.path,
+                'queue_depth': self._queue.qsize(),
+                'written': self._written,
+                'batches': self._batches,
+                'dropped': self._dropped,
+                'errors': self._errors,
+            }
+
+    def flush(self):
+        """Write what is already queued and stop the writer (it restarts on the next record)"""
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+
+    close = flush
@@ -0,0 +1,241 @@
+"""
+In-memory image loading
+Decodes uploads straight from memory instead of round-tripping through disk
+"""
+
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+import cv2
+import numpy as np
+
+# ================= CONFIGURATION =================
+# Uploads larger than this may be spooled to disk (only if spooling is enabled)
+DEFAULT_SPOOL_THRESHOLD = 8 * 1024 * 1024  # 8MB
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+# Limits per archive: a small compressed upload must not expand to gigabytes
+DEFAULT_ARCHIVE_MAX_IMAGE_BYTES = 16 * 1024 * 1024  # decompressed size of one member
+DEFAULT_ARCHIVE_MAX_IMAGES = 1000
+
+
+# ================= UPLOAD STREAMS =================
+def upload_stream_factory(total_content_length, spool_to_disk=False,
+                          spool_threshold=DEFAULT_SPOOL_THRESHOLD, spool_dir=None):
+    """Pick where an incoming upload body is buffered.
+
+    Bodies are kept in a ``BytesIO`` so they can be decoded without touching
+    the filesystem. Disk spooling is an opt-in fallback for oversized bodies;
+    the temporary file is unlinked as soon as it is closed.
+    """
+    if spool_to_disk and total_content_length and total_content_length > spool_threshold:
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        return tempfile.TemporaryFile("wb+", dir=spool_dir)
+    return io.BytesIO()
+
+
+def read_upload(stream):
+    """Return the raw bytes of an upload stream as a buffer.
+
+    ``BytesIO`` streams are exposed as a zero-copy ``memoryview``; spooled
+    files are read directly into a uint8 array. Call ``release_buffer`` when
+    done so the underlying stream can be closed.
+    """
+    if isinstance(stream, io.BytesIO):
+        return stream.getbuffer()
+
+    stream.seek(0)
+    try:
+        return np.fromfile(stream, dtype=np.uint8)
+    except (io.UnsupportedOperation, OSError, ValueError):
+        stream.seek(0)
+        return np.frombuffer(stream.read(), dtype=np.uint8)
+
+
+def release_buffer(buf):
+    """Release a buffer returned by ``read_upload``"""
+    if isinstance(buf, memoryview):
+        buf.release()
+
+
+# ================= DECODING =================
+# JPEG DCT-domain downscaling: decode at 1/factor resolution without a full decode
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Start-of-frame markers carrying the image dimensions (excludes DHT/JPG/DAC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                     0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_HEADER_SCAN = 512 * 1024  # SOF lives after APPn segments (EXIF is <= 64KB each)
+
+
+def jpeg_size(buf):
+    """(height, width) from a JPEG's SOF header without decoding, or None"""
+    if buf.size < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+        return None
+
+    header = buf[:_JPEG_HEADER_SCAN].tobytes()
+    i, n = 2, len(header)
+    while i + 4 <= n:
+        if header[i] != 0xFF:
+            return None
+        marker = header[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = (header[i + 5] << 8) | header[i + 6]
+            width = (header[i + 7] << 8) | header[i + 8]
+            return (height, width) if height and width else None
+        if marker == 0xDA:  # start of scan before any SOF
+            return None
+        i += 2 + ((header[i + 2] << 8) | header[i + 3])
+    return None
+
+
+def reduced_decode_flag(buf, min_side):
+    """Largest JPEG reduction that keeps the short side >= min_side.
+
+    Returns (flag, factor); (IMREAD_COLOR, 1) for non-JPEG data or images
+    that are already small.
+    """
+    size = jpeg_size(buf)
+    if size is None:
+        return cv2.IMREAD_COLOR, 1
+    short_side = min(size)
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        # libjpeg rounds reduced dimensions up
+        if -(-short_side // factor) >= min_side:
+            return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+def decode_image(data, min_side=None):
+    """Decode encoded image bytes (bytes, bytearray, memoryview or uint8 array) to BGR.
+
+    With ``min_side`` set, JPEGs are decoded at the largest 1/2, 1/4 or 1/8
+    DCT-domain reduction whose short side is still at least ``min_side``
+    pixels. PNG and other formats always take the full decode.
+    """
+    if isinstance(data, np.ndarray):
+        buf = data.reshape(-1) if data.dtype == np.uint8 else data.view(np.uint8).reshape(-1)
+    else:
+        buf = np.frombuffer(data, dtype=np.uint8)
+
+    if buf.size == 0:
+        raise ValueError("Empty image data")
+
+    flag = cv2.IMREAD_COLOR
+    if min_side:
+        flag, _ = reduced_decode_flag(buf, min_side)
+
+    img = cv2.imdecode(buf, flag)
+    if img is None and flag != cv2.IMREAD_COLOR:
+        img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Invalid image")
+    return img
+
+
+def load_image(source, min_side=None):
+    """Load a BGR uint8 image from a path, encoded bytes or a decoded array.
+
+    Decoded arrays (H, W, 3) are passed through unchanged; grayscale arrays
+    are expanded to three channels. 1-D uint8 arrays are treated as encoded
+    bytes. ``min_side`` enables reduced JPEG decoding (see ``decode_image``).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        try:
+            data = np.fromfile(os.fspath(source), dtype=np.uint8)
+            return decode_image(data, min_side=min_side)
+        except (OSError, ValueError):
+            raise ValueError(f"Cannot read image: {source}")
+
+    if isinstance(source, np.ndarray) and source.ndim in (2, 3):
+        if source.ndim == 2:
+            return cv2.cvtColor(source, cv2.COLOR_GRAY2BGR)
+        if source.shape[2] == 3:
+            return source
+        if source.shape[2] == 4:
+            return cv2.cvtColor(source, cv2.COLOR_BGRA2BGR)
+        raise ValueError(f"Unsupported image shape: {source.shape}")
+
+    return decode_image(source, min_side=min_side)
+
+
+# ================= ARCHIVES =================
+def is_archive(filename):
+    """True if the filename looks like a supported zip/tar archive"""
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_image_name(name, extensions):
+    return "." in name and name.rsplit(".", 1)[1].lower() in extensions
+
+
+def _read_member(name, size, open_member, max_bytes):
+    """Member bytes, or a ValueError if it decompresses to more than max_bytes.
+
+    The declared size is checked first; the read itself is bounded too, so a
+    header that understates the size cannot get past the limit.
+    """
+    if size > max_bytes:
+        return ValueError(f"Image larger than {max_bytes} bytes once extracted: {name}")
+    try:
+        fh = open_member()
+        if fh is None:
+            return ValueError(f"Cannot read archive member: {name}")
+        with fh:
+            data = fh.read(max_bytes + 1)
+    except (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError) as e:
+        return ValueError(f"Cannot read archive member {name}: {e}")
+    if len(data) > max_bytes:
+        return ValueError(f"Image larger than {max_bytes} bytes once extracted: {name}")
+    return data
+
+
+def iter_archive_images(stream, filename, extensions=IMAGE_EXTENSIONS,
+                        max_image_bytes=DEFAULT_ARCHIVE_MAX_IMAGE_BYTES, max_images=DEFAULT_ARCHIVE_MAX_IMAGES):
+    """Yield (member_name, bytes or ValueError) for every image inside a zip or tar archive.
+
+    Members are read one at a time so only a single encoded image is held in
+    memory per iteration step. Directories and non-image members are skipped.
+    A member over ``max_image_bytes`` once extracted comes back as a
+    ValueError instead of its bytes; past ``max_images`` images, one
+    ValueError under the archive's name ends the iteration.
+    """
+    stream.seek(0)
+    if filename.lower().endswith(".zip"):
+        archive = zipfile.ZipFile(stream)
+        members = (
+            (info.filename, info.file_size, lambda info=info: archive.open(info))
+            for info in archive.infolist()
+            if not info.is_dir() and _is_image_name(info.filename, extensions)
+        )
+    else:
+        archive = tarfile.open(fileobj=stream, mode="r:*")
+        members = (
+            (member.name, member.size, lambda member=member: archive.extractfile(member))
+            for member in archive
+            if member.isfile() and _is_image_name(member.name, extensions)
+        )
+    with archive:
+        for count, (name, size, open_member) in enumerate(members):
+            if count == max_images:
+                yield filename, ValueError(f"Archive holds more than {max_images} images; the rest were skipped")
+                return
+            yield name, _read_member(name, size, open_member, max_image_bytes)
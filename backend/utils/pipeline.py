@@ -0,0 +1,235 @@
+"""
+Preprocessing pipeline decoupled from inference
+Decode + preprocess run in a worker pool so request N+1 is decoded while
+request N is on the model
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .frames import Frame, frame_into
+from .image_io import decode_image
+from .preprocessing import (
+    preprocess_image, preprocess_into, TensorPool, INPUT_SHAPE, DECODE_MIN_SIDE
+)
+
+# ================= CONFIGURATION =================
+DEFAULT_WORKERS = 2
+TIMING_WINDOW = 1024  # recent samples kept per stage for percentiles
+
+
+# ================= STAGE TIMINGS =================
+class StageStats:
+    """Rolling per-stage latency samples (milliseconds)"""
+
+    def __init__(self, window=TIMING_WINDOW):
+        self._samples = {}
+        self._counts = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, timings):
+        with self._lock:
+            for stage, ms in timings.items():
+                if stage not in self._samples:
+                    self._samples[stage] = deque(maxlen=self._window)
+                    self._counts[stage] = 0
+                self._samples[stage].append(ms)
+                self._counts[stage] += 1
+
+    def mean(self, stage):
+        """Mean of the recent samples of one stage in ms (None before the first)"""
+        with self._lock:
+            samples = self._samples.get(stage)
+            return sum(samples) / len(samples) if samples else None
+
+    def summary(self):
+        with self._lock:
+            out = {}
+            for stage, samples in self._samples.items():
+                arr = np.fromiter(samples, dtype=np.float64)
+                out[stage] = {
+                    'count': self._counts[stage],
+                    'mean_ms': round(float(arr.mean()), 3),
+                    'p50_ms': round(float(np.percentile(arr, 50)), 3),
+                    'p95_ms': round(float(np.percentile(arr, 95)), 3),
+                }
+            return out
+
+
+# ================= WORKER STAGE =================
+def run_stage(data, out=None, min_side=DECODE_MIN_SIDE, check=None):
+    """Decode + preprocess one image, writing into ``out`` when given.
+
+    ``min_side`` enables reduced JPEG decoding (None for a full decode);
+    ``check`` is the quality gate (see preprocess_into).
+    Returns (tensor, timings) where tensor has shape INPUT_SHAPE.
+    """
+    t0 = time.perf_counter()
+    img = decode_image(data, min_side=min_side)
+    t1 = time.perf_counter()
+    tensor = preprocess_into(img, out, check) if out is not None else preprocess_image(img, check)[0]
+    t2 = time.perf_counter()
+    return tensor, {'decode': (t1 - t0) * 1000, 'preprocess': (t2 - t1) * 1000}
+
+
+_worker_shm = {}
+
+def _run_stage_shared(data, shm_name, slot, shape, min_side, check=None):
+    """Process-pool entry point: write the tensor into a shared-memory slot"""
+    shm = _worker_shm.get(shm_name)
+    if shm is None:
+        # Spawned workers share the parent's resource tracker, so attaching
+        # here does not hand ownership of the segment to this process
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shm[shm_name] = shm
+    nbytes = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+    out = np.ndarray(tuple(shape), dtype=np.float32, buffer=shm.buf, offset=slot * nbytes)
+    _, timings = run_stage(data, out=out, min_side=min_side, check=check)
+    return timings
+
+
+# ================= POOL =================
+class PreprocessedTensor:
+    """Lease on a preprocessed tensor; release it once inference has consumed it"""
+
+    def __init__(self, tensor, timings, release=None):
+        self.tensor = tensor
+        self.timings = timings
+        self._release = release
+
+    def release(self):
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class PreprocessPool:
+    """Run decode + preprocess in a pool of threads or processes.
+
+    Tensors are written into ``slots`` preallocated float32 buffers: a
+    ``TensorPool`` in ``thread`` mode, a shared-memory ring in ``process`` mode
+    (so tensors are never pickled). A buffer goes back to the pool when its
+    ``PreprocessedTensor`` is released; ``slots`` also caps how many tensors
+    can wait for inference, so keep it at least the inference batch size.
+    ``check`` runs on each resized image before scaling; whatever it raises
+    (PoorQuality from the quality gate) is raised by ``preprocess``.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, mode="thread", shape=INPUT_SHAPE, slots=None,
+                 min_side=DECODE_MIN_SIDE, check=None):
+        if mode not in ("thread", "process"):
+            raise ValueError("mode must be 'thread' or 'process'")
+        self.workers = int(workers)
+        self.mode = mode
+        self.shape = tuple(shape)
+        self.slots = int(slots) if slots else self.workers * 2
+        self.min_side = min_side
+        self.check = check
+
+        self._executor = None
+        self._pid = None
+        self._shm = None
+        self._free = None
+        self._tensors = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Executors and shared memory are per process; rebuild after fork()
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            if self.mode == "thread":
+                self._tensors = TensorPool(self.slots, self.shape)
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="preprocess")
+            else:
+                nbytes = int(np.prod(self.shape)) * np.dtype(np.float32).itemsize
+                self._shm = shared_memory.SharedMemory(create=True, size=nbytes * self.slots)
+                self._free = queue.Queue()
+                for slot in range(self.slots):
+                    self._free.put(slot)
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            self._pid = os.getpid()
+
+    def preprocess(self, data):
+        """Decode + preprocess ``data`` in the pool; returns a PreprocessedTensor.
+
+        A pre-resized Frame (utils.frames) skips the workers: it is scaled
+        straight into a free buffer on the calling thread.
+        """
+        self._ensure_started()
+        if isinstance(data, Frame):
+            return self._preprocess_frame(data)
+        t0 = time.perf_counter()
+
+        if self.mode == "thread":
+            buf = self._tensors.acquire()
+            try:
+                tensor, timings = self._executor.submit(run_stage, data, buf, self.min_side, self.check).result()
+            except BaseException:
+                self._tensors.release(buf)
+                raise
+            timings['queue_wait'] = max((time.perf_counter() - t0) * 1000
+                                        - timings['decode'] - timings['preprocess'], 0.0)
+            return PreprocessedTensor(tensor, timings, release=lambda: self._tensors.release(buf))
+
+        slot = self._free.get()
+        try:
+            payload = data if isinstance(data, bytes) else bytes(data)
+            timings = self._executor.submit(
+                _run_stage_shared, payload, self._shm.name, slot, self.shape, self.min_side, self.check
+            ).result()
+        except BaseException:
+            self._free.put(slot)
+            raise
+
+        slots = np.ndarray((self.slots,) + self.shape, dtype=np.float32, buffer=self._shm.buf)
+        timings['queue_wait'] = max((time.perf_counter() - t0) * 1000
+                                    - timings['decode'] - timings['preprocess'], 0.0)
+        return PreprocessedTensor(slots[slot], timings, release=lambda: self._free.put(slot))
+
+    def _preprocess_frame(self, frame):
+        t0 = time.perf_counter()
+        if self.mode == "thread":
+            buf = self._tensors.acquire()
+            release = lambda: self._tensors.release(buf)
+        else:
+            slot = self._free.get()
+            buf = np.ndarray((self.slots,) + self.shape, dtype=np.float32, buffer=self._shm.buf)[slot]
+            release = lambda: self._free.put(slot)
+        t1 = time.perf_counter()
+        try:
+            frame_into(frame, buf, self.check)
+        except BaseException:
+            release()
+            raise
+        timings = {'queue_wait': (t1 - t0) * 1000, 'decode': 0.0, 'preprocess': (time.perf_counter() - t1) * 1000}
+        return PreprocessedTensor(buf, timings, release=release)
+
+    def close(self):
+        """Shut down workers and free shared memory"""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+        self._executor = None
+        self._shm = None
@@ -3,49 +3,89 @@ Mango Leaf Disease Prediction Module
 With disease-to-nutrient deficiency mapping
 """
 
+import atexit
 import os
+import threading
 import cv2
 import numpy as np
-import tensorflow as tf
 from datetime import datetime
 import traceback
 
+from .backends import backend_for_path
+from .engine import InferenceEngine, DISEASE_CLASSES
+from .registry import ModelRegistry
+from .metrics import StageTimer, observe_stages, PREDICTIONS, ERRORS
+from .quality import QualityGate, PoorQuality, record_rejection
+from .embeddings import EmbeddingIndex, DEFAULT_K
+from .history import PredictionHistory, HistoryStore
+from .tta import parse_views
+from .responses import ResponseTemplate, ScoreList, Slot, dumps, encode_floats, extend, scale_floats
+
 # ================= CONFIGURATION =================
+# Inference backend: keras (default), tflite or onnx
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+
 # Model paths
 MODEL_PATHS = [
     os.path.join('model', 'mango_model.keras'),
     os.path.join('model', 'mango_model.h5'),
+    os.path.join('model', 'mango_model.tflite'),
+    os.path.join('model', 'mango_model.onnx'),
     'mango_model.keras',
-    'mango_model.h5'
+    'mango_model.h5',
+    'mango_model.tflite',
+    'mango_model.onnx'
 ]
 
-# Find which model exists
+# Views averaged when predict_leaf(..., tta=True) (see utils/tta.py)
+TTA_VIEWS = parse_views(os.environ.get('TTA_VIEWS'))
+
+# Turn away blurry, badly exposed or leafless photos before inference
+# (default thresholds, see utils/quality.py); off until they are validated on the dataset
+QUALITY_GATE = os.environ.get('QUALITY_GATE', '0') == '1'
+
+# Case index searched when predict_leaf(..., similar=True) (see utils/embeddings.py)
+CASE_INDEX_DIR = os.environ.get('CASE_INDEX_DIR') or None
+SIMILAR_K = int(os.environ.get('SIMILAR_K', DEFAULT_K))
+
+# Every prediction is also appended to this history store, in the background
+# (opt-in, unset disables; the same file as the API's, see utils/history.py)
+HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', '')
+
+# Versioned models (model/<version>/...) take precedence over MODEL_PATHS
+registry = ModelRegistry('model', INFERENCE_BACKEND)
+
+# Resolved on first model load (see find_model_path)
 MODEL_PATH = None
 MODEL_FORMAT = None
-for path in MODEL_PATHS:
-    if os.path.exists(path):
-        MODEL_PATH = path
-        MODEL_FORMAT = 'keras' if path.endswith('.keras') else 'h5'
-        print(f"✅ Found model: {path} ({MODEL_FORMAT} format)")
-        break
-
-if MODEL_PATH is None:
+MODEL_VERSION = None
+
+def find_model_path():
+    """Find which model exists for the selected backend"""
+    global MODEL_PATH, MODEL_FORMAT, MODEL_VERSION
+    
+    try:
+        MODEL_VERSION, MODEL_PATH = registry.resolve()
+        MODEL_FORMAT = os.path.splitext(MODEL_PATH)[1].lstrip('.')
+        print(f"✅ Found model: {MODEL_PATH} (version {MODEL_VERSION}, {MODEL_FORMAT} format)")
+        return MODEL_PATH
+    except (FileNotFoundError, KeyError):
+        pass
+    
+    for path in MODEL_PATHS:
+        if os.path.exists(path) and backend_for_path(path) == INFERENCE_BACKEND:
+            MODEL_PATH = path
+            MODEL_FORMAT = os.path.splitext(path)[1].lstrip('.')
+            print(f"✅ Found model: {path} ({MODEL_FORMAT} format)")
+            return MODEL_PATH
+    
     print("⚠️ WARNING: No model file found!")
     if os.path.exists('model'):
         print(f"📁 Model folder contents: {os.listdir('model')}")
+    return None
 
 # ================= CLASS DEFINITIONS =================
-# 8 Disease classes from your training
-DISEASE_CLASSES = [
-    'Anthracnose',
-    'Bacterial Canker', 
-    'Cutting Weevil',
-    'Die Back',
-    'Gall Midge',
-    'Healthy',
-    'Powdery Mildew',
-    'Sooty Mould'
-]
+# 8 Disease classes from your training (DISEASE_CLASSES, defined in utils/engine.py)
 
 # 4 Nutrient deficiency classes (mapped from diseases)
 NUTRIENT_CLASSES = [
@@ -176,142 +216,263 @@ NUTRIENT_TREATMENTS = {
 }
 
 # ================= MODEL LOADING =================
-_model = None
-_model_loaded = False
+# Same engine code as the API, so offline and served predictions agree
+engine = InferenceEngine(
+    DISEASE_CLASSES,
+    quality_gate=QualityGate() if QUALITY_GATE else None,
+    embeddings=CASE_INDEX_DIR is not None
+)
+_model_lock = threading.Lock()
+_case_index = None
+history = PredictionHistory(HistoryStore(HISTORY_DB_PATH), DISEASE_CLASSES) if HISTORY_DB_PATH else None
+if history is not None:
+    # Offline scripts exit right after their last prediction: write what is queued
+    atexit.register(history.flush)
 
 def load_prediction_model():
-    """Load the TensorFlow model"""
-    global _model, _model_loaded
+    """Load the model with the configured inference backend (once per process)"""
+    if engine.ready:
+        return engine.model
     
-    if not _model_loaded:
+    with _model_lock:
+        if engine.ready:
+            return engine.model
         try:
-            if MODEL_PATH is None:
+            if MODEL_PATH is None and find_model_path() is None:
                 raise FileNotFoundError("Model file not found. Check model/ folder.")
             
             print(f"📦 Loading model from: {os.path.abspath(MODEL_PATH)}")
             
-            if MODEL_FORMAT == 'keras':
-                _model = tf.keras.models.load_model(MODEL_PATH)
-                print("✅ Model loaded (.keras format)")
-            else:
-                # Handle .h5 with potential batch_shape issue
-                try:
-                    _model = tf.keras.models.load_model(MODEL_PATH)
-                    print("✅ Model loaded (.h5 format)")
-                except Exception as e:
-                    if "batch_shape" in str(e):
-                        class FixedInputLayer(tf.keras.layers.InputLayer):
-                            def __init__(self, **kwargs):
-                                kwargs.pop('batch_shape', None)
-                                super().__init__(**kwargs)
-                        _model = tf.keras.models.load_model(
-                            MODEL_PATH, 
-                            custom_objects={'InputLayer': FixedInputLayer}
-                        )
-                        print("✅ Model loaded with batch_shape fix")
-                    else:
-                        raise
+            model = engine.load(MODEL_PATH, INFERENCE_BACKEND, version=MODEL_VERSION)
+            print(f"✅ Model loaded (.{MODEL_FORMAT} format, {model.name} backend)")
             
-            print(f"📐 Input shape: {_model.input_shape}")
-            print(f"📊 Output shape: {_model.output_shape}")
+            print(f"📐 Input shape: {model.input_shape}")
+            print(f"📊 Output shape: {model.output_shape}")
             print(f"🔢 Predicts {len(DISEASE_CLASSES)} diseases")
             
-            _model_loaded = True
-            
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             raise
-    
-    return _model
+        
+        return engine.model
+
+def load_case_index():
+    """Open CASE_INDEX_DIR for the loaded model's embeddings (once per process)"""
+    global _case_index
+    if CASE_INDEX_DIR is None:
+        raise ValueError("similar=True needs CASE_INDEX_DIR")
+    with _model_lock:
+        if _case_index is None:
+            _case_index = EmbeddingIndex(CASE_INDEX_DIR, engine.model.embedding_dim, model=engine.active.digest)
+        return _case_index
 
 # ================= IMAGE PROCESSING =================
-def preprocess_image(image_path):
-    """Preprocess image for model"""
+def preprocess_image(image, timer=None):
+    """Preprocess image for model (path, encoded bytes or BGR ndarray)"""
     try:
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError(f"Cannot read image: {image_path}")
-        
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = cv2.resize(img, (224, 224))
-        img = img.astype('float32') / 255.0
-        img = np.expand_dims(img, axis=0)
-        
-        return img
+        return engine.preprocess(image, timer)
     except Exception as e:
         print(f"❌ Preprocessing error: {e}")
         raise
 
 # ================= PREDICTION LOGIC =================
-def predict_leaf(image_path):
-    """Main prediction function with nutrient mapping"""
+def predict_leaf(image_path, tta=False, tiles=False, similar=False, orchard=None, plot=None):
+    """Main prediction function with nutrient mapping.
+
+    tta=True averages the output over TTA_VIEWS (flips, rotations, crops),
+    scored in one batched forward pass. tiles=True is for photos of several
+    leaves: leaf tiles are scored separately and the result gains a 'tiles'
+    report with the per-tile class grid (see utils/tiling.py). similar=True
+    adds the nearest past cases in CASE_INDEX_DIR and a novelty score
+    (see utils/embeddings.py). orchard/plot tag the prediction in the
+    history store (see utils/history.py).
+    """
+    return predict_leaf_image(image_path, name=os.path.basename(image_path), tta=tta, tiles=tiles,
+                              similar=similar, orchard=orchard, plot=plot)
+
+def predict_leaf_image(image, name=None, tta=False, tiles=False, similar=False, orchard=None, plot=None):
+    """Predict from an in-memory image (encoded bytes, BGR ndarray or utils.frames.Frame) or a path"""
+    return _predict(image, name, format_prediction, tta, tiles, similar, (orchard, plot))
+
+def predict_leaf_json(image, name=None, tta=False, tiles=False, similar=False, orchard=None, plot=None):
+    """predict_leaf_image's result as JSON bytes, spliced into the pre-encoded template"""
+    result = _predict(image, name, format_prediction_json, tta, tiles, similar, (orchard, plot))
+    return result if isinstance(result, bytes) else dumps(result)
+
+def _record(predictions, mode, tags=(None, None), name=None):
+    if history is not None:
+        history.record(predictions, engine.version, 'offline', mode, *tags, meta={'name': name} if name else None)
+
+def _predict(image, name, formatter, tta=False, tiles=False, similar=False, tags=(None, None)):
+    timer = StageTimer()
     try:
-        print(f"\n🔍 Predicting: {os.path.basename(image_path)}")
+        print(f"\n🔍 Predicting: {name or 'in-memory image'}")
+        if sum((tta, tiles, similar)) > 1:
+            raise ValueError("tta, tiles and similar cannot be combined")
         
         # Load and preprocess
-        model = load_prediction_model()
-        img_array = preprocess_image(image_path)
-        
-        # Get disease prediction
-        predictions = model.predict(img_array, verbose=0)[0]
-        disease_idx = np.argmax(predictions)
-        disease = DISEASE_CLASSES[disease_idx]
-        disease_confidence = float(predictions[disease_idx]) * 100
+        load_prediction_model()
+        tta_info = tiles_info = found = None
+        if tiles:
+            # Decodes and scores the photo tile by tile (decode + inference stages)
+            predictions, tiles_info = engine.predict_tiles(image, timer=timer)
+        else:
+            img_array = preprocess_image(image, timer)
         
-        print(f"🎯 Disease: {disease} ({disease_confidence:.1f}%)")
+            # Get disease prediction
+            with timer.stage('inference'):
+                if tta:
+                    predictions, agreement = engine.predict_tta(img_array, TTA_VIEWS)
+                    tta_info = {'views': len(TTA_VIEWS), 'agreement': round(agreement, 4)}
+                elif similar:
+                    rows, embeddings = engine.predict_embeddings(img_array)
+                    predictions = rows[0]
+                else:
+                    predictions = engine.predict_batch(img_array)[0]
+        if similar:
+            with timer.stage('search'):
+                found = load_case_index().query(embeddings[0], SIMILAR_K)
+        with timer.stage('format'):
+            result = formatter(predictions, tta_info)
+            extra = {'tiles': tiles_info} if tiles else found or {}
+            for key, value in extra.items():
+                if isinstance(result, bytes):
+                    result = extend(result, key, value)
+                else:
+                    result[key] = value
+        observe_stages(timer.timings)
+        disease, confidence = engine.classify(predictions)
+        PREDICTIONS.inc(disease=disease)
+        _record(predictions, 'tta' if tta else 'tiles' if tiles else 'similar' if similar else 'single', tags, name)
         
-        # Map to nutrient deficiencies
+        print(f"🎯 Disease: {disease} ({confidence * 100:.1f}%)")
         nutrient_defs = DISEASE_TO_NUTRIENTS_SIMPLE.get(disease, [])
-        
-        # Get treatment info
-        disease_info = DISEASE_TO_TREATMENT.get(disease, {})
-        nutrient_info = {}
-        
-        if nutrient_defs:
-            nutrient_info = NUTRIENT_TREATMENTS.get(nutrient_defs[0], {}) if nutrient_defs else {}
-        
-        # Prepare detailed response
-        result = {
-            'success': True,
-            'disease_prediction': {
-                'disease': disease,
-                'confidence': round(disease_confidence, 2),
-                'category': 'Healthy' if disease == 'Healthy' else 'Disease',
-                'description': disease_info.get('description', ''),
-                'symptoms': disease_info.get('symptoms', []),
-                'chemical_treatment': disease_info.get('chemical_treatment', []),
-                'organic_treatment': disease_info.get('organic_treatment', []),
-                'prevention': disease_info.get('prevention', [])
-            },
-            'nutrient_analysis': {
-                'deficiencies': nutrient_defs,
-                'primary_deficiency': nutrient_defs[0] if nutrient_defs else None,
-                'description': nutrient_info.get('description', ''),
-                'treatment': nutrient_info.get('treatment', []),
-                'application': nutrient_info.get('application', []),
-                'prevention': nutrient_info.get('prevention', [])
-            },
-            'all_disease_predictions': [
-                {'disease': DISEASE_CLASSES[i], 'confidence': round(float(pred) * 100, 2)}
-                for i, pred in enumerate(predictions)
-            ],
-            'severity': 'Low' if disease == 'Healthy' else 'High',
-            'timestamp': datetime.now().isoformat()
-        }
-        
         print(f"✅ Analysis complete!")
         print(f"   Nutrient deficiencies: {', '.join(nutrient_defs) if nutrient_defs else 'None'}")
         
         return result
         
+    except PoorQuality as e:
+        print(f"📷 {e}")
+        ERRORS.inc(type='retake_photo')
+        record_rejection(e)
+        return error_result(e)
+
     except Exception as e:
         print(f"❌ Prediction error: {e}")
+        ERRORS.inc(type=type(e).__name__)
+        return error_result(e)
+
+def predict_leaf_batch(images, batch_size=16, orchard=None, plot=None):
+    """Predict many images (paths, bytes or ndarrays) in fixed-size batches.
+
+    Yields one result per input, in order, as soon as its batch finishes, so
+    memory stays bounded by ``batch_size`` regardless of how many images are
+    passed in. orchard/plot tag every prediction in the history store.
+    """
+    load_prediction_model()
+    
+    def run(chunk):
+        rows = engine.predict_tensors([engine.load_tensor(image) for image in chunk])
+        for row in rows:
+            if not isinstance(row, Exception):
+                _record(row, 'single', (orchard, plot))
+        return [error_result(row) if isinstance(row, Exception) else format_prediction(row)
+                for row in rows]
+    
+    chunk = []
+    for image in images:
+        chunk.append(image)
+        if len(chunk) >= batch_size:
+            yield from run(chunk)
+            chunk = []
+    if chunk:
+        yield from run(chunk)
+
+def _prediction_template(disease):
+    """Detailed response for one class; confidences and timestamp are filled per call"""
+    # Map to nutrient deficiencies
+    nutrient_defs = DISEASE_TO_NUTRIENTS_SIMPLE.get(disease, [])
+    
+    # Get treatment info
+    disease_info = DISEASE_TO_TREATMENT.get(disease, {})
+    nutrient_info = NUTRIENT_TREATMENTS.get(nutrient_defs[0], {}) if nutrient_defs else {}
+    
+    return {
+        'success': True,
+        'disease_prediction': {
+            'disease': disease,
+            'confidence': Slot('confidence'),
+            'category': 'Healthy' if disease == 'Healthy' else 'Disease',
+            'description': disease_info.get('description', ''),
+            'symptoms': disease_info.get('symptoms', []),
+            'chemical_treatment': disease_info.get('chemical_treatment', []),
+            'organic_treatment': disease_info.get('organic_treatment', []),
+            'prevention': disease_info.get('prevention', [])
+        },
+        'nutrient_analysis': {
+            'deficiencies': nutrient_defs,
+            'primary_deficiency': nutrient_defs[0] if nutrient_defs else None,
+            'description': nutrient_info.get('description', ''),
+            'treatment': nutrient_info.get('treatment', []),
+            'application': nutrient_info.get('application', []),
+            'prevention': nutrient_info.get('prevention', [])
+        },
+        'all_disease_predictions': Slot('all_disease_predictions'),
+        'severity': 'Low' if disease == 'Healthy' else 'High',
+        'tta': Slot('tta'),
+        'model_version': Slot('model_version'),
+        'timestamp': Slot('timestamp')
+    }
+
+# Static part of every class's response, serialized once at import
+PREDICTION_TEMPLATE = ResponseTemplate(DISEASE_CLASSES, _prediction_template)
+_ALL_PREDICTIONS = ScoreList(DISEASE_CLASSES)
+_CLASS_ORDER = range(len(DISEASE_CLASSES))
+
+def format_prediction(predictions, tta=None):
+    """Build the detailed response for one row of model output (tta: {'views', 'agreement'} or None)"""
+    idx = int(np.argmax(predictions))
+    scores = scale_floats(predictions, 100, 2)
+    return PREDICTION_TEMPLATE.as_dict(idx, {
+        'confidence': scores[idx],
+        'all_disease_predictions': [
+            {'disease': disease, 'confidence': score}
+            for disease, score in zip(DISEASE_CLASSES, scores)
+        ],
+        'tta': tta,
+        'model_version': engine.version,
+        'timestamp': datetime.now().isoformat()
+    })
+
+def format_prediction_json(predictions, tta=None):
+    """format_prediction as JSON bytes without building the dict"""
+    idx = int(np.argmax(predictions))
+    scores = encode_floats(predictions, 100, 2)
+    return PREDICTION_TEMPLATE.render(idx, {
+        'confidence': scores[idx],
+        'all_disease_predictions': _ALL_PREDICTIONS.encode(_CLASS_ORDER, scores),
+        'tta': dumps(tta),
+        'model_version': dumps(engine.version),
+        'timestamp': dumps(datetime.now().isoformat())
+    })
+
+def error_result(error):
+    """Failure response in the same shape as predict_leaf (plus the
+    "retake photo" details when the quality gate turned the image away)"""
+    if isinstance(error, PoorQuality):
         return {
             'success': False,
-            'error': str(e),
+            **error.report(),
             'disease_prediction': None,
             'nutrient_analysis': None
         }
+    return {
+        'success': False,
+        'error': str(error),
+        'disease_prediction': None,
+        'nutrient_analysis': None
+    }
 
 # ================= HELPER FUNCTIONS =================
 def get_model_info():
@@ -325,7 +486,8 @@ def get_model_info():
                 'disease_classes': len(DISEASE_CLASSES),
                 'nutrient_classes': len(NUTRIENT_CLASSES),
                 'total_classes': len(CLASS_NAMES),
-                'format': MODEL_FORMAT
+                'format': MODEL_FORMAT,
+                'backend': model.name
             },
             'disease_classes': DISEASE_CLASSES,
             'nutrient_classes': NUTRIENT_CLASSES,
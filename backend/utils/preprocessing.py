@@ -0,0 +1,85 @@
+"""
+Image preprocessing shared by the API and the preprocessing workers
+MUST match training preprocessing
+"""
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+# ================= CONFIGURATION =================
+IMAGE_SIZE = (224, 224)
+INPUT_SHAPE = IMAGE_SIZE + (3,)
+
+# Smallest short side worth decoding: JPEGs are DCT-downscaled to no less than this
+DECODE_MIN_SIDE = min(IMAGE_SIZE)
+
+_SCALE = np.float32(255.0)
+_scratch = threading.local()
+
+
+# ================= PREPROCESSING =================
+def _resize_scratch():
+    """Per-thread uint8 buffer that cv2.resize writes into"""
+    buf = getattr(_scratch, "resized", None)
+    if buf is None:
+        buf = _scratch.resized = np.empty(INPUT_SHAPE, dtype=np.uint8)
+    return buf
+
+
+def preprocess_into(img, out, check=None):
+    """Preprocess a BGR uint8 image into a preallocated (224, 224, 3) float32 buffer.
+
+    Resizes into a reusable uint8 scratch buffer, then does the BGR->RGB swap
+    and the /255 scaling in a single pass by dividing a channel-reversed view
+    straight into ``out``. No full-size intermediates are allocated.
+    ``check(resized)`` (the quality gate) sees the resized uint8 image first
+    and may raise to stop before the scaling.
+    """
+    resized = cv2.resize(img, IMAGE_SIZE, dst=_resize_scratch())
+    if check is not None:
+        check(resized)
+    np.divide(resized[..., ::-1], _SCALE, out=out, dtype=np.float32)
+    return out
+
+
+def preprocess_image(img, check=None):
+    """BGR uint8 image -> (1, 224, 224, 3) float32 RGB tensor scaled to [0, 1]"""
+    out = np.empty((1,) + INPUT_SHAPE, dtype=np.float32)
+    preprocess_into(img, out[0], check)
+    return out
+
+
+def reference_preprocess(img):
+    """Training-time pipeline (cvtColor, resize, float32 / 255), kept for verification"""
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, IMAGE_SIZE)
+    img = img.astype('float32') / 255.0
+    return np.expand_dims(img, axis=0)
+
+
+# ================= TENSOR POOL =================
+class TensorPool:
+    """Fixed set of preallocated float32 tensors handed out and returned.
+
+    ``acquire`` blocks when every buffer is in use, which also bounds how many
+    preprocessed images can be in flight at once.
+    """
+
+    def __init__(self, size, shape=INPUT_SHAPE):
+        self.size = int(size)
+        self.shape = tuple(shape)
+        self._free = queue.Queue()
+        for _ in range(self.size):
+            self._free.put(np.empty(self.shape, dtype=np.float32))
+
+    def acquire(self, timeout=None):
+        return self._free.get(timeout=timeout)
+
+    def release(self, buf):
+        self._free.put(buf)
+
+    def available(self):
+        return self._free.qsize()
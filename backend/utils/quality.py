@@ -0,0 +1,152 @@
+"""
+Image quality gate run before inference
+Blurry, badly exposed and leafless photos are turned away with a "retake
+photo" answer instead of a confident-looking wrong class
+"""
+
+import cv2
+import numpy as np
+
+from .metrics import REGISTRY
+from .tiling import leaf_mask
+
+# ================= CONFIGURATION =================
+# All checks run on the resized (224, 224, 3) uint8 model input; 0 disables a check.
+# Laplacian variance of the grey input: sharp leaf photos score in the hundreds,
+# a defocused or shaken shot in the single digits
+DEFAULT_MIN_SHARPNESS = 15.0
+
+# Mean grey level (0-255) outside which the photo is under- or overexposed
+DEFAULT_MIN_BRIGHTNESS = 40.0
+DEFAULT_MAX_BRIGHTNESS = 225.0
+
+# Share of pixels crushed to black / blown to white, either of which alone rejects
+DEFAULT_MAX_CLIPPED = 0.5
+DARK_LEVEL = 10
+BRIGHT_LEVEL = 245
+
+# Share of leaf-coloured pixels (utils.tiling.leaf_mask) needed to call it a leaf photo
+DEFAULT_MIN_LEAF_RATIO = 0.15
+
+ADVICE = {
+    'underexposed': "Move to better light or out of deep shade",
+    'overexposed': "Avoid direct sunlight or flash glare on the leaf",
+    'blurry': "Hold the camera steady and tap the leaf to focus",
+    'no_leaf': "Fill the frame with a single mango leaf",
+}
+
+QUALITY_REJECTIONS = REGISTRY.counter(
+    "mango_quality_rejections_total", "Uploads turned away by the quality gate, by failed check", ["reason"]
+)
+QUALITY_SECONDS_SAVED = REGISTRY.counter(
+    "mango_quality_inference_seconds_saved_total", "Estimated inference time skipped for rejected uploads"
+)
+
+
+# ================= GATE =================
+class PoorQuality(Exception):
+    """An upload failed the quality gate; ``reasons`` are keys of ADVICE"""
+
+    def __init__(self, reasons, measurements):
+        # Both kept in args so the error pickles back from process-pool workers
+        super().__init__(list(reasons), dict(measurements))
+        self.reasons = list(reasons)
+        self.measurements = dict(measurements)
+
+    def __str__(self):
+        return f"Image quality too low ({', '.join(self.reasons)}): retake the photo"
+
+    def report(self):
+        """JSON-ready "retake photo" answer"""
+        return {
+            'error': str(self),
+            'retake': True,
+            'reasons': self.reasons,
+            'advice': [ADVICE[reason] for reason in self.reasons],
+            'quality': self.measurements,
+        }
+
+
+class QualityGate:
+    """Blur, exposure and leaf-pixel checks on the resized model input.
+
+    ``check(img)`` raises PoorQuality when any check fails. The gate holds
+    only thresholds, so it is passed as is to process-pool workers.
+    """
+
+    def __init__(self, min_sharpness=DEFAULT_MIN_SHARPNESS, min_brightness=DEFAULT_MIN_BRIGHTNESS,
+                 max_brightness=DEFAULT_MAX_BRIGHTNESS, max_clipped=DEFAULT_MAX_CLIPPED,
+                 min_leaf_ratio=DEFAULT_MIN_LEAF_RATIO):
+        self.min_sharpness = float(min_sharpness)
+        self.min_brightness = float(min_brightness)
+        self.max_brightness = float(max_brightness)
+        self.max_clipped = float(max_clipped)
+        self.min_leaf_ratio = float(min_leaf_ratio)
+
+    @staticmethod
+    def measure(img):
+        """Sharpness, exposure and leaf ratio of a BGR uint8 image"""
+        grey = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        hist = cv2.calcHist([grey], [0], None, [256], [0, 256]).ravel() / grey.size
+        _, std = cv2.meanStdDev(cv2.Laplacian(grey, cv2.CV_16S))
+        return {
+            'sharpness': round(float(std[0, 0]) ** 2, 2),
+            'brightness': round(float(hist @ np.arange(256)), 2),
+            'dark_fraction': round(float(hist[:DARK_LEVEL + 1].sum()), 4),
+            'bright_fraction': round(float(hist[BRIGHT_LEVEL:].sum()), 4),
+            'leaf_ratio': round(cv2.countNonZero(leaf_mask(img)) / grey.size, 4),
+        }
+
+    def failures(self, m):
+        """Failed checks for measure()'s output, in ADVICE order.
+
+        Blur and leaf colour cannot be judged in a badly exposed photo, so
+        they are only checked once the exposure passes.
+        """
+        reasons = []
+        if (self.min_brightness and m['brightness'] < self.min_brightness) or \
+                (self.max_clipped and m['dark_fraction'] > self.max_clipped):
+            reasons.append('underexposed')
+        if (self.max_brightness and m['brightness'] > self.max_brightness) or \
+                (self.max_clipped and m['bright_fraction'] > self.max_clipped):
+            reasons.append('overexposed')
+        if reasons:
+            return reasons
+        if self.min_sharpness and m['sharpness'] < self.min_sharpness:
+            reasons.append('blurry')
+        if self.min_leaf_ratio and m['leaf_ratio'] < self.min_leaf_ratio:
+            reasons.append('no_leaf')
+        return reasons
+
+    def check(self, img):
+        """measure() the image; raise PoorQuality if it fails any check"""
+        measurements = self.measure(img)
+        reasons = self.failures(measurements)
+        if reasons:
+            raise PoorQuality(reasons, measurements)
+        return measurements
+
+    def describe(self):
+        return {
+            'min_sharpness': self.min_sharpness,
+            'min_brightness': self.min_brightness,
+            'max_brightness': self.max_brightness,
+            'max_clipped': self.max_clipped,
+            'min_leaf_ratio': self.min_leaf_ratio,
+        }
+
+
+def record_rejection(error, saved_ms=None):
+    """Count a PoorQuality rejection; saved_ms is the inference time it skipped, if known"""
+    for reason in error.reasons:
+        QUALITY_REJECTIONS.inc(reason=reason)
+    if saved_ms:
+        QUALITY_SECONDS_SAVED.inc(saved_ms / 1000.0)
+
+
+def rejection_stats():
+    """Rejections per failed check and the inference time saved, from the counters"""
+    return {
+        'rejected': {reason: int(QUALITY_REJECTIONS.value(reason=reason)) for reason in ADVICE},
+        'inference_ms_saved': round(QUALITY_SECONDS_SAVED.value() * 1000, 1),
+    }
@@ -0,0 +1,116 @@
+"""
+Versioned model registry over the model/ directory
+
+    model/
+    ├── CURRENT               # name of the version to serve
+    ├── 2024-06-01/
+    │   └── best_model.keras
+    └── 2024-07-15/
+        ├── best_model.keras
+        └── best_model.tflite
+
+Every subdirectory holding a model file is a version. Versions are published
+by adding a new directory (never by overwriting one) and activated by
+rewriting CURRENT, which running servers pick up without a restart.
+"""
+
+import os
+import re
+import tempfile
+
+from .backends import backend_for_path
+
+# ================= CONFIGURATION =================
+POINTER_FILE = "CURRENT"
+MODEL_EXTENSIONS = ('.keras', '.h5', '.tflite', '.onnx', '.ort')
+
+# When a version has several artifacts and no backend is requested
+BACKEND_PREFERENCE = ('keras', 'tflite', 'onnx')
+
+
+def _natural_key(name):
+    """'v10' sorts after 'v9'"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+# ================= REGISTRY =================
+class ModelRegistry:
+    def __init__(self, root="model", backend=None):
+        self.root = root
+        self.backend = backend
+
+    def versions(self):
+        """Version names, oldest first (natural sort on the directory name)"""
+        if not os.path.isdir(self.root):
+            return []
+        names = [
+            name for name in os.listdir(self.root)
+            if not name.startswith(".") and self.artifacts(name)
+        ]
+        return sorted(names, key=_natural_key)
+
+    def artifacts(self, name):
+        """{backend: path} for the model files in one version"""
+        folder = os.path.join(self.root, name)
+        if not os.path.isdir(folder):
+            return {}
+        found = {}
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(MODEL_EXTENSIONS):
+                found.setdefault(backend_for_path(filename), os.path.join(folder, filename))
+        return found
+
+    def current(self):
+        """Version named in CURRENT, else the newest version, else None"""
+        try:
+            with open(os.path.join(self.root, POINTER_FILE)) as f:
+                name = f.read().strip()
+            if name:
+                return name
+        except OSError:
+            pass
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def resolve(self, name=None, backend=None):
+        """(version, path) for name (default: current) and backend (default: preference order)"""
+        name = name or self.current()
+        if name is None:
+            raise FileNotFoundError(f"No model versions in {self.root}")
+        artifacts = self.artifacts(name)
+        if not artifacts:
+            raise KeyError(f"Unknown model version: {name}")
+
+        backend = backend or self.backend
+        if backend:
+            if backend not in artifacts:
+                raise KeyError(f"Version {name} has no {backend} model (has {sorted(artifacts)})")
+            return name, artifacts[backend]
+        for preferred in BACKEND_PREFERENCE:
+            if preferred in artifacts:
+                return name, artifacts[preferred]
+        return name, next(iter(artifacts.values()))
+
+    def activate(self, name):
+        """Point CURRENT at an existing version (atomic rename, safe for concurrent readers)"""
+        if not self.artifacts(name):
+            raise KeyError(f"Unknown model version: {name}")
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".current-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(name + "\n")
+            os.replace(tmp, os.path.join(self.root, POINTER_FILE))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def describe(self):
+        current = self.current()
+        return [
+            {
+                'version': name,
+                'current': name == current,
+                'artifacts': {backend: os.path.basename(path) for backend, path in self.artifacts(name).items()},
+            }
+            for name in self.versions()
+        ]
@@ -0,0 +1,130 @@
+"""
+Pre-encoded JSON response templates
+The static per-class part of a response is serialized once; per request only
+the dynamic values (confidences, top-k, timestamp) are encoded and spliced in
+"""
+
+import json
+import math
+import re
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+# ================= CONFIGURATION =================
+JSON_MIMETYPE = "application/json"
+
+_SLOT_PATTERN = re.compile(rb'"\\u0000(\w+)\\u0000"')
+
+
+# ================= ENCODING =================
+def dumps(obj):
+    """Compact JSON as UTF-8 bytes (orjson when installed, else the stdlib)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def extend(body, key, value):
+    """Encoded JSON object body with one more top-level key, without re-parsing it"""
+    return body[:-1] + b',' + dumps(key) + b':' + dumps(value) + b'}'
+
+
+def scale_floats(values, scale=None, decimals=None):
+    """Array -> Python floats, scaled and rounded in one numpy pass"""
+    a = np.asarray(values, dtype=np.float64)
+    if scale is not None:
+        a = a * scale
+    if decimals is not None:
+        a = np.round(a, decimals)
+    return a.tolist()
+
+
+def encode_floats(values, scale=None, decimals=None):
+    """JSON number literals (bytes) for the values scale_floats returns.
+
+    NaN and infinities (a broken model or export) have no JSON literal:
+    they become null, as orjson encodes them, never a bare ``NaN``.
+    """
+    return [repr(v).encode() if math.isfinite(v) else b"null" for v in scale_floats(values, scale, decimals)]
+
+
+# ================= TEMPLATES =================
+class Slot(str):
+    """Placeholder for a per-request value inside a response template.
+
+    A str subclass so a template with slots can itself be serialized; it
+    encodes to a marker that ``ResponseTemplate`` splits on.
+    """
+
+    def __new__(cls, name):
+        slot = super().__new__(cls, f"\x00{name}\x00")
+        slot.name = name
+        return slot
+
+
+def fill(template, values):
+    """Copy of template with every Slot replaced by values[slot.name]"""
+    if isinstance(template, Slot):
+        return values[template.name]
+    if isinstance(template, dict):
+        return {k: fill(v, values) for k, v in template.items()}
+    if isinstance(template, list):
+        return [fill(v, values) for v in template]
+    return template
+
+
+class ResponseTemplate:
+    """One template per class, compiled to JSON fragments around its slots.
+
+    ``build(class_name)`` returns the response with ``Slot`` placeholders for
+    the dynamic values. ``render(index, values)`` joins the class's fragments
+    with already encoded values (bytes), so the static part is never
+    re-serialized.
+    """
+
+    def __init__(self, class_names, build):
+        self.class_names = list(class_names)
+        self._templates = [build(name) for name in self.class_names]
+        self._compiled = [self._compile(t) for t in self._templates]
+
+    @staticmethod
+    def _compile(template):
+        parts = _SLOT_PATTERN.split(dumps(template))
+        return parts[0::2], [name.decode() for name in parts[1::2]]
+
+    def slots(self, index=0):
+        return list(self._compiled[index][1])
+
+    def render(self, index, values):
+        fragments, names = self._compiled[index]
+        out = [fragments[0]]
+        for name, fragment in zip(names, fragments[1:]):
+            out.append(values[name])
+            out.append(fragment)
+        return b"".join(out)
+
+    def as_dict(self, index, values):
+        """The same response as a dict (values as Python objects)"""
+        return fill(self._templates[index], values)
+
+
+class ScoreList:
+    """JSON list of {name_key: class, score_key: score} with per-class prefixes pre-encoded"""
+
+    def __init__(self, class_names, name_key="disease", score_key="confidence"):
+        self._prefix = [
+            dumps({name_key: name})[:-1] + b"," + dumps(score_key) + b":" for name in class_names
+        ]
+
+    def encode(self, indices, scores):
+        """indices: class per entry; scores: encoded numbers (see encode_floats)"""
+        return b"[" + b",".join(self._prefix[i] + s + b"}" for i, s in zip(indices, scores)) + b"]"
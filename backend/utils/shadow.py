@@ -0,0 +1,316 @@
+"""
+Shadow and A/B evaluation of a candidate model on live traffic
+A sampled fraction of requests is also run through a second model on a
+background thread; top-1 agreement, confidence deltas and per-model latency
+are logged to a local sqlite store and summarized per class
+"""
+
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from .metrics import REGISTRY
+
+# ================= CONFIGURATION =================
+DEFAULT_SAMPLE_RATE = 0.05
+DEFAULT_QUEUE_SIZE = 256
+
+# shadow: the primary answers, the candidate runs in the background
+# ab:     the candidate answers sampled requests, the primary runs in the background
+MODES = ("shadow", "ab")
+
+SHADOW_COMPARISONS = REGISTRY.counter(
+    "mango_shadow_comparisons_total", "Primary vs candidate top-1 on sampled requests", ["result"]
+)
+
+
+# ================= STORE =================
+class ComparisonStore:
+    """Append-only sqlite log of primary/candidate comparisons (one row per sampled request)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._db_pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # sqlite connections must not be shared across fork(); reopen per process
+        if self._db is None or self._db_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS comparisons ("
+                "ts REAL NOT NULL, served TEXT NOT NULL, "
+                "primary_version TEXT, candidate_version TEXT, "
+                "primary_class TEXT NOT NULL, candidate_class TEXT NOT NULL, agree INTEGER NOT NULL, "
+                "primary_confidence REAL NOT NULL, candidate_confidence REAL NOT NULL, "
+                "primary_ms REAL NOT NULL, candidate_ms REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS comparisons_ts ON comparisons (ts)")
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def add(self, rows):
+        """rows: dicts with the comparisons columns"""
+        with self._lock:
+            db = self._connect()
+            db.executemany(
+                "INSERT INTO comparisons VALUES (:ts, :served, :primary_version, :candidate_version, "
+                ":primary_class, :candidate_class, :agree, :primary_confidence, :candidate_confidence, "
+                ":primary_ms, :candidate_ms)",
+                rows
+            )
+            db.commit()
+
+    def summary(self, class_names, since=None):
+        """Agreement, confidence delta and latency, overall and per primary top-1 class"""
+        where, params = ("WHERE ts >= ?", (since,)) if since is not None else ("", ())
+        aggregates = (
+            "COUNT(*), SUM(agree), AVG(candidate_confidence - primary_confidence), "
+            "AVG(ABS(candidate_confidence - primary_confidence)), AVG(primary_ms), AVG(candidate_ms)"
+        )
+        with self._lock:
+            db = self._connect()
+            overall = db.execute(f"SELECT {aggregates} FROM comparisons {where}", params).fetchone()
+            per_class = {
+                row[0]: row[1:] for row in db.execute(
+                    f"SELECT primary_class, {aggregates} FROM comparisons {where} GROUP BY primary_class",
+                    params
+                )
+            }
+            latency = {
+                model: {f"p{int(q * 100)}": self._percentile(db, f"{model}_ms", where, params, overall[0], q)
+                        for q in (0.5, 0.95)}
+                for model in ("primary", "candidate")
+            }
+            disagreements = db.execute(
+                f"SELECT primary_class, candidate_class, COUNT(*) FROM comparisons {where} "
+                f"{'AND' if where else 'WHERE'} agree = 0 "
+                "GROUP BY primary_class, candidate_class ORDER BY COUNT(*) DESC LIMIT 10",
+                params
+            ).fetchall()
+            versions = db.execute(
+                f"SELECT primary_version, candidate_version, COUNT(*) FROM comparisons {where} "
+                "GROUP BY primary_version, candidate_version",
+                params
+            ).fetchall()
+
+        summary = self._aggregate(overall)
+        for model, quantiles in latency.items():
+            summary[f"{model}_ms"].update(quantiles)
+        return {
+            **summary,
+            'per_class': {name: self._aggregate(per_class.get(name, (0,) + (None,) * 5)) for name in class_names},
+            'top_disagreements': [
+                {'primary': p, 'candidate': c, 'count': n} for p, c, n in disagreements
+            ],
+            'versions': [
+                {'primary': p, 'candidate': c, 'count': n} for p, c, n in versions
+            ],
+        }
+
+    @staticmethod
+    def _aggregate(row):
+        count, agree, delta, abs_delta, primary_ms, candidate_ms = row
+
+        def rounded(value, digits=2):
+            return round(value, digits) if value is not None else None
+        return {
+            'comparisons': count,
+            'agreement_rate': round(agree / count, 4) if count else None,
+            'confidence_delta': rounded(delta, 4),
+            'abs_confidence_delta': rounded(abs_delta, 4),
+            'primary_ms': {'mean': rounded(primary_ms)},
+            'candidate_ms': {'mean': rounded(candidate_ms)},
+        }
+
+    @staticmethod
+    def _percentile(db, column, where, params, count, q):
+        if not count:
+            return None
+        row = db.execute(
+            f"SELECT {column} FROM comparisons {where} ORDER BY {column} LIMIT 1 OFFSET ?",
+            params + (int(q * (count - 1)),)
+        ).fetchone()
+        return round(row[0], 2)
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM comparisons")
+            db.commit()
+
+
+# ================= EVALUATOR =================
+class ShadowEvaluator:
+    """Sample requests and compare a candidate ServedModel against the primary.
+
+    ``route(primary)`` picks the model that answers a request and whether it
+    is sampled; ``observe(...)`` hands a sampled request's tensor and output
+    to a background thread, which runs the other model on it and logs the
+    comparison. Nothing on the request path waits for the second model: when
+    the queue is full, comparisons are dropped.
+
+    The answering model's latency is its ``inference`` stage as served
+    (micro-batcher queueing included); the other model's is a standalone
+    single-image pass on the background thread.
+    """
+
+    def __init__(self, candidate, store, class_names, sample_rate=DEFAULT_SAMPLE_RATE, mode="shadow",
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown shadow mode: {mode} (expected one of {MODES})")
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+
+        self.candidate = candidate
+        self.store = store
+        self.class_names = list(class_names)
+        self.sample_rate = float(sample_rate)
+        self.mode = mode
+        self.queue_size = int(queue_size)
+
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self._sampled = 0
+        self._logged = 0
+        self._dropped = 0
+        self._errors = 0
+
+    # ---------- request path ----------
+    def route(self, primary):
+        """(model to answer with, sampled?) for one request"""
+        if random.random() >= self.sample_rate:
+            return primary, False
+        return (self.candidate if self.mode == "ab" else primary), True
+
+    def observe(self, primary, served, tensor, preds, served_ms):
+        """Queue the other model's pass for a sampled request; never blocks"""
+        self._ensure_worker()
+        item = (time.time(), primary, served, np.array(tensor, copy=True), np.asarray(preds).copy(), served_ms)
+        with self._lock:
+            self._sampled += 1
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    # ---------- worker ----------
+    def _ensure_worker(self):
+        # Same lazy, fork-aware start as MicroBatcher
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            self._worker = threading.Thread(target=self._run, name="shadow-evaluator", daemon=True)
+            self._worker_pid = pid
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            if items[0] is None:
+                return
+            # Whatever else is already waiting goes into the same sqlite transaction
+            while len(items) < self.queue_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                items.append(item)
+
+            rows = []
+            for item in items:
+                try:
+                    rows.append(self._compare(*item))
+                except Exception:
+                    traceback.print_exc()
+                    with self._lock:
+                        self._errors += 1
+            if not rows:
+                continue
+            try:
+                self.store.add(rows)
+            except Exception:
+                traceback.print_exc()
+                with self._lock:
+                    self._errors += len(rows)
+                continue
+            with self._lock:
+                self._logged += len(rows)
+
+    def _compare(self, ts, primary, served, tensor, served_preds, served_ms):
+        other = primary if served is self.candidate else self.candidate
+        start = time.perf_counter()
+        other_preds = other.predict_batch(tensor[None])[0]
+        other_ms = (time.perf_counter() - start) * 1000
+
+        if served is self.candidate:
+            primary_preds, candidate_preds = other_preds, served_preds
+            primary_ms, candidate_ms = other_ms, served_ms
+        else:
+            primary_preds, candidate_preds = served_preds, other_preds
+            primary_ms, candidate_ms = served_ms, other_ms
+
+        primary_idx = int(np.argmax(primary_preds))
+        candidate_idx = int(np.argmax(candidate_preds))
+        agree = primary_idx == candidate_idx
+        SHADOW_COMPARISONS.inc(result="agree" if agree else "disagree")
+        return {
+            'ts': ts,
+            'served': "candidate" if served is self.candidate else "primary",
+            'primary_version': primary.version,
+            'candidate_version': self.candidate.version,
+            'primary_class': self.class_names[primary_idx],
+            'candidate_class': self.class_names[candidate_idx],
+            'agree': int(agree),
+            # Both confidences are for the primary's top-1 class
+            'primary_confidence': float(primary_preds[primary_idx]),
+            'candidate_confidence': float(candidate_preds[primary_idx]),
+            'primary_ms': float(primary_ms),
+            'candidate_ms': float(candidate_ms),
+        }
+
+    # ---------- status ----------
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'sample_rate': self.sample_rate,
+                'candidate': self.candidate.describe(),
+                'store': self.store.path,
+                'queue_depth': self._queue.qsize(),
+                'sampled': self._sampled,
+                'logged': self._logged,
+                'dropped': self._dropped,
+                'errors': self._errors,
+            }
+
+    def close(self):
+        """Log what is already queued, then stop the worker and the candidate's batcher"""
+        if self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self.candidate.close()
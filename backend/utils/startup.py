@@ -0,0 +1,81 @@
+"""
+Startup phase tracking and model warm-up
+Separates liveness (process is up) from readiness (model loaded and warmed)
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .preprocessing import INPUT_SHAPE
+
+
+# ================= STARTUP TRACKER =================
+class StartupTracker:
+    """Records how long each startup phase took and whether we are ready"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phases = {}
+        self.ready = False
+        self.error = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.phases[name] = round(elapsed, 1)
+            print(f"⏱️  Startup phase '{name}': {elapsed:.0f} ms")
+
+    def mark_ready(self):
+        with self._lock:
+            self.ready = True
+            self.error = None
+            total = sum(v for k, v in self.phases.items() if not k.startswith('warmup_'))
+        print(f"🟢 Ready ({total:.0f} ms of startup work)")
+
+    def mark_failed(self, error):
+        with self._lock:
+            self.ready = False
+            self.error = str(error)
+
+    def summary(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'error': self.error,
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'phases_ms': dict(self.phases),
+            }
+
+
+# ================= WARM-UP =================
+def parse_batch_sizes(value, default=(1,)):
+    """"1,8,16" -> [1, 8, 16] (sorted, unique, positive)"""
+    sizes = {int(v) for v in str(value).split(",") if v.strip()} if value else set(default)
+    return sorted(s for s in sizes if s > 0)
+
+
+def warm_up(backend, batch_sizes, tracker=None, shape=INPUT_SHAPE):
+    """Run one inference per expected batch size so graph tracing/allocation
+    happens at boot rather than on the first real request."""
+    plan = getattr(backend, 'plan_batch_sizes', None)
+    if plan is not None:
+        plan(batch_sizes)
+    for size in batch_sizes:
+        batch = np.zeros((size,) + tuple(shape), dtype=np.float32)
+        if tracker is not None:
+            with tracker.phase(f"warmup_{size}"):
+                backend.predict(batch)
+        else:
+            backend.predict(batch)
+    if getattr(backend, 'embedding_dim', None) is not None:
+        # The embeddings pass is its own graph in Keras
+        backend.predict_embeddings(np.zeros((1,) + tuple(shape), dtype=np.float32))
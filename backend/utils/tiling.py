@@ -0,0 +1,220 @@
+"""
+Tiled inference for photos with several leaves
+The image is cut into overlapping 224x224 tiles (strided views, no copies),
+near-background tiles are skipped by a green-mask test, and the remaining
+tiles are scored in batched forward passes
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+from .image_io import jpeg_size, load_image
+from .preprocessing import IMAGE_SIZE, INPUT_SHAPE, preprocess_into
+
+# ================= CONFIGURATION =================
+TILE_SIZE = IMAGE_SIZE[0]
+DEFAULT_STRIDE = TILE_SIZE // 2  # 50% overlap
+
+# Long side of the image that gets tiled (0 keeps the full resolution). 1792 px
+# is 8 tiles across: lesions keep ~8x the detail of the whole-photo squash.
+DEFAULT_MAX_SIDE = 1792
+
+# Share of leaf pixels a tile needs to be scored
+DEFAULT_MIN_LEAF = 0.15
+
+# A disease diagnoses the photo only with this many tiles voting for it (every tile
+# when fewer are analyzed) and this share of the vote weight: one stray tile must
+# not overrule a branch of confident healthy leaves
+DEFAULT_MIN_VOTES = 2
+DEFAULT_MIN_SHARE = 0.1
+
+# Leaf mask: OpenCV HSV (hue 0-180), green through yellowing hues with enough
+# colour and light to rule out sky, soil shadows and white/grey backgrounds
+LEAF_HUE = (18, 95)
+LEAF_MIN_SATURATION = 40
+LEAF_MIN_VALUE = 30
+MASK_SCALE = 8  # computed at 1/8 resolution
+
+
+# ================= IMAGE =================
+def fit_image(source, max_side=DEFAULT_MAX_SIDE, tile_size=TILE_SIZE):
+    """BGR image whose long side is at most max_side and short side at least tile_size.
+
+    JPEGs are decoded at the smallest DCT reduction that still reaches
+    max_side, so big photos never pay for a full-resolution decode.
+    """
+    min_side = None
+    if max_side and not isinstance(source, (str, np.ndarray)):
+        size = jpeg_size(np.frombuffer(source, dtype=np.uint8))
+        if size is not None:
+            min_side = math.ceil(max_side * min(size) / max(size))
+    img = load_image(source, min_side=min_side)
+
+    h, w = img.shape[:2]
+    scale = 1.0
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+    scale = max(scale, tile_size / min(h, w))
+    if scale != 1.0:
+        size = (max(tile_size, round(w * scale)), max(tile_size, round(h * scale)))
+        img = cv2.resize(img, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    return img
+
+
+def tile_origins(length, size=TILE_SIZE, stride=DEFAULT_STRIDE):
+    """Start offsets along one axis; the last tile is flush with the edge"""
+    starts = list(range(0, length - size + 1, stride))
+    if starts[-1] != length - size:
+        starts.append(length - size)
+    return starts
+
+
+def tile_views(img, size=TILE_SIZE):
+    """(H - size + 1, W - size + 1, size, size, 3) view: [y, x] is the tile at (y, x).
+
+    No pixels are copied; each tile is read once, when it is preprocessed
+    into the batch buffer.
+    """
+    return np.lib.stride_tricks.sliding_window_view(img, (size, size, 3))[:, :, 0]
+
+
+# ================= LEAF MASK =================
+def leaf_mask(img):
+    """uint8 mask of a BGR image: 255 where the pixel is leaf-coloured"""
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(
+        hsv,
+        (LEAF_HUE[0], LEAF_MIN_SATURATION, LEAF_MIN_VALUE),
+        (LEAF_HUE[1], 255, 255)
+    )
+
+
+def leaf_integral(img, scale=MASK_SCALE):
+    """Summed-area table of a downscaled leaf mask (1 = leaf pixel)"""
+    h, w = img.shape[:2]
+    small = cv2.resize(img, (max(1, w // scale), max(1, h // scale)), interpolation=cv2.INTER_AREA)
+    return cv2.integral(leaf_mask(small) // 255)
+
+
+def leaf_fraction(integral, y, x, size=TILE_SIZE, scale=MASK_SCALE):
+    """Share of leaf pixels in the tile at (y, x), in O(1) from the summed-area table"""
+    y0, x0 = y // scale, x // scale
+    y1 = min((y + size) // scale, integral.shape[0] - 1)
+    x1 = min((x + size) // scale, integral.shape[1] - 1)
+    area = (y1 - y0) * (x1 - x0)
+    if area <= 0:
+        return 0.0
+    total = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    return float(total) / area
+
+
+# ================= INFERENCE =================
+def aggregate_tiles(rows, healthy_index, weights=None, min_votes=DEFAULT_MIN_VOTES,
+                    min_share=DEFAULT_MIN_SHARE):
+    """One output row for the photo -> (row, {class index: (tiles, vote share)}, winning diseases).
+
+    Each tile votes for its top-1 class, weighted by its confidence times
+    ``weights`` (the tile's leaf share). A disease wins with at least
+    ``min_votes`` tiles and ``min_share`` of the vote weight; the row is then
+    the weighted mean of the winners' tiles, so a few sick leaves on a
+    healthy branch still show up. Without a winner it is the weighted mean
+    over all tiles.
+    """
+    rows = np.asarray(rows, dtype=np.float32)
+    top = rows.argmax(axis=1)
+    weight = rows[np.arange(len(rows)), top].astype(np.float64)
+    if weights is not None:
+        weight *= np.asarray(weights, dtype=np.float64)
+    total = weight.sum()
+
+    votes = {}
+    for idx in np.unique(top):
+        voters = top == idx
+        votes[int(idx)] = (int(voters.sum()), float(weight[voters].sum() / total) if total > 0 else 0.0)
+    needed = min(min_votes, len(rows))
+    winners = [
+        idx for idx, (tiles, share) in votes.items()
+        if idx != healthy_index and tiles >= needed and share >= min_share
+    ]
+
+    chosen = np.isin(top, winners) if winners else np.ones(len(rows), dtype=bool)
+    if weight[chosen].sum() > 0:
+        row = np.average(rows[chosen], axis=0, weights=weight[chosen])
+    else:
+        row = rows[chosen].mean(axis=0)
+    return row.astype(np.float32), votes, winners
+
+
+def predict_tiles(img, predict_batch, class_names, healthy="Healthy", stride=DEFAULT_STRIDE,
+                  min_leaf=DEFAULT_MIN_LEAF, batch_size=16, tile_size=TILE_SIZE,
+                  min_votes=DEFAULT_MIN_VOTES, min_share=DEFAULT_MIN_SHARE):
+    """Score the leaf tiles of a BGR image -> (aggregated row, tile report).
+
+    ``predict_batch`` maps (N, 224, 224, 3) to (N, classes). Tiles below
+    ``min_leaf`` leaf pixels are skipped; if every tile is skipped, the
+    whole image is scored once instead. The report holds a class grid
+    (None for skipped tiles), a matching confidence grid, class counts and
+    the votes behind the diagnosis (see aggregate_tiles).
+    """
+    h, w = img.shape[:2]
+    ys, xs = tile_origins(h, tile_size, stride), tile_origins(w, tile_size, stride)
+    windows = tile_views(img, tile_size)
+    integral = leaf_integral(img)
+
+    leaf = {
+        (r, c): leaf_fraction(integral, y, x, tile_size)
+        for r, y in enumerate(ys) for c, x in enumerate(xs)
+    }
+    keep = [tile for tile, fraction in leaf.items() if fraction >= min_leaf]
+
+    grid = [[None] * len(xs) for _ in ys]
+    confidence = [[None] * len(xs) for _ in ys]
+    rows = []
+    buf = np.empty((min(batch_size, max(1, len(keep))),) + INPUT_SHAPE, dtype=np.float32)
+    for start in range(0, len(keep), len(buf)):
+        chunk = keep[start:start + len(buf)]
+        for i, (r, c) in enumerate(chunk):
+            preprocess_into(windows[ys[r], xs[c]], buf[i])
+        for (r, c), row in zip(chunk, predict_batch(buf[:len(chunk)])):
+            idx = int(np.argmax(row))
+            grid[r][c] = class_names[idx]
+            confidence[r][c] = round(float(row[idx]), 4)
+            rows.append(row)
+
+    votes, winners = {}, []
+    if rows:
+        aggregated, votes, winners = aggregate_tiles(
+            rows, class_names.index(healthy) if healthy in class_names else -1,
+            weights=[leaf[tile] for tile in keep],
+            min_votes=min_votes,
+            min_share=min_share
+        )
+    else:
+        # No leaf found: fall back to the whole photo
+        preprocess_into(img, buf[0])
+        aggregated = np.asarray(predict_batch(buf[:1])[0], dtype=np.float32)
+
+    counts = {}
+    for name in (name for line in grid for name in line if name is not None):
+        counts[name] = counts.get(name, 0) + 1
+    return aggregated, {
+        'image_size': [h, w],
+        'tile_size': tile_size,
+        'stride': stride,
+        'rows': len(ys),
+        'cols': len(xs),
+        'analyzed': len(keep),
+        'skipped': len(ys) * len(xs) - len(keep),
+        'class_counts': counts,
+        'votes': {
+            class_names[idx]: {'tiles': tiles, 'share': round(share, 4)}
+            for idx, (tiles, share) in sorted(votes.items(), key=lambda item: -item[1][1])
+        },
+        'quorum': {'min_votes': min_votes, 'min_share': min_share},
+        # Diseases the diagnosis was averaged over; empty: over every tile
+        'diagnosis_from': [class_names[idx] for idx in winners],
+        'grid': grid,
+        'confidence': confidence,
+    }
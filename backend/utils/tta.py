@@ -0,0 +1,94 @@
+"""
+Test-time augmentation (TTA)
+Builds flipped, rotated and cropped views of one preprocessed tensor as a
+single batch, so the model scores all of them in one forward pass
+"""
+
+import cv2
+import numpy as np
+
+# ================= CONFIGURATION =================
+# Crops cover this fraction of each side, zoomed back to the input size
+CROP_FRACTION = 0.875
+
+# Flips/rotations as cv2 ops: they write straight into the batch slot, where
+# copying a negatively strided numpy view is several times slower
+_CV2_OPS = {
+    'hflip': lambda src, dst: cv2.flip(src, 1, dst=dst),
+    'vflip': lambda src, dst: cv2.flip(src, 0, dst=dst),
+    'rot90': lambda src, dst: cv2.rotate(src, cv2.ROTATE_90_COUNTERCLOCKWISE, dst=dst),
+    'rot180': lambda src, dst: cv2.flip(src, -1, dst=dst),
+    'rot270': lambda src, dst: cv2.rotate(src, cv2.ROTATE_90_CLOCKWISE, dst=dst),
+}
+
+VIEWS = (
+    'identity', 'hflip', 'vflip', 'rot90', 'rot180', 'rot270',
+    'crop_center', 'crop_top_left', 'crop_top_right', 'crop_bottom_left', 'crop_bottom_right'
+)
+DEFAULT_VIEWS = (
+    'identity', 'hflip', 'vflip', 'rot90', 'rot270',
+    'crop_center', 'crop_top_left', 'crop_top_right', 'crop_bottom_left', 'crop_bottom_right'
+)
+
+
+def parse_views(value, default=DEFAULT_VIEWS):
+    """"identity,hflip,crop_center" -> ('identity', 'hflip', 'crop_center')"""
+    views = tuple(v.strip() for v in str(value).split(",") if v.strip()) if value else tuple(default)
+    unknown = [v for v in views if v not in VIEWS]
+    if unknown:
+        raise ValueError(f"Unknown TTA views {unknown} (expected some of {VIEWS})")
+    if not views:
+        raise ValueError("At least one TTA view is required")
+    return views
+
+
+# ================= VIEWS =================
+def _zoomed(tensor, crop_fraction):
+    """The tensor upscaled so an input-sized window covers crop_fraction of it"""
+    h, w = tensor.shape[:2]
+    size = (round(w / crop_fraction), round(h / crop_fraction))
+    return cv2.resize(tensor, size, interpolation=cv2.INTER_LINEAR)
+
+
+def _crop(zoomed, view, h, w):
+    zh, zw = zoomed.shape[:2]
+    top = {'top': 0, 'bottom': zh - h}.get(view.split('_')[1], (zh - h) // 2)
+    left = {'left': 0, 'right': zw - w}.get(view.split('_')[-1], (zw - w) // 2)
+    return zoomed[top:top + h, left:left + w]
+
+
+def augment(tensor, views=DEFAULT_VIEWS, crop_fraction=CROP_FRACTION, out=None):
+    """(H, W, 3) tensor -> (len(views), H, W, 3) batch of its augmented views.
+
+    Each view is written once, straight into its batch slot: flips and
+    rotations by cv2, crops as slices of one upscaled copy. Rotations match
+    ``np.rot90`` and the 'identity' view is the input itself, bit for bit.
+    """
+    tensor = tensor[0] if tensor.ndim == 4 else tensor
+    h, w = tensor.shape[:2]
+    if h != w and any(v in ('rot90', 'rot270') for v in views):
+        raise ValueError("rot90/rot270 need a square input")
+    if out is None:
+        out = np.empty((len(views),) + tensor.shape, dtype=np.float32)
+
+    zoomed = _zoomed(tensor, crop_fraction) if any(v.startswith('crop_') for v in views) else None
+    for i, view in enumerate(views):
+        if view == 'identity':
+            out[i] = tensor
+        elif view in _CV2_OPS:
+            _CV2_OPS[view](tensor, out[i])
+        else:
+            out[i] = _crop(zoomed, view, h, w)
+    return out
+
+
+def aggregate(rows):
+    """Mean of the views' softmax rows -> (row, agreement).
+
+    ``agreement`` is the fraction of views whose top-1 matches the averaged
+    top-1 (1.0 means every view agrees).
+    """
+    rows = np.asarray(rows, dtype=np.float32)
+    mean = rows.mean(axis=0)
+    agreement = float(np.mean(rows.argmax(axis=1) == mean.argmax()))
+    return mean, agreement